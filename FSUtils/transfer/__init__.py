@@ -12,7 +12,13 @@
 # SOFTWARE.
 # =============================================================================
 
-__all__ = ["ImageTransfer", "LocaleTransfer"]
+__all__ = ["BatchRunner", "ImageTransfer", "LocaleTransfer",
+           "MultiLocaleTransfer", "TransferPlan", "TransferStats",
+           "WatchSession"]
 
+from .batch import BatchRunner
 from .image_transfer import ImageTransfer
-from .locale_transfer import LocaleTransfer
+from .locale_transfer import LocaleTransfer, MultiLocaleTransfer
+from .plan import TransferPlan
+from .stats import TransferStats
+from .watch import WatchSession
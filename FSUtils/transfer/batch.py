@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+u"""
+批量迁移
+
+按清单文件依次执行多个迁移任务，所有任务共用一个扫描引擎，工程只遍历与扫描一次::
+
+    fs-transfer manifest.json
+    fs-transfer manifest.json --dry-run
+    python -m FSUtils.transfer.batch manifest.json --only fs-locale,fs-image
+
+清单为 JSON 文件， ``root`` 、 ``log_dir`` 与 ``cache_dir`` 为相对清单文件所在目录的
+路径，图片任务的 ``target_dir`` 为相对 ``root`` 的路径：
+
+.. code:: json
+
+    {
+        "root": "../project",
+        "exclude_dirs": ["out", ".svn"],
+        "log_dir": "./log",
+        "cache_dir": "./log/cache",
+        "jobs": 4,
+        "transfers": [
+            {"type": "locale", "name": "fs-locale",
+             "modules": ["fschedule", "fservice", "fmobile"],
+             "target_rel_path": "fservice/src/com/fr/fs/resources",
+             "target_locale": "fs"},
+            {"type": "multi_locale", "name": "split-locale",
+             "targets": [
+                 {"rel_path": "fservice/src/com/fr/fs/resources",
+                  "name": "fs", "modules": ["fservice", "fschedule"]},
+                 {"rel_path": "fmobile/src/com/fr/mobile/resources",
+                  "name": "mobile", "modules": ["fmobile"]}]},
+            {"type": "image", "name": "fs-image",
+             "modules": ["fschedule", "fservice", "fmobile"],
+             "target_base": "com/fr/fs",
+             "target_excludes": ["com/fr/fs/web/images/mobile/cover/"],
+             "target_dir": "fservice/src/com/fr/fs/resources/images/"}
+        ]
+    }
+
+任务中除 ``type`` 与 ``name`` 外的字段作为对应迁移工具的构造参数，缺少必需参数或包含未知
+参数的清单在加载时即被拒绝。
+"""
+
+__author__ = 'kyle'
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+
+from image_transfer import ImageTransfer
+from locale_transfer import LocaleKeyExtractor, LocaleTransfer, \
+    MultiLocaleTransfer
+from scan_engine import ScanEngine
+from stats import TransferStats
+from transfer_base import TransferBase
+
+
+def _to_str(value):
+    u"""
+    将 JSON 中的字符串转换为 UTF-8 字节串，与工具中使用的路径形式一致
+    """
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    if isinstance(value, list):
+        return [_to_str(v) for v in value]
+    if isinstance(value, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in value.iteritems())
+    return value
+
+
+class BatchRunner(object):
+    u"""
+    批量迁移执行器
+
+    建立一个扫描引擎并预先完成文件索引与代码扫描，之后按清单顺序逐个创建迁移工具并执行迁移。
+    每个任务写入文件后，迁移工具会同步引擎中的文件索引与扫描结果，后续任务基于更新后的状态
+    分析，无需重新扫描工程：
+
+    .. code:: python
+
+        runner = BatchRunner.load("./manifest.json")
+        runner.run()
+        print runner.report()
+
+    :ivar dict manifest: 清单内容
+    :ivar str root: 工程文件的根目录( ``project`` 目录)
+    :ivar str log_dir: 日志输出目录
+    :ivar scan_engine: 所有任务共用的扫描引擎
+    :vartype scan_engine: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+    :ivar list results: 已执行的任务，每项为包含 ``name`` 、 ``type`` 、 ``time`` (耗时)、
+        ``summary`` (迁移候选摘要)与 ``stats`` (统计对象)的字典
+    """
+    types = {
+        "locale": LocaleTransfer,
+        "multi_locale": MultiLocaleTransfer,
+        "image": ImageTransfer,
+    }
+
+    def __init__(self, manifest, base_dir="./"):
+        u"""
+        :param manifest: 清单内容
+        :type manifest: dict
+        :param base_dir: 清单中相对路径的基准目录，通常为清单文件所在目录
+        :type base_dir: str
+        """
+        manifest = _to_str(manifest)
+        transfers = manifest.get("transfers")
+        if not transfers:
+            raise ValueError("Manifest has no transfers.")
+        for i, job in enumerate(transfers):
+            if job.get("type") not in self.types:
+                raise ValueError("Unknown transfer type %r in job %d."
+                                 % (job.get("type"), i))
+            job.setdefault("name", "%s-%d" % (job["type"], i))
+            self._check_job(job)
+        self.manifest = manifest
+        self.root = os.path.join(base_dir, manifest["root"])
+        self.log_dir = os.path.join(base_dir, manifest.get("log_dir", "./"))
+        self._cache_dir = manifest.get("cache_dir")
+        if self._cache_dir is not None:
+            self._cache_dir = os.path.join(base_dir, self._cache_dir)
+        self.logger = logging.getLogger("fr")
+        self.scan_engine = None
+        self.results = []
+
+    def _check_job(self, job):
+        u"""
+        检查任务字段是否与迁移工具的构造参数一致，不一致时抛出 ``ValueError``
+
+        :param job: 任务配置
+        :type job: dict
+        """
+        spec = inspect.getargspec(self.types[job["type"]].__init__)
+        args = spec.args[1:]
+        required = args[:len(args) - len(spec.defaults or ())]
+        fields = set(job) - set(["type", "name"])
+        unknown = sorted(fields - set(args))
+        if unknown:
+            raise ValueError("job %s has unknown field(s): %s"
+                             % (job["name"], ", ".join(unknown)))
+        # root 取自清单
+        missing = [a for a in required if a not in fields and a != "root"]
+        if missing:
+            raise ValueError("job %s is missing field(s): %s"
+                             % (job["name"], ", ".join(missing)))
+        if job["type"] != "multi_locale":
+            return
+        for target in job["targets"]:
+            missing = [k for k in ("rel_path", "name", "modules")
+                       if k not in target]
+            if missing:
+                raise ValueError("job %s has a target missing field(s): %s"
+                                 % (job["name"], ", ".join(missing)))
+
+    @staticmethod
+    def load(path):
+        u"""
+        读取清单文件
+
+        :param path: 清单文件路径
+        :type path: str
+        :rtype: :class:`BatchRunner`
+        """
+        with open(path) as f:
+            manifest = json.load(f)
+        return BatchRunner(manifest, os.path.dirname(os.path.abspath(path)))
+
+    def get_extractors(self):
+        u"""
+        共用扫描引擎需要执行的扫描器：所有已登记的扫描器，以及设置了 ``call_patterns`` 的
+        国际化任务按其配置创建的扫描器
+
+        :rtype: list
+        """
+        extractors = TransferBase.get_extractors()
+        for job in self.manifest["transfers"]:
+            if job.get("call_patterns") is not None:
+                extractors.append(LocaleKeyExtractor(
+                    self.types[job["type"]].source_pattern,
+                    job["call_patterns"]))
+        return extractors
+
+    def get_scan_engine(self):
+        u"""
+        获取共用的扫描引擎，首次调用时建立文件索引并一次执行 :meth:`get_extractors` 中的
+        所有扫描器
+
+        :rtype: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+        """
+        if self.scan_engine is None:
+            self.scan_engine = ScanEngine(
+                self.root, self.manifest.get("exclude_dirs"),
+                extractors=self.get_extractors(), cache_dir=self._cache_dir,
+                jobs=self.manifest.get("jobs", 1), logger=self.logger)
+            self.scan_engine.scan()
+        return self.scan_engine
+
+    def create_transfer(self, job):
+        u"""
+        按任务配置创建迁移工具
+
+        :param job: 任务配置
+        :type job: dict
+        :rtype: :class:`~FSUtils.transfer.transfer_base.TransferBase`
+        """
+        kwargs = dict((k, v) for k, v in job.iteritems()
+                      if k not in ("type", "name"))
+        kwargs["root"] = self.root
+        kwargs["scan_engine"] = self.get_scan_engine()
+        kwargs.setdefault("exclude_dirs", self.manifest.get("exclude_dirs"))
+        if job["type"] == "image":
+            kwargs.setdefault("log_dir", self.log_dir)
+            if "log_level" in self.manifest:
+                kwargs.setdefault("log_level", logging.getLevelName(
+                    self.manifest["log_level"]))
+            if kwargs.get("target_dir") is not None:
+                kwargs["target_dir"] = os.path.join(
+                    self.root, kwargs["target_dir"])
+        else:
+            kwargs.setdefault("work_dir", self.log_dir)
+        if job["type"] == "multi_locale":
+            kwargs["targets"] = dict(
+                ((t["rel_path"], t["name"]), t["modules"])
+                for t in kwargs["targets"])
+        return self.types[job["type"]](**kwargs)
+
+    def run(self, names=None, dry_run=False):
+        u"""
+        按清单顺序执行任务
+
+        :param names: 只执行指定名称的任务，不设置则执行全部任务
+        :type names: list
+        :param dry_run: 为 ``True`` 时只分析并生成计划，不修改任何文件
+        :type dry_run: bool
+        :return: 已执行的任务列表，见 ``results``
+        :rtype: list
+        """
+        if not os.path.isdir(self.log_dir):
+            os.makedirs(self.log_dir)
+        # 日志只配置一次，各任务的迁移工具共用同一日志文件
+        level = logging.getLevelName(self.manifest.get("log_level", "INFO"))
+        self.logger = TransferBase.init_logger(self.log_dir, level)
+        if "log_level" in self.manifest:
+            self.logger.setLevel(level)
+        self.get_scan_engine()
+        for job in self.manifest["transfers"]:
+            if names is not None and job["name"] not in names:
+                continue
+            start = time.time()
+            transfer = self.create_transfer(job)
+            if dry_run:
+                with transfer.stats.phase("plan"):
+                    transfer.plan()
+            else:
+                transfer.transfer()
+            self.results.append({
+                "name": job["name"], "type": job["type"],
+                "time": time.time() - start,
+                "summary": transfer.summary(), "stats": transfer.stats})
+            self.logger.info('Transfer "%s" finished in %.3fs.'
+                             % (job["name"], self.results[-1]["time"]))
+        return self.results
+
+    def get_stats(self):
+        u"""
+        合并扫描引擎与所有已执行任务的统计
+
+        :rtype: :class:`~FSUtils.transfer.stats.TransferStats`
+        """
+        stats = TransferStats()
+        if self.scan_engine is not None:
+            stats.merge(self.scan_engine.stats)
+        for result in self.results:
+            stats.merge(result["stats"])
+        return stats
+
+    def report(self):
+        u"""
+        各任务耗时与合并后的统计报告
+
+        :rtype: str
+        """
+        lines = ["%-20s %-12s %10s" % ("transfer", "type", "time(s)")]
+        for result in self.results:
+            lines.append("%-20s %-12s %10.3f" % (
+                result["name"], result["type"], result["time"]))
+        for result in self.results:
+            lines.append("%s: %s" % (result["name"], result["summary"]))
+        lines.append(self.get_stats().report("Combined statistics:"))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run FSUtils transfers from a JSON manifest.")
+    parser.add_argument("manifest", help="path of the JSON manifest")
+    parser.add_argument("--only", help="comma separated transfer names")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="analyze and plan only, do not modify files")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.manifest):
+        print "%s not found." % args.manifest
+        return 1
+    try:
+        runner = BatchRunner.load(args.manifest)
+    except (ValueError, KeyError) as e:
+        print "Invalid manifest: %s" % e
+        return 1
+    names = None
+    if args.only:
+        names = [n.strip() for n in args.only.split(",") if n.strip()]
+        unknown = sorted(set(names) - set(
+            job["name"] for job in runner.manifest["transfers"]))
+        if unknown:
+            print "Unknown transfer name(s): %s" % ", ".join(unknown)
+            return 1
+    runner.run(names, args.dry_run)
+    print runner.report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
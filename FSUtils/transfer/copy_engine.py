@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+from multiprocessing.pool import ThreadPool
+
+from file_ops import copy_file, move_file
+
+
+class CopyEngine(object):
+    u"""
+    并发文件复制引擎
+
+    按顺序接收 ``(操作, 源文件列表, 目标文件)`` 构成的任务，操作为 ``copy`` 、 ``move`` 或
+    ``delete`` 。执行前先一次性创建所有目标目录，再由线程池并发执行文件读写，适用于网络磁盘等
+    以延迟为主的场景。复制与移动通过 :func:`~FSUtils.transfer.file_ops.copy_file` 与
+    :func:`~FSUtils.transfer.file_ops.move_file` 完成，同一文件系统下的移动直接重命名。
+
+    涉及同一文件的任务(如写入同一目标、删除另一任务写入的文件)会被归入同一组，组内按任务顺序
+    串行执行，因此结果与串行模式一致。
+
+    .. code:: python
+
+        engine = CopyEngine(workers=8)
+        results = engine.run([("copy", [src], target), ("delete", [path], None)])
+
+    :ivar int workers: 线程数，为 ``1`` 时在当前线程中执行
+    :ivar bool hardlink: 同一文件系统下复制时是否使用硬链接
+    """
+
+    def __init__(self, workers=1, hardlink=False):
+        u"""
+        :param workers: 线程数
+        :type workers: int
+        :param hardlink: 同一文件系统下复制时是否使用硬链接
+        :type hardlink: bool
+        """
+        self.workers = max(1, workers)
+        self.hardlink = hardlink
+
+    def run(self, tasks):
+        u"""
+        执行任务
+
+        :param tasks: ``(操作, 源文件列表, 目标文件)`` 构成的元组列表
+        :type tasks: list
+        :return: 与 ``tasks`` 顺序一致的 ``(已处理的源文件列表, 错误信息)`` 列表，源文件
+            均不存在时列表为空，成功时错误信息为 ``None``
+        :rtype: list
+        """
+        tasks = list(tasks)
+        self._make_dirs(tasks)
+        groups = self._group(tasks)
+        if self.workers <= 1 or len(groups) < 2:
+            group_results = [self._run_group(group) for group in groups]
+        else:
+            pool = ThreadPool(min(self.workers, len(groups)))
+            try:
+                group_results = pool.map(self._run_group, groups)
+            finally:
+                pool.close()
+                pool.join()
+        results = [None] * len(tasks)
+        for group_result in group_results:
+            for i, result in group_result:
+                results[i] = result
+        return results
+
+    @staticmethod
+    def _make_dirs(tasks):
+        u"""
+        一次性创建源文件存在的任务所需的目标目录
+        """
+        dirs = set()
+        for action, sources, target in tasks:
+            if target is not None and any(os.path.exists(p) for p in sources):
+                dirs.add(os.path.dirname(target))
+        for d in sorted(dirs):
+            if d and not os.path.isdir(d):
+                os.makedirs(d)
+
+    @staticmethod
+    def _group(tasks):
+        u"""
+        按涉及的文件将任务分组，组间没有共同的文件，组内保持任务顺序
+
+        :return: ``[(任务序号, 任务)]`` 构成的分组列表
+        :rtype: list
+        """
+        parents = {}
+
+        def find(key):
+            while parents[key] != key:
+                parents[key] = parents[parents[key]]
+                key = parents[key]
+            return key
+        for i, (action, sources, target) in enumerate(tasks):
+            parents.setdefault(i, i)
+            paths = list(sources)
+            if target is not None:
+                paths.append(target)
+            for path in paths:
+                key = os.path.normcase(os.path.abspath(path))
+                parents.setdefault(key, key)
+                root_a, root_b = find(i), find(key)
+                if root_a != root_b:
+                    parents[root_b] = root_a
+        groups = {}
+        for i, task in enumerate(tasks):
+            groups.setdefault(find(i), []).append((i, task))
+        return sorted(groups.values())
+
+    def _run_group(self, group):
+        return [(i, self._execute(task)) for i, task in group]
+
+    def _execute(self, task):
+        u"""
+        执行单个任务
+
+        :return: ``(已处理的源文件列表, 错误信息)``
+        :rtype: tuple
+        """
+        action, sources, target = task
+        sources = [p for p in sources if os.path.exists(p)]
+        if not sources:
+            return [], None
+        if action != "delete":
+            sources = sources[:1]
+        try:
+            if action == "delete":
+                for path in sources:
+                    os.remove(path)
+            elif action == "move":
+                move_file(sources[0], target)
+            else:
+                copy_file(sources[0], target, self.hardlink)
+        except (IOError, OSError, shutil.Error) as e:
+            return sources, str(e)
+        return sources, None
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import fnmatch
+import os
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def compile_patterns(patterns):
+    u"""
+    将通配符列表编译为扩展名集合
+
+    形如 ``*.java`` 的通配符直接转换为扩展名，其余通配符保留并使用 ``fnmatch`` 匹配。
+
+    :param patterns: 文件类型的通配符列表，形如 ``["*.java", "*.js"]``
+    :type patterns: list
+    :return: ``(扩展名集合, 其余通配符元组)``
+    :rtype: tuple
+    """
+    extensions = set()
+    others = []
+    for pattern in patterns:
+        ext = pattern[1:]
+        if pattern.startswith("*.") and not any(
+                c in ext for c in "*?[]/\\"):
+            extensions.add(os.path.normcase(ext))
+        else:
+            others.append(pattern)
+    return frozenset(extensions), tuple(others)
+
+
+def _iter_dir(path):
+    u"""
+    列出目录内容，返回 ``(名称, 路径, 是否为目录)`` 构成的元组
+
+    优先使用 ``scandir`` ，不可用时退回 ``os.listdir`` 。
+    """
+    if scandir is not None:
+        for entry in scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            yield entry.name, entry.path, is_dir
+    else:
+        for name in os.listdir(path):
+            entry_path = os.path.join(path, name)
+            yield name, entry_path, os.path.isdir(entry_path)
+
+
+class ProjectFileIndex(object):
+    u"""
+    工程文件索引
+
+    仅遍历一次工程目录，按扩展名集合匹配文件，并将文件按模块分桶存储，供代码文件收集、图片
+    检索等操作直接读取，避免重复列举目录。遍历时一并建立 ``src`` 目录下相对路径到所在模块的
+    位置索引，按调用路径查找文件时无需逐个模块探测：
+
+    .. code:: python
+
+        index.locate("com/fr/web/images/img.png")
+        # [("base", "./project/base/src/com/fr/web/images/img.png")]
+
+    .. note:: 与原先 ``os.walk`` + ``glob`` 的行为保持一致：模块根目录下的文件与以
+        ``.`` 开头的文件不会被收录， ``.svn`` 目录会被跳过。
+
+    :ivar str root: 工程文件的根目录( ``project`` 目录)
+    :ivar list patterns: 收录的文件类型通配符列表
+    :ivar list exclude_dirs: ``project`` 下需要排除的子目录
+    :ivar str src_dir: 模块中的代码目录，位置索引中的路径相对于此目录
+    :ivar int files_walked: 遍历过的文件数(含未收录的文件)
+
+    索引同时缓存扫描时检测到的代码文件编码，文件变化或移除时丢弃。
+    """
+    skip_dirs = frozenset([".svn"])
+
+    def __init__(self, root, patterns, exclude_dirs=None, src_dir="src"):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        :param patterns: 收录的文件类型通配符列表
+        :type patterns: list
+        :param exclude_dirs: ``project`` 下需要排除的子目录
+        :type exclude_dirs: list
+        :param src_dir: 模块中的代码目录
+        :type src_dir: str
+        """
+        self.root = root
+        self.patterns = list(patterns)
+        self.exclude_dirs = list(exclude_dirs or [])
+        self.src_dir = src_dir
+        self._extensions, self._others = compile_patterns(self.patterns)
+        # {模块: {扩展名: [文件路径]}}
+        self._buckets = {}
+        # {src 相对路径: [(模块, 文件路径)]}
+        self._locations = {}
+        self._file_set = None
+        # {文件路径: 编码}
+        self._encodings = {}
+        self._built = False
+        self.files_walked = 0
+
+    def build(self):
+        u"""
+        遍历工程目录，建立索引
+        """
+        self._buckets = {}
+        self._locations = {}
+        self._file_set = None
+        self._encodings = {}
+        self.files_walked = 0
+        for name, path, is_dir in _iter_dir(self.root):
+            if is_dir and name not in self.exclude_dirs:
+                self._buckets[name] = self._scan_module(name, path)
+        self._built = True
+        return self
+
+    def _scan_module(self, module, module_path):
+        u"""
+        扫描单个模块目录，并将 ``src`` 目录下的文件加入位置索引
+
+        :param module: 模块目录名称
+        :type module: str
+        :param module_path: 模块目录路径
+        :type module_path: str
+        :return: 按扩展名分组的文件路径
+        :rtype: dict
+        """
+        bucket = {}
+        stack = [(module_path, True)]
+        while stack:
+            dir_path, is_top = stack.pop()
+            try:
+                entries = list(_iter_dir(dir_path))
+            except OSError:
+                continue
+            sub_dirs = []
+            for name, path, is_dir in entries:
+                if is_dir:
+                    if name not in self.skip_dirs:
+                        sub_dirs.append(path)
+                    continue
+                self.files_walked += 1
+                if not is_top and self._match(name):
+                    ext = os.path.normcase(os.path.splitext(name)[1])
+                    bucket.setdefault(ext, []).append(path)
+            # 保持遍历顺序稳定
+            sub_dirs.sort(reverse=True)
+            stack.extend((d, False) for d in sub_dirs)
+        for files in bucket.itervalues():
+            files.sort()
+            for path in files:
+                self._add_location(module, path)
+        return bucket
+
+    def _get_src_rel_path(self, module, path):
+        u"""
+        计算文件相对于模块 ``src`` 目录的路径，使用 ``/`` 分隔
+
+        :return: 相对路径，文件不在 ``src`` 目录下时返回 ``None``
+        :rtype: str
+        """
+        prefix = os.path.join(self.root, module, self.src_dir) + os.sep
+        if not path.startswith(prefix):
+            return None
+        return path[len(prefix):].replace(os.sep, "/")
+
+    def _add_location(self, module, path):
+        rel_path = self._get_src_rel_path(module, path)
+        if rel_path is not None:
+            locations = self._locations.setdefault(rel_path, [])
+            if (module, path) not in locations:
+                locations.append((module, path))
+                locations.sort()
+
+    def _discard_location(self, module, path):
+        rel_path = self._get_src_rel_path(module, path)
+        locations = self._locations.get(rel_path)
+        if locations and (module, path) in locations:
+            locations.remove((module, path))
+            if not locations:
+                del self._locations[rel_path]
+
+    def _match(self, name):
+        u"""
+        判断文件名是否符合收录的文件类型
+        """
+        if name.startswith("."):
+            return False
+        ext = os.path.normcase(os.path.splitext(name)[1])
+        if ext in self._extensions:
+            return True
+        for pattern in self._others:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    @property
+    def modules(self):
+        u"""
+        已索引的模块目录名称列表
+        """
+        self._ensure_built()
+        return sorted(self._buckets.keys())
+
+    def get_files(self, module, patterns=None, sub_path=None):
+        u"""
+        获取模块中符合类型的文件
+
+        :param module: 模块包目录名称，如 ``base``
+        :type module: str
+        :param patterns: 文件类型的通配符列表，不设置则返回所有已收录的文件
+        :type patterns: list
+        :param sub_path: 模块内的相对路径，设置后仅返回该路径下的文件
+        :type sub_path: str
+        :return: 文件路径列表
+        :rtype: list
+        """
+        self._ensure_built()
+        bucket = self._buckets.get(module)
+        if bucket is None:
+            # 被排除的模块按需索引
+            module_path = os.path.join(self.root, module)
+            if not os.path.isdir(module_path):
+                return []
+            bucket = self._buckets[module] = self._scan_module(
+                module, module_path)
+            self._file_set = None
+        if patterns is None:
+            files = [f for ext in sorted(bucket) for f in bucket[ext]]
+        else:
+            extensions, others = compile_patterns(patterns)
+            files = []
+            for ext in sorted(bucket):
+                if ext in extensions:
+                    files.extend(bucket[ext])
+                elif others:
+                    files.extend(
+                        f for f in bucket[ext]
+                        if any(fnmatch.fnmatch(os.path.basename(f), p)
+                               for p in others))
+        if sub_path is not None:
+            prefix = os.path.join(self.root, module, sub_path)
+            prefix = prefix.rstrip("/\\") + os.sep
+            files = [f for f in files if f.startswith(prefix)]
+        return files
+
+    def has_file(self, path):
+        u"""
+        判断文件是否已被索引
+
+        :param path: 文件路径，需与索引中的路径形式一致( ``root`` 拼接相对路径)
+        :type path: str
+        :rtype: bool
+        """
+        self._ensure_built()
+        if self._file_set is None:
+            self._file_set = set(
+                f for bucket in self._buckets.itervalues()
+                for files in bucket.itervalues() for f in files)
+        return path in self._file_set
+
+    def add_file(self, module, path):
+        u"""
+        向索引中增加文件，用于在迁移写入后保持索引与磁盘一致，已缓存的编码被丢弃
+        """
+        self._ensure_built()
+        self._encodings.pop(path, None)
+        name = os.path.basename(path)
+        if not self._match(name):
+            return
+        ext = os.path.normcase(os.path.splitext(name)[1])
+        files = self._buckets.setdefault(module, {}).setdefault(ext, [])
+        if path not in files:
+            files.append(path)
+            files.sort()
+            self._add_location(module, path)
+            if self._file_set is not None:
+                self._file_set.add(path)
+
+    def discard_file(self, module, path):
+        u"""
+        从索引中移除文件，用于在迁移删除后保持索引与磁盘一致
+        """
+        self._ensure_built()
+        ext = os.path.normcase(os.path.splitext(path)[1])
+        files = self._buckets.get(module, {}).get(ext, [])
+        if path in files:
+            files.remove(path)
+        self._discard_location(module, path)
+        self._encodings.pop(path, None)
+        if self._file_set is not None:
+            self._file_set.discard(path)
+
+    def get_encoding(self, path):
+        u"""
+        取出扫描时检测到的文件编码
+
+        :param path: 文件路径
+        :type path: str
+        :return: 编码，尚未检测或文件已变化时返回 ``None``
+        :rtype: str
+        """
+        return self._encodings.get(path)
+
+    def set_encoding(self, path, encoding):
+        u"""
+        缓存文件编码
+
+        :param path: 文件路径
+        :type path: str
+        :param encoding: 编码，取值见
+            :func:`~FSUtils.transfer.file_ops.detect_encoding`
+        :type encoding: str
+        """
+        self._encodings[path] = encoding
+
+    def update_path(self, path):
+        u"""
+        同步磁盘上单个路径的变化，路径可以是新建、修改或删除的文件或目录
+
+        :param path: 发生变化的路径，需与索引中的路径形式一致( ``root`` 拼接相对路径)
+        :type path: str
+        :return: 受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表
+        :rtype: list
+        """
+        self._ensure_built()
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        module = parts[0]
+        if module in (os.curdir, os.pardir) or \
+                any(p in self.skip_dirs for p in parts[1:]):
+            return []
+        if module not in self._buckets:
+            module_path = os.path.join(self.root, module)
+            if module in self.exclude_dirs or not os.path.isdir(module_path):
+                return []
+            # 新建的模块目录
+            self._buckets[module] = self._scan_module(module, module_path)
+            self._file_set = None
+            return [(module, f, True) for f in self.get_files(module)]
+        if os.path.isdir(path):
+            changes = []
+            stack = [path]
+            while stack:
+                dir_path = stack.pop()
+                try:
+                    entries = list(_iter_dir(dir_path))
+                except OSError:
+                    continue
+                for name, entry_path, is_dir in entries:
+                    if is_dir:
+                        if name not in self.skip_dirs:
+                            stack.append(entry_path)
+                    elif dir_path != os.path.join(self.root, module) and \
+                            self._match(name):
+                        self.add_file(module, entry_path)
+                        changes.append((module, entry_path, True))
+            return sorted(changes)
+        if os.path.isfile(path):
+            if len(parts) > 2 and self._match(parts[-1]):
+                self.add_file(module, path)
+                return [(module, path, True)]
+            return []
+        # 已删除的文件或目录
+        prefix = path.rstrip("/\\") + os.sep
+        removed = [f for files in self._buckets[module].itervalues()
+                   for f in files if f == path or f.startswith(prefix)]
+        for f in removed:
+            self.discard_file(module, f)
+        if len(parts) == 1:
+            del self._buckets[module]
+        return [(module, f, False) for f in sorted(removed)]
+
+    def locate(self, rel_path, modules=None):
+        u"""
+        按 ``src`` 目录下的相对路径查找文件
+
+        :param rel_path: 相对于模块 ``src`` 目录的路径，如 ``com/fr/web/images/img.png``
+        :type rel_path: str
+        :param modules: 仅在指定的模块中查找，不设置则查找所有已索引的模块
+        :type modules: list
+        :return: 按模块名称排序的 ``(模块, 文件路径)`` 元组列表
+        :rtype: list
+        """
+        self._ensure_built()
+        locations = self._locations.get(rel_path.replace("\\", "/"), [])
+        if modules is not None:
+            locations = [loc for loc in locations if loc[0] in modules]
+        return list(locations)
+
+    def duplicate_locations(self):
+        u"""
+        取出在多个模块中同时存在的相对路径
+
+        :return: 相对路径与所在模块列表的映射
+        :rtype: dict
+        """
+        self._ensure_built()
+        return dict((rel_path, [module for module, path in locations])
+                    for rel_path, locations in self._locations.iteritems()
+                    if len(locations) > 1)
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Linux ioctl FICLONE，在支持写时复制的文件系统(btrfs、xfs 等)上共享数据块
+_FICLONE = 0x40049409
+# 不支持零拷贝时退回常规复制的错误码
+_fallback_errors = frozenset(
+    getattr(errno, name) for name in
+    ["EXDEV", "EINVAL", "ENOSYS", "ENOTSUP", "EOPNOTSUPP", "ENOTTY", "EBADF",
+     "EPERM", "ETXTBSY"] if hasattr(errno, name))
+# libc 中的内核复制函数，首次复制时加载
+_kernel_copy_funcs = None
+_non_ascii_regex = re.compile(r"[\x80-\xff]")
+
+
+def detect_encoding(data):
+    u"""
+    检测代码文件内容的编码
+
+    只包含 ASCII 字符时为 ``ascii`` ，可按 UTF-8 解码时为 ``utf-8`` (含 BOM)，否则视为
+    ``gbk`` 。
+
+    :param data: 文件内容
+    :type data: str
+    :rtype: str
+    """
+    if _non_ascii_regex.search(data) is None:
+        return "ascii"
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return "gbk"
+    return "utf-8"
+
+
+def bytes_to_json(value):
+    u"""
+    将字节串转换为 JSON 字符串， ``latin-1`` 可无损往返任意字节
+
+    :param value: 字节串或 ``None``
+    :type value: str
+    :rtype: unicode
+    """
+    if value is None:
+        return None
+    return value.decode("latin-1")
+
+
+def bytes_from_json(value):
+    u"""
+    将 :func:`bytes_to_json` 得到的 JSON 字符串还原为字节串
+
+    :param value: JSON 字符串或 ``None``
+    :type value: unicode
+    :rtype: str
+    """
+    if value is None:
+        return None
+    return value.encode("latin-1")
+
+
+def replace_file(src, dst):
+    u"""
+    使用 ``src`` 替换 ``dst`` ，同一文件系统下为原子操作
+
+    :param src: 新文件路径
+    :type src: str
+    :param dst: 被替换的文件路径
+    :type dst: str
+    """
+    if os.name == "nt" and os.path.exists(dst):
+        # Windows 下 rename 不能覆盖已存在的文件
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w"):
+    u"""
+    原子写入文件
+
+    内容先写入同目录下的临时文件，成功后替换原文件并保留原文件权限，新文件按 umask 设置权限；
+    出现异常时删除临时文件，原文件保持不变。
+
+    .. code:: python
+
+        with atomic_write("fr.properties") as f:
+            f.write(content)
+
+    :param path: 目标文件路径
+    :type path: str
+    :param mode: 文件打开模式， ``"w"`` 或 ``"wb"``
+    :type mode: str
+    """
+    dir_name, base_name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix="." + base_name + ".", dir=dir_name)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            # mkstemp 创建的文件权限为 0600，新文件按 umask 设置权限
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0666 & ~umask)
+        replace_file(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_empty_dirs(path):
+    u"""
+    自底向上删除目录下的空目录，跳过 ``.svn`` 目录
+
+    :param path: 需要清理的目录
+    :type path: str
+    """
+    for root, dirs, files in os.walk(path, topdown=False):
+        if ".svn" in root:
+            continue
+        for d in dirs:
+            dir_path = os.path.join(root, d)
+            if not os.listdir(dir_path):
+                os.rmdir(dir_path)
+
+
+def same_device(src, dst):
+    u"""
+    判断 ``src`` 与 ``dst`` 所在目录是否位于同一文件系统
+
+    :param src: 源文件路径
+    :type src: str
+    :param dst: 目标文件路径，所在目录需已存在
+    :type dst: str
+    :rtype: bool
+    """
+    try:
+        dst_dir = os.path.dirname(os.path.abspath(dst))
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def _reflink(src_file, dst_file):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+    except (IOError, OSError) as e:
+        if e.errno in _fallback_errors:
+            return False
+        raise
+    return True
+
+
+def _get_kernel_copy_funcs():
+    u"""
+    通过 ``ctypes`` 取出 libc 中的 ``copy_file_range`` 与 ``sendfile`` ，仅在 Linux 下使用，
+    首次调用后缓存
+
+    :return: ``(名称, 函数)`` 构成的元组列表，不可用时为空列表
+    :rtype: list
+    """
+    global _kernel_copy_funcs
+    if _kernel_copy_funcs is not None:
+        return _kernel_copy_funcs
+    _kernel_copy_funcs = []
+    if not sys.platform.startswith("linux"):
+        return _kernel_copy_funcs
+    try:
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return _kernel_copy_funcs
+    offset_p = ctypes.POINTER(ctypes.c_int64)
+    # ssize_t copy_file_range(int, loff_t *, int, loff_t *, size_t, unsigned)
+    func = getattr(libc, "copy_file_range", None)
+    if func is not None:
+        func.restype = ctypes.c_ssize_t
+        func.argtypes = [ctypes.c_int, offset_p, ctypes.c_int, offset_p,
+                         ctypes.c_size_t, ctypes.c_uint]
+        _kernel_copy_funcs.append(("copy_file_range", func))
+    # ssize_t sendfile64(int out_fd, int in_fd, off64_t *, size_t)
+    func = getattr(libc, "sendfile64", None)
+    if func is not None:
+        func.restype = ctypes.c_ssize_t
+        func.argtypes = [ctypes.c_int, ctypes.c_int, offset_p,
+                         ctypes.c_size_t]
+        _kernel_copy_funcs.append(("sendfile", func))
+    return _kernel_copy_funcs
+
+
+def _kernel_copy(src_file, dst_file, size):
+    u"""
+    在内核中复制文件内容，依次尝试 ``copy_file_range`` 与 ``sendfile``
+
+    :return: 是否完成复制，均不可用时返回 ``False``
+    :rtype: bool
+    """
+    src_fd, dst_fd = src_file.fileno(), dst_file.fileno()
+    for name, func in _get_kernel_copy_funcs():
+        # 两个函数均按指针中的偏移读取并推进偏移
+        in_offset = ctypes.c_int64(0)
+        out_offset = ctypes.c_int64(0)
+        try:
+            while in_offset.value < size:
+                count = size - in_offset.value
+                if name == "sendfile":
+                    sent = func(dst_fd, src_fd, ctypes.byref(in_offset),
+                                count)
+                else:
+                    sent = func(src_fd, ctypes.byref(in_offset), dst_fd,
+                                ctypes.byref(out_offset), count, 0)
+                if sent < 0:
+                    code = ctypes.get_errno()
+                    raise OSError(code, os.strerror(code))
+                if sent == 0:
+                    break
+        except OSError as e:
+            if in_offset.value == 0 and e.errno in _fallback_errors:
+                continue
+            raise
+        if in_offset.value >= size:
+            return True
+        # 文件在复制过程中变短，交由常规复制处理
+        dst_file.seek(0)
+        dst_file.truncate()
+        return False
+    return False
+
+
+def copy_file(src, dst, hardlink=False):
+    u"""
+    复制文件，保留权限与时间等元数据，与 ``shutil.copy2`` 复制到文件路径的结果一致
+
+    依次尝试：同一文件系统且允许时创建硬链接；写时复制( ``reflink`` )；内核零拷贝
+    ( ``copy_file_range`` / ``sendfile`` ，通过 ``ctypes`` 调用 libc)；均不可用时退回
+    ``shutil.copyfileobj`` 。
+
+    :param src: 源文件路径
+    :type src: str
+    :param dst: 目标文件路径
+    :type dst: str
+    :param hardlink: 同一文件系统下是否使用硬链接代替复制，硬链接与源文件共享内容与元数据
+    :type hardlink: bool
+    :return: 使用的复制方式， ``hardlink`` 、 ``reflink`` 、 ``kernel`` 或 ``copy``
+    :rtype: str
+    """
+    if hardlink and hasattr(os, "link") and same_device(src, dst):
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in _fallback_errors:
+                raise
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            raise shutil.Error("`%s` and `%s` are the same file" % (src, dst))
+        # 目标为硬链接时先断开，避免改写共享的内容
+        if os.stat(dst).st_nlink > 1:
+            os.remove(dst)
+    method = "copy"
+    with open(src, "rb") as src_file:
+        with open(dst, "wb") as dst_file:
+            if _reflink(src_file, dst_file):
+                method = "reflink"
+            elif _kernel_copy(src_file, dst_file,
+                              os.fstat(src_file.fileno()).st_size):
+                method = "kernel"
+            else:
+                shutil.copyfileobj(src_file, dst_file)
+    shutil.copystat(src, dst)
+    return method
+
+
+def move_file(src, dst):
+    u"""
+    移动文件，同一文件系统下直接重命名，否则复制后删除源文件
+
+    :param src: 源文件路径
+    :type src: str
+    :param dst: 目标文件路径
+    :type dst: str
+    :return: 使用的移动方式， ``rename`` 或复制方式
+    :rtype: str
+    """
+    if same_device(src, dst):
+        try:
+            replace_file(src, dst)
+            return "rename"
+        except OSError as e:
+            if e.errno not in _fallback_errors:
+                raise
+    method = copy_file(src, dst)
+    os.remove(src)
+    return method
+
+
+def hash_file(path, algorithm="sha1", chunk_size=64 * 1024):
+    u"""
+    分块读取并计算文件内容摘要，内存占用与文件大小无关
+
+    :param path: 文件路径
+    :type path: str
+    :param algorithm: ``hashlib`` 支持的摘要算法
+    :type algorithm: str
+    :param chunk_size: 每次读取的字节数
+    :type chunk_size: int
+    :return: 十六进制摘要
+    :rtype: str
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+    return digest.hexdigest()
+
+
+def hash_files(paths, workers=1, algorithm="sha1"):
+    u"""
+    并发计算多个文件的内容摘要， ``hashlib`` 计算较大的数据块时会释放全局解释器锁
+
+    :param paths: 文件路径列表
+    :type paths: list
+    :param workers: 线程数
+    :type workers: int
+    :param algorithm: ``hashlib`` 支持的摘要算法
+    :type algorithm: str
+    :return: 与 ``paths`` 顺序一致的摘要列表
+    :rtype: list
+    """
+    paths = list(paths)
+    if workers <= 1 or len(paths) < 2:
+        return [hash_file(p, algorithm) for p in paths]
+    pool = ThreadPool(min(workers, len(paths)))
+    try:
+        return pool.map(lambda p: hash_file(p, algorithm), paths)
+    finally:
+        pool.close()
+        pool.join()
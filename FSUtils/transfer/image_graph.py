@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import json
+import os
+
+from file_ops import atomic_write, bytes_from_json, bytes_to_json
+
+
+class ImageGraph(object):
+    u"""
+    代码文件与图片的引用关系图
+
+    覆盖所有模块的代码文件，同时保存代码文件到其引用图片的邻接表与图片到引用它的代码文件的
+    反向邻接表，按图片查询引用文件为常数时间。关系图可保存为 JSON 文件，再次加载时只重新扫描
+    修改时间或大小发生变化的代码文件：
+
+    .. code:: python
+
+        graph = ImageGraph.load("./log/image_graph.json", "./project")
+        graph.sync(files, extract, signature)
+        graph.referencing_files("com/fr/web/images/a.png")
+        # set(["fservice/src/com/fr/fs/A.java"])
+        graph.save("./log/image_graph.json")
+
+    代码文件以到根目录的 ``/`` 分隔相对路径表示，图片以调用路径表示。
+
+    :ivar str root: 工程文件的根目录( ``project`` 目录)
+    :ivar str signature: 扫描配置签名，与同步时的签名不一致时清空关系图
+    """
+    _version = 1
+
+    def __init__(self, root):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        """
+        self.root = root
+        self.signature = None
+        # {代码文件: (模块, 修改时间, 文件大小, [图片])}
+        self._sources = {}
+        # {图片: set(代码文件)}
+        self._images = {}
+        # {模块: {图片: 引用该图片的代码文件数}}
+        self._module_images = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._sources)
+
+    def relative(self, path):
+        u"""
+        代码文件到根目录的相对路径
+        """
+        return os.path.relpath(path, self.root).replace("\\", "/")
+
+    def clear(self):
+        self._sources = {}
+        self._images = {}
+        self._module_images = {}
+        self._dirty = True
+
+    def add_source(self, src, module, images, mtime=None, size=None):
+        u"""
+        加入或替换代码文件的引用关系
+
+        :param src: 代码文件相对路径
+        :type src: str
+        :param module: 代码文件所在模块
+        :type module: str
+        :param images: 代码文件引用的图片调用路径列表
+        :type images: list
+        """
+        self.remove_source(src)
+        self._sources[src] = (module, mtime, size, list(images))
+        counts = self._module_images.setdefault(module, {})
+        for image in set(images):
+            self._images.setdefault(image, set()).add(src)
+            counts[image] = counts.get(image, 0) + 1
+        self._dirty = True
+
+    def remove_source(self, src):
+        u"""
+        移除代码文件及其引用关系
+        """
+        entry = self._sources.pop(src, None)
+        if entry is None:
+            return
+        counts = self._module_images[entry[0]]
+        for image in set(entry[3]):
+            refs = self._images.get(image)
+            if refs is not None:
+                refs.discard(src)
+                if not refs:
+                    del self._images[image]
+            counts[image] -= 1
+            if not counts[image]:
+                del counts[image]
+        self._dirty = True
+
+    def sync(self, files, extract, signature=None):
+        u"""
+        与工程同步：移除已不存在的代码文件，对新增或发生变化的代码文件重新扫描
+
+        :param files: ``(模块, 文件路径)`` 构成的元组列表，为需要收录的全部代码文件
+        :type files: list
+        :param extract: 扫描函数，参数为文件路径列表，返回与之顺序一致的图片调用路径列表
+        :type extract: callable
+        :param signature: 扫描配置签名
+        :type signature: str
+        :return: 重新扫描的文件数
+        :rtype: int
+        """
+        if signature is not None and signature != self.signature:
+            self.clear()
+            self.signature = signature
+        stale = []
+        current = set()
+        for module, path in files:
+            src = self.relative(path)
+            current.add(src)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            old = self._sources.get(src)
+            if old is None or old[:3] != (module, st.st_mtime, st.st_size):
+                stale.append((module, path, src, st))
+        for src in [s for s in self._sources if s not in current]:
+            self.remove_source(src)
+        if stale:
+            results = extract([path for m, path, s, st in stale])
+            for (module, path, src, st), images in zip(stale, results):
+                self.add_source(src, module, images, st.st_mtime, st.st_size)
+        return len(stale)
+
+    def update(self, changes, extract):
+        u"""
+        按文件变化增量更新：移除已删除的代码文件，重新扫描新增或修改的代码文件，不检查其余文件
+
+        :param changes: ``(模块, 文件路径, 是否存在)`` 构成的元组列表，取自
+            :meth:`~FSUtils.transfer.scan_engine.ScanEngine.update`
+        :type changes: list
+        :param extract: 扫描函数，参数为文件路径列表，返回与之顺序一致的图片调用路径列表
+        :type extract: callable
+        :return: 受影响的模块集合
+        :rtype: set
+        """
+        modules = set()
+        stale = []
+        for module, path, exists in changes:
+            src = self.relative(path)
+            old_module = self.module_of(src)
+            if old_module is not None:
+                modules.add(old_module)
+            self.remove_source(src)
+            if not exists:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stale.append((module, path, src, st))
+            modules.add(module)
+        if stale:
+            results = extract([path for m, path, s, st in stale])
+            for (module, path, src, st), images in zip(stale, results):
+                self.add_source(src, module, images, st.st_mtime, st.st_size)
+        return modules
+
+    def sources(self, modules=None):
+        u"""
+        按路径顺序取出代码文件及其引用的图片
+
+        :param modules: 只取出指定模块中的代码文件，不设置则取出全部
+        :type modules: list
+        :return: ``(代码文件, 模块, [图片])`` 构成的元组列表
+        :rtype: list
+        """
+        modules = None if modules is None else set(modules)
+        return [(src, entry[0], entry[3])
+                for src, entry in sorted(self._sources.iteritems())
+                if modules is None or entry[0] in modules]
+
+    def module_of(self, src):
+        u"""
+        代码文件所在的模块，未收录时返回 ``None``
+        """
+        entry = self._sources.get(src)
+        return entry and entry[0]
+
+    def images_of(self, src):
+        u"""
+        代码文件引用的图片调用路径列表
+        """
+        entry = self._sources.get(src)
+        return list(entry[3]) if entry else []
+
+    def referencing_files(self, image):
+        u"""
+        引用图片的代码文件
+
+        :param image: 图片调用路径
+        :type image: str
+        :rtype: set
+        """
+        return self._images.get(image, frozenset())
+
+    def images_used_by(self, modules):
+        u"""
+        指定模块中的代码文件引用的所有图片
+
+        :param modules: 模块列表
+        :type modules: list
+        :rtype: set
+        """
+        images = set()
+        for module in set(modules):
+            images.update(self._module_images.get(module, ()))
+        return images
+
+    def unused_images(self, images, modules=None):
+        u"""
+        取出没有被引用的图片
+
+        :param images: 待检查的图片调用路径
+        :type images: list
+        :param modules: 只考虑指定模块中的引用，不设置则考虑全部模块
+        :type modules: list
+        :rtype: list
+        """
+        modules = None if modules is None else set(modules)
+        unused = []
+        for image in images:
+            refs = self._images.get(image, ())
+            if not any(modules is None or self._sources[s][0] in modules
+                       for s in refs):
+                unused.append(image)
+        return unused
+
+    def dependency_counts(self, locate):
+        u"""
+        统计模块间的图片引用数
+
+        :param locate: 查找图片所在模块的函数，参数为图片调用路径，返回模块列表
+        :type locate: callable
+        :return: ``{引用模块: {图片所在模块: 引用数}}`` ，只统计跨模块的引用，找不到的图片
+            记在 ``None`` 下
+        :rtype: dict
+        """
+        counts = {}
+        for image, refs in self._images.iteritems():
+            owners = locate(image) or [None]
+            for src in refs:
+                module = self._sources[src][0]
+                if module in owners:
+                    continue
+                row = counts.setdefault(module, {})
+                row[owners[0]] = row.get(owners[0], 0) + 1
+        return counts
+
+    def save(self, path):
+        u"""
+        保存关系图，内容未变化时不写入
+
+        :param path: 文件路径
+        :type path: str
+        """
+        if not self._dirty and os.path.exists(path):
+            return
+        data = {
+            "version": self._version,
+            "signature": self.signature,
+            "sources": dict(
+                (bytes_to_json(src), [module, mtime, size,
+                                      [bytes_to_json(img) for img in images]])
+                for src, (module, mtime, size, images)
+                in self._sources.iteritems()),
+        }
+        with atomic_write(path) as f:
+            json.dump(data, f, sort_keys=True)
+        self._dirty = False
+
+    @staticmethod
+    def load(path, root):
+        u"""
+        加载关系图，文件不存在或版本不一致时返回空的关系图
+
+        :param path: 文件路径
+        :type path: str
+        :param root: 工程文件的根目录
+        :type root: str
+        :rtype: :class:`ImageGraph`
+        """
+        graph = ImageGraph(root)
+        if not os.path.exists(path):
+            return graph
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except ValueError:
+            return graph
+        if data.get("version") != ImageGraph._version:
+            return graph
+        graph.signature = data["signature"]
+        for src, (module, mtime, size, images) in data["sources"].iteritems():
+            graph.add_source(bytes_from_json(src), module.encode("utf-8"),
+                             [bytes_from_json(img) for img in images],
+                             mtime, size)
+        graph._dirty = False
+        return graph
@@ -14,15 +14,54 @@
 
 __author__ = 'kyle'
 
-import glob
 import logging
 import os
-import shutil
 import re
 
+from file_ops import hash_files
+from image_graph import ImageGraph
+from path_trie import PathTrie
+from plan import ImagePlan
+from scan_engine import Extractor
 from transfer_base import TransferBase
 
 
+class ImagePathExtractor(Extractor):
+    u"""
+    图片引用路径扫描器
+
+    :ivar list img_pattern: 图片文件类型的通配符列表，形如 ``["*.jpg", "*.png"]``
+    """
+    name = "image_paths"
+    regex = "(com/fr.+\\.(?:%s))"
+
+    def __init__(self, patterns, img_pattern):
+        u"""
+        :param patterns: 扫描的代码文件类型通配符列表
+        :type patterns: list
+        :param img_pattern: 图片文件类型的通配符列表
+        :type img_pattern: list
+        """
+        super(ImagePathExtractor, self).__init__(patterns)
+        self.img_pattern = list(img_pattern)
+        extension_pattern = "|".join(
+            [ext.replace("*.", "") for ext in self.img_pattern])
+        self._regex = re.compile(self.regex % extension_pattern)
+
+    def get_config(self):
+        return self.img_pattern, self.regex
+
+    def get_index_patterns(self):
+        # 图片文件一并收录，供迁移时检索
+        return self.patterns + self.img_pattern
+
+    def extract(self, codes):
+        # 替换CR换行符
+        if "\n" not in codes:
+            codes = codes.replace("\r", "\n")
+        return self._regex.findall(codes)
+
+
 class ImageTransfer(TransferBase):
     u"""
     图片文件迁移工具
@@ -34,6 +73,9 @@ class ImageTransfer(TransferBase):
 
     .. note:: `ImageTransfer` 是 :class:`~FSUtils.transfer.TransferBase` 的子类。
 
+    .. note:: 同一图片存在于多个模块时，迁移模块名称排序后第一个模块中的图片并输出警告。
+        早期版本按 ``os.listdir`` 返回的顺序选择，结果随文件系统而不同。
+
     图片迁移工具调用方式：
 
     .. code:: python
@@ -49,17 +91,17 @@ class ImageTransfer(TransferBase):
         )
         trans.transfer()
 
-    :ivar list _module_dependencies: 目标模块依赖的图片索引列表，存储
-        ``{"代码相对路径": [代码引用的所有图片]}`` 构成的字典。
-    :ivar list _exclude_dependencies: 其余模块依赖的图片索引列表，存储
-        ``{"代码相对路径": [代码引用的所有图片]}`` 构成的字典。
-    :ivar set _module_images: 目标模块所用到的所有图片集合。
-    :ivar set _exclude_images: 其余模块所用到的所有图片集合。
-    :ivar dict _module_image_map: 目标模块中引用图片相对路径与绝对路径关系字典，key 为相对
-        路径。
-    :ivar list _module_in_use_images: 目标模块引用来自自身模块的图片列表。
-    :ivar list _module_unused_images: 目标模块中存储的未被自身使用的图片列表。
-    :ivar list _module_dependent_images: 目标模块引用的其他模块图片列表。
+    迁移过程分为分析与执行两个阶段，计划可保存后在其他时间或其他检出目录上执行，执行时不再扫描
+    工程：
+
+    .. code:: python
+
+        trans.plan().save("./work/image.plan.json")
+        TransferPlan.load("./work/image.plan.json").apply("./project")
+
+    :ivar image_graph: 所有模块的代码文件与图片的引用关系图。
+    :vartype image_graph: :class:`~FSUtils.transfer.image_graph.ImageGraph`
+    :ivar str image_graph_path: 引用关系图的保存路径，为 ``None`` 时不保存。
     :ivar list _transferred_images: 经过迁移的图片列表，储存
         ``(迁移前的调用相对路径， 迁移后的调用相对路径)`` 构成的元组。
 
@@ -72,11 +114,17 @@ class ImageTransfer(TransferBase):
     :ivar list target_exclude_dirs: 目标模块中需要排除的图片引用目录列表，用于排除对合成路
         径的处理。
     :ivar str target_dir: 迁移图片的目标路径。
+    :ivar int workers: 复制图片使用的线程数。
+    :ivar bool hardlink: 复制图片时是否在同一文件系统下使用硬链接。
+    :ivar bool dedup: 是否合并内容相同的图片。
+    :ivar str log_path: 输出信息的位置。
     """
     _img_dir_sep = ["images", "web/core"]
+    _analysis_steps = [("_filter_images", "filter"),
+                       ("_filter_module_images", "filter")]
 
-    _module_dependencies = []
-    _exclude_dependencies = []
+    image_graph = None
+    image_graph_path = None
     _module_images = set()
     _exclude_images = set()
     _module_image_map = {}
@@ -91,10 +139,16 @@ class ImageTransfer(TransferBase):
     target_dir_pattern = base_dir_pattern
     target_exclude_dirs = []
     target_dir = "./"
+    workers = 1
+    hardlink = False
+    dedup = False
+    log_path = "./"
 
     def __init__(self, root, modules, target_base, target_excludes,
                  target_dir=None, exclude_dirs=None, log_dir=None,
-                 log_level=logging.INFO):
+                 log_level=logging.INFO, cache_dir=None, jobs=1,
+                 scan_engine=None, workers=1, hardlink=False, dedup=False,
+                 profile=False, journal=False, image_graph=False):
         u"""
         初始化图片迁移工具
 
@@ -116,17 +170,147 @@ class ImageTransfer(TransferBase):
         :type log_dir: str
         :param log_level: 日志记录等级
         :type log_level: int
+        :param cache_dir: 扫描结果缓存目录，不设置则不使用缓存
+        :type cache_dir: str
+        :param jobs: 扫描代码文件使用的进程数，小于 ``1`` 时使用全部 CPU
+        :type jobs: int
+        :param scan_engine: 共用的代码扫描引擎
+        :type scan_engine: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+        :param workers: 复制图片使用的线程数，网络磁盘等延迟较高时可适当增加
+        :type workers: int
+        :param hardlink: 复制图片时在同一文件系统下使用硬链接代替复制
+        :type hardlink: bool
+        :param dedup: 是否合并内容相同的图片，每组只迁移一个文件，代码引用统一指向该文件
+        :type dedup: bool
+        :param profile: 是否使用 cProfile 采样各阶段，结果写入 ``log_dir``
+        :type profile: bool or list
+        :param journal: 是否使用预写日志，可通过 :meth:`rollback` 撤销迁移
+        :type journal: bool
+        :param image_graph: 引用关系图的保存路径，为 ``True`` 时保存为 ``log_dir`` 下的
+            ``image_graph.json`` ，默认不保存。保存时关系图代替 ``cache_dir`` 中的扫描结果
+            缓存，再次运行时只重新扫描发生变化的代码文件。
+        :type image_graph: bool or str
         """
         super(ImageTransfer, self).__init__(
             root, modules, exclude_dirs=exclude_dirs, log_dir=log_dir,
-            log_level=log_level)
+            log_level=log_level, cache_dir=cache_dir, jobs=jobs,
+            scan_engine=scan_engine, profile=profile, journal=journal)
         self.target_dir_pattern = target_base
         self.target_exclude_dirs = target_excludes
         if target_dir is not None:
             self.target_dir = target_dir
-        # 按代码及工程文件路径初始化数据
-        self._filter_images()
-        self._filter_module_images()
+        self.workers = workers
+        self.hardlink = hardlink
+        self.dedup = dedup
+        self.log_path = log_dir or "./"
+        if image_graph is True:
+            image_graph = os.path.join(self.log_path, "image_graph.json")
+        self.image_graph_path = image_graph or None
+        self.image_graph = None
+        self._transferred_images = []
+        self._tries = {}
+
+    @property
+    def module_images(self):
+        u"""
+        目标模块所用到的所有图片集合
+
+        :rtype: set
+        """
+        self._require("_filter_images")
+        return self._module_images
+
+    @property
+    def exclude_images(self):
+        u"""
+        其余模块所用到的所有图片集合
+
+        :rtype: set
+        """
+        self._require("_filter_images")
+        return self._exclude_images
+
+    @property
+    def module_image_map(self):
+        u"""
+        目标模块中图片调用路径与文件路径的映射
+
+        :rtype: dict
+        """
+        self._require("_filter_module_images")
+        return self._module_image_map
+
+    @property
+    def module_in_use_images(self):
+        u"""
+        目标模块引用来自自身模块的图片列表
+
+        :rtype: list
+        """
+        self._require("_filter_module_images")
+        return self._module_in_use_images
+
+    @property
+    def module_unused_images(self):
+        u"""
+        目标模块中存储的未被自身使用的图片列表
+
+        :rtype: list
+        """
+        self._require("_filter_module_images")
+        return self._module_unused_images
+
+    @property
+    def module_dependent_images(self):
+        u"""
+        目标模块引用的其他模块图片列表
+
+        :rtype: list
+        """
+        self._require("_filter_module_images")
+        return self._module_dependent_images
+
+    def refresh(self, paths=None, changes=None):
+        u"""
+        文件发生变化后重新整理图片调用与目标模块中的图片。给出 ``changes`` 时只将受影响的
+        代码文件更新到引用关系图，并只重新计算受影响模块的图片集合，关系图不写入文件
+
+        :param paths: 发生变化的路径列表，为 ``None`` 时视为全部变化
+        :type paths: list
+        :param changes: 受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表
+        :type changes: list
+        """
+        if changes is None or "_filter_images" not in self._analyzed:
+            self.invalidate()
+            self.analyze()
+            return
+        extractor = self.create_extractor()
+        engine = self.get_scan_engine()
+        targets = set(self.target_modules)
+        with self.stats.phase("filter"):
+            modules = self.get_image_graph().update(
+                [c for c in changes if extractor.match(c[1])],
+                lambda paths: engine.scan_files(extractor, paths, False))
+            if modules & targets:
+                self._module_images = set(
+                    [img for img in self.image_graph.images_used_by(targets)
+                     if not self._check_target_exclude(img)])
+            if modules - targets:
+                self._exclude_images = self.image_graph.images_used_by(
+                    [m for m in self.get_file_index().modules
+                     if m not in targets])
+        # 目标模块中的代码或图片变化时重新检索目标模块的图片
+        if any(module in targets for module, path, exists in changes):
+            self.invalidate(["_filter_module_images"])
+        self.analyze()
+
+    def summary(self):
+        return "Image: %d dependent, %d unused, %d in use." % (
+            len(self.module_dependent_images),
+            len(self.module_unused_images), len(self.module_in_use_images))
+
+    def _get_index_patterns(self):
+        return self.source_pattern + self.img_pattern
 
     def get_source_image_path(self, src_file):
         u"""
@@ -137,17 +321,15 @@ class ImageTransfer(TransferBase):
         :return: 当前代码中的所有图片的引用路径
         :rtype: list
         """
-        images = []
-        with open(src_file) as src:
-            codes = src.read()
-            # 替换CR换行符
-            if "\n" not in codes:
-                codes = codes.replace("\r", "\n")
-            extension_pattern = "|".join(
-                [ext.replace("*.", "") for ext in self.img_pattern])
-            regex = "(com/fr.+\.(?:%s))" % extension_pattern
-            images.extend(re.findall(regex, codes))
-        return images
+        return self.create_extractor().extract_file(src_file)
+
+    def create_extractor(self):
+        u"""
+        按当前配置创建图片引用路径扫描器
+
+        :rtype: :class:`ImagePathExtractor`
+        """
+        return ImagePathExtractor(self.source_pattern, self.img_pattern)
 
     def _filter_images(self):
         u"""
@@ -155,56 +337,91 @@ class ImageTransfer(TransferBase):
         """
         # 收集代码文件路径
         self.collect_source_files()
-        # 搜索图片调用
-        for src in self._module_files:
-            images = self.get_source_image_path(src)
-            src_path = os.path.relpath(src, self.project_root)
-            if len(images) > 0:
-                self._module_dependencies.append((src_path, images))
-        for src in self._exclude_files:
-            images = self.get_source_image_path(src)
-            src_path = os.path.relpath(src, self.project_root)
-            if len(images) > 0:
-                self._exclude_dependencies.append((src_path, images))
+        # 同步引用关系图，只重新扫描发生变化的代码文件
+        index = self.get_file_index()
+        files = [(module, path) for module in index.modules
+                 for path in self.get_module_files(module)]
+        engine = self.get_scan_engine()
+        extractor = self.create_extractor()
+        graph = self.get_image_graph()
+        # 保存的关系图本身即为扫描结果缓存
+        cache = self.image_graph_path is None
+        graph.sync(
+            files, lambda paths: engine.scan_files(extractor, paths, cache),
+            extractor.signature)
+        if self.image_graph_path is not None:
+            graph.save(self.image_graph_path)
         # 整理目标模块以及其余模块的图片调用
-        for src, dep in self._module_dependencies:
-            self._module_images |= set(dep)
-        for src, dep in self._exclude_dependencies:
-            self._exclude_images |= set(dep)
+        self._module_images = graph.images_used_by(self.target_modules)
+        self._exclude_images = graph.images_used_by(
+            [m for m in index.modules if m not in self.target_modules])
         # 去除目标模块需排除下的图片
         self._module_images = set(
             [img for img in self._module_images
              if not self._check_target_exclude(img)])
 
+    def get_image_graph(self):
+        u"""
+        获取引用关系图，首次调用时加载 ``image_graph_path`` 中保存的关系图
+
+        :rtype: :class:`~FSUtils.transfer.image_graph.ImageGraph`
+        """
+        if self.image_graph is None:
+            if self.image_graph_path is None:
+                self.image_graph = ImageGraph(self.project_root)
+            else:
+                self.image_graph = ImageGraph.load(
+                    self.image_graph_path, self.project_root)
+        return self.image_graph
+
+    def get_module_dependencies(self):
+        u"""
+        统计模块间的图片引用数
+
+        :return: ``{引用模块: {图片所在模块: 引用数}}`` ，找不到的图片记在 ``None`` 下
+        :rtype: dict
+        """
+        index = self.get_file_index()
+        return self.get_image_graph().dependency_counts(
+            lambda image: [m for m, p in index.locate(image)])
+
+    def dump_dependencies(self):
+        u"""
+        输出模块间的图片引用数到 ``dependencies.txt``
+        """
+        counts = self.get_module_dependencies()
+        with open(os.path.join(self.log_path, "dependencies.txt"), "w+") as f:
+            for module in sorted(counts):
+                for owner in sorted(counts[module]):
+                    f.write("%s -> %s: %d%s" % (
+                        module, owner or "(missing)", counts[module][owner],
+                        self._eol))
+
     def _filter_module_images(self):
         u"""
         检索目标模块依赖的其他模块图片以及目标模块中未使用的图片文件
         """
+        module_images = self.module_images
+        index = self.get_file_index()
+        self._module_image_map = {}
         for module in self.target_modules:
-            module_images = []
             src_path = os.path.join(self.project_root, module, self._src_dir)
-            img_path = os.path.join(src_path, self.target_dir_pattern)
-            # 取出所有图片文件信息
-            for root, dirs, files in os.walk(img_path):
-                if ".svn" in root:
-                    continue
-                for d in dirs:
-                    file_path = lambda p: os.path.join(root, d, p)
-                    for pattern in self.img_pattern:
-                        files = glob.glob(file_path(pattern))
-                        module_images.extend(files)
+            img_path = os.path.join(self._src_dir, self.target_dir_pattern)
+            # 从文件索引中取出所有图片文件信息
+            image_paths = index.get_files(module, self.img_pattern, img_path)
             # 建立相对路径与绝对路径映关系
-            for img in module_images:
+            for img in image_paths:
                 rel_path = self.reformat_path(os.path.relpath(img, src_path))
                 if not self._check_target_exclude(rel_path):
                     self._module_image_map[rel_path] = img
         image_files = set(self._module_image_map.keys())
         # 引用自己模块的图片
-        self._module_in_use_images = list(image_files & self._module_images)
+        self._module_in_use_images = list(image_files & module_images)
         # 未使用的图片
-        self._module_unused_images = list(image_files - self._module_images)
+        self._module_unused_images = self.get_image_graph().unused_images(
+            sorted(image_files), self.target_modules)
         # 引用其他模块的图片
-        self._module_dependent_images = list(self._module_images - image_files)
+        self._module_dependent_images = list(module_images - image_files)
 
     def _check_target_exclude(self, rel_path):
         u"""
@@ -215,144 +432,225 @@ class ImageTransfer(TransferBase):
         :return: 是否需要排除该图片
         :rtype: bool
         """
-        for ex_dir in self.target_exclude_dirs:
-            if rel_path.startswith(ex_dir):
-                return True
-        return False
+        return self._get_trie(self.target_exclude_dirs).match_prefix(rel_path)
+
+    def _get_trie(self, paths):
+        u"""
+        取出路径列表编译后的前缀树，列表内容不变时重复使用
+
+        :param paths: 路径列表
+        :type paths: list
+        :rtype: :class:`~FSUtils.transfer.path_trie.PathTrie`
+        """
+        key = tuple(paths)
+        trie = self._tries.get(key)
+        if trie is None:
+            trie = self._tries[key] = PathTrie(paths)
+        return trie
+
+    def _get_image_rel_path(self, rel_path):
+        u"""
+        按 ``_img_dir_sep`` 取出图片在目标目录中的相对路径
+
+        按 ``_img_dir_sep`` 的顺序使用第一个出现在调用路径中的分隔目录，取其第一次与第二次出现
+        之间的部分。
+
+        :param rel_path: 图片基于src目录的相对路径
+        :type rel_path: str
+        :return: 图片在目标目录中的相对路径，无法取出时返回空字符串
+        :rtype: str
+        """
+        positions = {}
+        for pos, sep in self._get_trie(self._img_dir_sep).find_all(rel_path):
+            positions.setdefault(sep, pos)
+        for sep in self._img_dir_sep:
+            if sep in positions:
+                start = positions[sep] + len(sep)
+                end = rel_path.find(sep, start)
+                return rel_path[start:] if end < 0 else rel_path[start:end]
+        return ""
 
-    def transfer(self):
+    def plan(self):
         u"""
-        迁移图片文件
+        生成图片迁移计划，不修改任何文件
+
+        :rtype: :class:`~FSUtils.transfer.plan.ImagePlan`
         """
+        plan = ImagePlan(self.project_root)
         # 复制目标模块引用其他模块的图片
-        for img in self._module_dependent_images:
-            if not self._transfer_image(img):
-                self.logger.error('Image "%s" not found.' % img)
-            else:
-                self.logger.info('"%s" transferred.' % img)
+        for img in self.module_dependent_images:
+            self._plan_transfer(plan, img)
         # 删除目标模块中未使用图片
-        for img in self._module_unused_images:
-            if not self._remove_image(img):
-                self.logger.error('Image "%s" not found.' % img)
-            else:
-                self.logger.info('"%s" removed.' % img)
+        for img in self.module_unused_images:
+            self._plan_remove(plan, img)
         # 迁移模块自身引用的图片
         target_call_path = self.generate_call_path(self.target_dir)
-        for img in self._module_in_use_images:
+        kept = []
+        for img in self.module_in_use_images:
             # 略过已经在目标路径中的
             if img.startswith(target_call_path):
+                kept.append(img)
                 continue
-            if not self._transfer_image(img, False):
-                self.logger.error('Image "%s" not found.' % img)
-            else:
-                self.logger.info('"%s" transferred.' % img)
+            self._plan_transfer(plan, img, False)
+        # 合并内容相同的图片
+        if self.dedup:
+            self._plan_dedup(plan, sorted(kept))
         # 修改代码调用
-        for img, target in self._transferred_images:
-            if not self._change_source_call(img, target):
-                self.logger.error('Replace "%s" error.' % img)
-            else:
-                self.logger.info('"%s" replaced.' % img)
+        plan.rewrites = self._plan_source_calls(plan.transferred)
+        index = self.get_file_index()
+        for src in plan.rewrites:
+            encoding = index.get_encoding(plan.resolve(src))
+            if encoding is not None:
+                plan.encodings[src] = encoding
         # 清理
-        self.clear_target_dirs()
+        plan.cleanup_dirs = [
+            plan.relative(os.path.join(self.project_root, m, self._src_dir))
+            for m in self.target_modules]
+        return plan
 
-    def _change_source_call(self, image, target):
+    def apply(self, plan):
         u"""
-        修改代码中的图片调用
+        执行图片迁移计划，并同步更新文件索引与修改过的代码文件的扫描结果
 
-        :param image: 先前的图片调用路径
-        :type image: str
-        :param target: 当前的图片调用路径
-        :type target: str
-        :return: 是否成功替换所有代码中对相关图片的引用
-        :rtype: bool
+        :param plan: 图片迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.ImagePlan`
+        :return: 成功替换了代码引用的图片调用路径集合
+        :rtype: set
+        """
+        replaced = plan.apply(
+            self.project_root, self.logger, self.workers, self.hardlink,
+            self.stats, self.journal)
+        self._transferred_images = list(plan.transferred)
+        self._sync_files(plan.changed_paths(self.project_root))
+        return replaced
+
+    def _plan_source_calls(self, transferred):
+        u"""
+        按代码文件归并需要修改的图片调用
+
+        每个代码文件在执行时只读写一次，并使用一个合并的正则表达式一次完成替换。
+
+        :param transferred: ``(先前的图片调用路径, 当前的图片调用路径)`` 构成的元组列表
+        :type transferred: list
+        :return: 代码文件与 ``{先前的图片调用路径: 当前的图片调用路径}`` 的映射
+        :rtype: dict
         """
-        success = False
-        for src, src_images in self._module_dependencies:
-            if image in src_images:
-                src_path = os.path.join(self.project_root, src)
-                # 替换代码中的图片调用
-                with open(src_path, "r") as f:
-                    code = f.read()
-                try:
-                    code = code.decode("utf-8").replace(image, target).\
-                        encode("utf-8")
-                except UnicodeDecodeError:
-                    code = code.decode("gbk").replace(image, target).\
-                        encode("gbk")
-                with open(src_path, "w") as f:
-                    f.write(code)
-                success = True
-        return success
-
-    def _transfer_image(self, rel_path, is_copy=True):
+        graph = self.get_image_graph()
+        modules = set(self.target_modules)
+        rewrites = {}
+        for image, target in transferred:
+            for src in graph.referencing_files(image):
+                if graph.module_of(src) in modules:
+                    rewrites.setdefault(src, {})[image] = target
+        return rewrites
+
+    def _plan_transfer(self, plan, rel_path, is_copy=True):
         u"""
-        基于图片调用路径迁移图片
+        基于图片调用路径计划图片迁移
 
+        :param plan: 图片迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.ImagePlan`
         :param rel_path: 图片基于src目录的相对路径
         :type rel_path: str
         :param is_copy: 是否为复制模式，若为 ``False`` ，则使用移动模式。默认值为 ``True``
         :type is_copy: bool
-        :return: 是否成功找到并迁移图片
+        :return: 是否找到图片
         :rtype: bool
         """
+        action = "copy" if is_copy else "move"
         # 获取图片在目标目录的相对路径
-        img_rel_path = ""
-        for sep in self._img_dir_sep:
-            if sep in rel_path:
-                rel_split = rel_path.split(sep)
-                if len(rel_split) > 1:
-                    img_rel_path = rel_split[1]
-                break
+        img_rel_path = self._get_image_rel_path(rel_path)
         # 未取出相对路径
         if not img_rel_path:
-            self.logger.error('Image "%s" not found' % rel_path)
+            plan.add_operation(action, rel_path, [])
             return False
         target_path = os.path.join(self.target_dir,
                                    self.trim_rel_path(img_rel_path))
-        # 通过路径搜索并完成图片迁移
-        success = False
-        for module in os.listdir(self.project_root):
-            image_path = os.path.join(
-                self.project_root, module, self._src_dir, rel_path)
-            target_dir = os.path.dirname(target_path)
-            if os.path.exists(image_path):
-                # 检查目标路径是否存在，不存在则自动创建
-                if not os.path.exists(target_dir):
-                    os.makedirs(target_dir)
-                t_path = image_path.replace(self.project_root, "(project)")
-                self.logger.debug("Copy %s\n  -> %s" % (t_path, target_dir))
-                shutil.copy2(image_path, target_dir)
-                # 移动操作删除原图片
-                if not is_copy:
-                    os.remove(image_path)
-                    self.logger.debug("Delete " + t_path)
-                success = True
-                break
+        # 通过位置索引查找图片，存在于多个模块时使用模块名称排序后的第一个，
+        # 不再依赖 os.listdir 的顺序
+        locations = self.get_file_index().locate(rel_path)
+        if len(locations) > 1:
+            self.logger.warning(
+                'Image "%s" found in multiple modules: %s.'
+                % (rel_path, ", ".join(m for m, p in locations)))
+        sources = [path for module, path in locations[:1]]
+        plan.add_operation(action, rel_path, sources, target_path)
         # 记录调用路径
         target_call_path = self.generate_call_path(target_path)
-        self._transferred_images.append((rel_path, target_call_path))
-        return success
+        plan.transferred.append((rel_path, target_call_path))
+        return bool(sources)
+
+    def _plan_dedup(self, plan, kept):
+        u"""
+        按内容合并计划中的图片
 
-    def _remove_image(self, rel_path):
+        只对大小相同的图片计算摘要。每组内容相同的图片保留第一个(已在目标路径中的图片优先，
+        其余按计划顺序)，其余图片不再复制，移动操作改为删除原文件，代码引用改为指向保留的图片。
+
+        :param plan: 图片迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.ImagePlan`
+        :param kept: 已在目标路径中、无需迁移的图片调用路径列表
+        :type kept: list
+        """
+        targets = dict(plan.transferred)
+        # (调用路径, 文件路径, 迁移后的调用路径, 操作)
+        candidates = [(img, self.module_image_map[img], img, None)
+                      for img in kept]
+        for op in plan.operations:
+            if op["action"] != "delete" and op["sources"]:
+                candidates.append((op["image"], plan.resolve(op["sources"][0]),
+                                   targets[op["image"]], op))
+        by_size = {}
+        for candidate in candidates:
+            size = os.path.getsize(candidate[1])
+            by_size.setdefault(size, []).append(candidate)
+        # 大小唯一的图片无需计算摘要
+        hashing = [c for size in sorted(by_size)
+                   for c in by_size[size] if len(by_size[size]) > 1]
+        digests = hash_files([c[1] for c in hashing], self.workers)
+        groups = {}
+        for candidate, digest in zip(hashing, digests):
+            groups.setdefault(digest, []).append(candidate)
+        order = dict((c[0], i) for i, c in enumerate(candidates))
+        dropped = set()
+        for group in sorted(groups.values(), key=lambda g: order[g[0][0]]):
+            canonical = group[0]
+            for img, path, call_path, op in group[1:]:
+                if op is None:
+                    continue
+                targets[img] = canonical[2]
+                plan.duplicates[img] = canonical[0]
+                plan.bytes_saved += os.path.getsize(path)
+                if op["action"] == "move":
+                    op["action"], op["target"] = "delete", None
+                else:
+                    dropped.add(id(op))
+                self.logger.info('Image "%s" merged into "%s".'
+                                 % (img, canonical[0]))
+        plan.operations = [op for op in plan.operations
+                           if id(op) not in dropped]
+        plan.transferred = [(img, targets[img]) for img, t in plan.transferred]
+        if plan.duplicates:
+            self.logger.info(
+                "Image dedup: %d duplicate(s), %d byte(s) saved."
+                % (len(plan.duplicates), plan.bytes_saved))
+
+    def _plan_remove(self, plan, rel_path):
         u"""
-        基于图片调用路径搜索并移除指定图片文件
+        基于图片调用路径搜索并计划移除指定图片文件
 
+        :param plan: 图片迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.ImagePlan`
         :param rel_path: 图片基于src目录的相对路径
         :type rel_path: str
-        :return: 是否成功找到并删除文件
+        :return: 是否找到图片
         :rtype: bool
         """
-        # 通过路径搜索删除未使用的图片
-        success = False
-        for module in self.target_modules:
-            image_path = os.path.join(
-                self.project_root, module, self._src_dir, rel_path)
-            if os.path.exists(image_path):
-                os.remove(image_path)
-                t_path = image_path.replace(self.project_root, "(project)")
-                self.logger.debug("Delete %s" % t_path)
-                success = True
-        return success
+        locations = self.get_file_index().locate(
+            rel_path, self.target_modules)
+        plan.add_operation(
+            "delete", rel_path, [path for module, path in locations])
+        return bool(locations)
 
     def generate_call_path(self, path):
         u"""
@@ -368,6 +666,10 @@ class ImageTransfer(TransferBase):
         return self.reformat_path(call)
 
 
+TransferBase.register_extractor(ImagePathExtractor(
+    ImageTransfer.source_pattern, ImageTransfer.img_pattern))
+
+
 if __name__ == '__main__':
     trans = ImageTransfer(
         root="E:/temp/project",
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import json
+import logging
+import os
+import shutil
+
+from file_ops import bytes_from_json, bytes_to_json, replace_file
+
+
+class Journal(object):
+    u"""
+    迁移预写日志
+
+    在迁移修改、创建或删除文件之前，先备份将被修改的文件并将记录写入磁盘，迁移完成后写入完成
+    标记。备份优先使用硬链接，迁移中的写入均为替换文件(原子写入、重命名或先删除再写入)，
+    不会修改备份指向的数据，因此备份几乎不占用额外的时间与空间；不支持硬链接时复制文件。
+
+    日志保留到下一次迁移开始，可通过 :meth:`rollback` 撤销最近一次迁移；迁移中断时日志没有
+    完成标记，下一次启动时由 :meth:`recover` 自动回滚。
+
+    .. code:: python
+
+        journal = Journal("./log/journal/image", "./project")
+        plan.apply("./project", journal=journal)
+        journal.rollback()
+
+    .. note:: 回滚只恢复日志中记录的文件，并删除迁移时新建且已为空的目录；迁移后清理的空目录
+        不会被恢复。
+
+    :ivar str path: 日志目录
+    :ivar str root: 工程文件的根目录( ``project`` 目录)，日志中的路径相对于此目录
+    """
+    _log_name = "journal.log"
+    _backup_dir = "backup"
+    _version = 1
+
+    def __init__(self, path, root):
+        u"""
+        :param path: 日志目录，通常位于日志输出目录下
+        :type path: str
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        """
+        self.path = path
+        self.root = root
+        self._log = None
+        self._recorded = set()
+        self._count = 0
+
+    @property
+    def log_path(self):
+        return os.path.join(self.path, self._log_name)
+
+    def exists(self):
+        u"""
+        磁盘上是否存在日志
+
+        :rtype: bool
+        """
+        return os.path.exists(self.log_path)
+
+    def _read(self):
+        u"""
+        读取日志记录，忽略中断时写入不完整的最后一行
+
+        :return: ``(记录列表, 是否完成)``
+        :rtype: tuple
+        """
+        entries = []
+        complete = False
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    break
+                if data.get("complete"):
+                    complete = True
+                elif "path" in data:
+                    entries.append(data)
+        return entries, complete
+
+    def is_complete(self):
+        u"""
+        磁盘上的日志是否已写入完成标记
+
+        :rtype: bool
+        """
+        return self.exists() and self._read()[1]
+
+    def _resolve(self, rel_path):
+        return os.path.join(self.root, *bytes_from_json(rel_path).split("/"))
+
+    def _relative(self, path):
+        rel_path = os.path.relpath(os.path.abspath(path),
+                                   os.path.abspath(self.root))
+        return bytes_to_json(rel_path.replace("\\", "/"))
+
+    def begin(self):
+        u"""
+        开始记录，丢弃上一次已完成迁移的日志；存在未完成的日志时先回滚
+        """
+        if self._log is not None:
+            return
+        if self.exists():
+            if not self.is_complete():
+                self.recover()
+            self.discard()
+        os.makedirs(os.path.join(self.path, self._backup_dir))
+        self._log = open(self.log_path, "w")
+        self._write([{"version": self._version,
+                      "root": bytes_to_json(os.path.abspath(self.root))}])
+        self._recorded = set()
+        self._count = 0
+
+    def _write(self, entries):
+        for entry in entries:
+            self._log.write(json.dumps(entry, sort_keys=True) + "\n")
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def _backup(self, path):
+        u"""
+        备份文件，优先使用硬链接
+
+        :return: 备份文件名
+        :rtype: str
+        """
+        self._count += 1
+        name = "%06d" % self._count
+        backup = os.path.join(self.path, self._backup_dir, name)
+        try:
+            os.link(path, backup)
+        except (AttributeError, OSError):
+            shutil.copy2(path, backup)
+        return name
+
+    def record(self, paths):
+        u"""
+        在修改、创建或删除文件之前记录文件，同一文件只记录第一次的状态。记录写入磁盘后返回。
+
+        :param paths: 即将被修改、创建或删除的文件路径列表
+        :type paths: list
+        """
+        self.begin()
+        entries = []
+        for path in paths:
+            key = os.path.normcase(os.path.abspath(path))
+            if key in self._recorded:
+                continue
+            self._recorded.add(key)
+            entry = {"path": self._relative(path), "backup": None}
+            if os.path.isfile(path):
+                entry["backup"] = self._backup(path)
+            entries.append(entry)
+        if entries:
+            self._write(entries)
+
+    def record_dirs(self, paths):
+        u"""
+        在创建目录之前记录尚不存在的目录(含上级目录)，回滚时删除其中已为空的目录
+
+        :param paths: 即将创建的目录路径列表
+        :type paths: list
+        """
+        self.begin()
+        entries = []
+        root = os.path.normcase(os.path.abspath(self.root))
+        for path in paths:
+            path = os.path.abspath(path)
+            created = []
+            while not os.path.exists(path):
+                key = os.path.normcase(path)
+                if key == root or key in self._recorded:
+                    break
+                self._recorded.add(key)
+                created.append(path)
+                path = os.path.dirname(path)
+            # 上级目录在前，回滚时逆序删除
+            entries.extend({"path": self._relative(d), "dir": True}
+                           for d in reversed(created))
+        if entries:
+            self._write(entries)
+
+    def complete(self):
+        u"""
+        写入完成标记
+        """
+        if self._log is None:
+            return
+        self._write([{"complete": True}])
+        self._log.close()
+        self._log = None
+
+    def rollback(self, logger=None):
+        u"""
+        按日志逆序恢复所有记录的文件：有备份的文件恢复为备份内容，迁移中新建的文件被删除，
+        之后删除迁移中新建且已为空的目录，最后删除日志
+
+        :param logger: 日志记录器
+        :type logger: logging.Logger
+        :return: 恢复的文件路径列表，没有日志时为空列表
+        :rtype: list
+        """
+        logger = logger or logging.getLogger("fr")
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if not self.exists():
+            return []
+        entries, complete = self._read()
+        restored = []
+        dirs = []
+        for entry in reversed(entries):
+            path = self._resolve(entry["path"])
+            if entry.get("dir"):
+                dirs.append(path)
+                continue
+            if entry["backup"] is None:
+                if os.path.isfile(path):
+                    os.remove(path)
+            else:
+                backup = os.path.join(self.path, self._backup_dir,
+                                      entry["backup"])
+                if not os.path.exists(backup):
+                    logger.error('Backup of "%s" missing.' % path)
+                    continue
+                dir_name = os.path.dirname(path)
+                if not os.path.isdir(dir_name):
+                    os.makedirs(dir_name)
+                replace_file(backup, path)
+            restored.append(path)
+        # 目录按创建时的逆序排列，子目录先于上级目录删除
+        for path in dirs:
+            if os.path.isdir(path) and not os.listdir(path):
+                os.rmdir(path)
+        logger.info("%d file(s) restored from journal%s."
+                    % (len(restored), "" if complete else " (interrupted)"))
+        self.discard()
+        return restored
+
+    def recover(self, logger=None):
+        u"""
+        回滚中断(没有完成标记)的迁移
+
+        :return: 恢复的文件路径列表，没有需要恢复的日志时为空列表
+        :rtype: list
+        """
+        if not self.exists() or self.is_complete():
+            return []
+        (logger or logging.getLogger("fr")).warning(
+            "Interrupted transfer found in %s, rolling back." % self.path)
+        return self.rollback(logger)
+
+    def discard(self):
+        u"""
+        删除日志与备份
+        """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+u"""
+国际化查询键使用索引
+
+命令行查询::
+
+    python -m FSUtils.transfer.key_index ./log/locale_keys.db files Key-001
+    python -m FSUtils.transfer.key_index ./log/locale_keys.db modules Key-001
+    python -m FSUtils.transfer.key_index ./log/locale_keys.db keys fservice
+    python -m FSUtils.transfer.key_index ./log/locale_keys.db owned fservice
+    python -m FSUtils.transfer.key_index ./log/locale_keys.db stats
+"""
+
+__author__ = 'kyle'
+
+import os
+import sqlite3
+import sys
+
+from file_ops import bytes_from_json, bytes_to_json
+
+
+class KeyUsageIndex(object):
+    u"""
+    国际化查询键使用索引
+
+    以 SQLite 文件保存每个代码文件使用的查询键及文件所在模块，可按查询键取出使用它的文件与
+    模块，或按模块取出其使用的查询键。索引同时保存文件的修改时间与大小，同步时只重新扫描发生
+    变化的文件；扫描配置签名变化时清空索引。
+
+    .. code:: python
+
+        index = KeyUsageIndex("./log/locale_keys.db", "./project")
+        index.sync(files, extract, signature)
+        index.modules_for_key("Key-001")
+        # set(["fservice", "base"])
+
+    查询键与路径为字节串，以 ``latin-1`` 解码后存储，可无损往返任意编码。
+
+    :ivar str path: 索引文件路径，为 ``:memory:`` 时不持久化
+    :ivar str root: 工程文件的根目录( ``project`` 目录)，索引中的路径相对于此目录
+    """
+    _version = "1"
+    _schema = [
+        "CREATE TABLE IF NOT EXISTS meta ("
+        "name TEXT PRIMARY KEY, value TEXT)",
+        "CREATE TABLE IF NOT EXISTS files ("
+        "id INTEGER PRIMARY KEY, path TEXT UNIQUE, module TEXT, "
+        "mtime REAL, size INTEGER)",
+        "CREATE TABLE IF NOT EXISTS usages ("
+        "key TEXT, file_id INTEGER, PRIMARY KEY (key, file_id))",
+        "CREATE INDEX IF NOT EXISTS usages_file ON usages (file_id)",
+        "CREATE INDEX IF NOT EXISTS files_module ON files (module)",
+    ]
+
+    def __init__(self, path, root=None):
+        u"""
+        :param path: 索引文件路径，为 ``:memory:`` 时不持久化
+        :type path: str
+        :param root: 工程文件的根目录，只查询时可不设置
+        :type root: str
+        """
+        self.path = path
+        self.root = root
+        self._conn = sqlite3.connect(path)
+        for statement in self._schema:
+            self._conn.execute(statement)
+        if self._get_meta("version") != self._version:
+            self.clear()
+            self._set_meta("version", self._version)
+            self._conn.commit()
+
+    def _get_meta(self, name):
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row and row[0]
+
+    def _set_meta(self, name, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            (name, value))
+
+    def _relative(self, path):
+        rel_path = os.path.relpath(path, self.root)
+        return bytes_to_json(rel_path.replace("\\", "/"))
+
+    def _resolve(self, rel_path):
+        rel_path = bytes_from_json(rel_path)
+        if self.root is None:
+            return rel_path
+        return os.path.join(self.root, *rel_path.split("/"))
+
+    def clear(self):
+        u"""
+        清空索引
+        """
+        self._conn.execute("DELETE FROM usages")
+        self._conn.execute("DELETE FROM files")
+        self._conn.execute("DELETE FROM meta WHERE name = 'signature'")
+
+    def sync(self, files, extract, signature=None):
+        u"""
+        与工程同步：删除已不存在的文件，对新增或发生变化的文件重新扫描
+
+        :param files: ``(模块, 文件路径)`` 构成的元组列表，为需要索引的全部文件
+        :type files: list
+        :param extract: 扫描函数，参数为文件路径列表，返回与之顺序一致的查询键列表
+        :type extract: callable
+        :param signature: 扫描配置签名，与索引中保存的不一致时重建索引
+        :type signature: str
+        :return: 重新扫描的文件数
+        :rtype: int
+        """
+        conn = self._conn
+        if signature is not None and self._get_meta("signature") != signature:
+            self.clear()
+            self._set_meta("signature", signature)
+        stored = dict(
+            (path, (file_id, module, mtime, size)) for file_id, path, module,
+            mtime, size in conn.execute(
+                "SELECT id, path, module, mtime, size FROM files"))
+        stale = []
+        current = set()
+        for module, path in files:
+            rel_path = self._relative(path)
+            current.add(rel_path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            old = stored.get(rel_path)
+            if old is None or old[1:] != (module, st.st_mtime, st.st_size):
+                stale.append((module, path, rel_path, st))
+        removed = [stored[p][0] for p in stored if p not in current]
+        removed.extend(stored[rel_path][0] for m, p, rel_path, st in stale
+                       if rel_path in stored)
+        for i in xrange(0, len(removed), 500):
+            chunk = removed[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            conn.execute("DELETE FROM usages WHERE file_id IN (%s)" % marks,
+                         chunk)
+            conn.execute("DELETE FROM files WHERE id IN (%s)" % marks, chunk)
+        if stale:
+            self._add_files(stale, extract)
+        conn.commit()
+        return len(stale)
+
+    def update(self, changes, extract):
+        u"""
+        按文件变化增量更新：删除已删除文件的记录，重新扫描新增或修改的文件，不检查其余文件
+
+        :param changes: ``(模块, 文件路径, 是否存在)`` 构成的元组列表，取自
+            :meth:`~FSUtils.transfer.scan_engine.ScanEngine.update`
+        :type changes: list
+        :param extract: 扫描函数，参数为文件路径列表，返回与之顺序一致的查询键列表
+        :type extract: callable
+        :return: 使用情况可能发生变化的查询键集合
+        :rtype: set
+        """
+        conn = self._conn
+        keys = set()
+        stale = []
+        for module, path, exists in changes:
+            rel_path = self._relative(path)
+            row = conn.execute(
+                "SELECT id FROM files WHERE path = ?", (rel_path,)).fetchone()
+            if row is not None:
+                keys.update(bytes_from_json(key) for key, in conn.execute(
+                    "SELECT key FROM usages WHERE file_id = ?", row))
+                conn.execute("DELETE FROM usages WHERE file_id = ?", row)
+                conn.execute("DELETE FROM files WHERE id = ?", row)
+            if not exists:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stale.append((module, path, rel_path, st))
+        if stale:
+            for file_keys in self._add_files(stale, extract):
+                keys.update(file_keys)
+        conn.commit()
+        return keys
+
+    def _add_files(self, stale, extract):
+        u"""
+        扫描并写入文件记录
+
+        :param stale: ``(模块, 文件路径, 相对路径, 文件状态)`` 构成的元组列表
+        :type stale: list
+        :return: 与 ``stale`` 顺序一致的查询键列表
+        :rtype: list
+        """
+        conn = self._conn
+        results = extract([path for m, path, r, st in stale])
+        for (module, path, rel_path, st), keys in zip(stale, results):
+            file_id = conn.execute(
+                "INSERT INTO files (path, module, mtime, size) "
+                "VALUES (?, ?, ?, ?)",
+                (rel_path, module, st.st_mtime, st.st_size)).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO usages (key, file_id) VALUES (?, ?)",
+                [(bytes_to_json(k), file_id) for k in set(keys)])
+        return results
+
+    def key_modules(self):
+        u"""
+        所有查询键与使用该查询键的模块集合的映射
+
+        :rtype: dict
+        """
+        usage = {}
+        for key, module in self._conn.execute(
+                "SELECT DISTINCT u.key, f.module FROM usages u "
+                "JOIN files f ON f.id = u.file_id"):
+            usage.setdefault(bytes_from_json(key), set()).add(
+                module.encode("utf-8"))
+        return usage
+
+    def files_for_key(self, key):
+        u"""
+        使用查询键的文件
+
+        :param key: 查询键
+        :type key: str
+        :return: ``(模块, 文件路径)`` 构成的元组列表
+        :rtype: list
+        """
+        return [(module.encode("utf-8"), self._resolve(path))
+                for module, path in self._conn.execute(
+                    "SELECT f.module, f.path FROM usages u "
+                    "JOIN files f ON f.id = u.file_id WHERE u.key = ? "
+                    "ORDER BY f.module, f.path", (bytes_to_json(key),))]
+
+    def modules_for_key(self, key):
+        u"""
+        使用查询键的模块
+
+        :param key: 查询键
+        :type key: str
+        :rtype: set
+        """
+        return set(module.encode("utf-8") for module, in self._conn.execute(
+            "SELECT DISTINCT f.module FROM usages u "
+            "JOIN files f ON f.id = u.file_id WHERE u.key = ?",
+            (bytes_to_json(key),)))
+
+    def keys_for_module(self, module):
+        u"""
+        模块使用的查询键
+
+        :param module: 模块目录名称
+        :type module: str
+        :rtype: list
+        """
+        return [bytes_from_json(key) for key, in self._conn.execute(
+            "SELECT DISTINCT u.key FROM usages u "
+            "JOIN files f ON f.id = u.file_id WHERE f.module = ? "
+            "ORDER BY u.key", (module,))]
+
+    def owned_keys(self, modules):
+        u"""
+        只被指定模块使用的查询键
+
+        :param modules: 模块目录名称列表
+        :type modules: list
+        :rtype: list
+        """
+        modules = list(modules)
+        marks = ",".join("?" * len(modules))
+        return [bytes_from_json(key) for key, in self._conn.execute(
+            "SELECT u.key FROM usages u JOIN files f ON f.id = u.file_id "
+            "GROUP BY u.key HAVING SUM(f.module NOT IN (%s)) = 0 "
+            "ORDER BY u.key" % marks, modules)]
+
+    def counts(self):
+        u"""
+        索引中的文件数、查询键数与使用记录数
+
+        :rtype: tuple
+        """
+        return tuple(self._conn.execute(sql).fetchone()[0] for sql in [
+            "SELECT COUNT(*) FROM files",
+            "SELECT COUNT(DISTINCT key) FROM usages",
+            "SELECT COUNT(*) FROM usages"])
+
+    def close(self):
+        self._conn.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = {
+        "files": lambda index, key: ["%s\t%s" % f
+                                     for f in index.files_for_key(key)],
+        "modules": lambda index, key: sorted(index.modules_for_key(key)),
+        "keys": lambda index, module: index.keys_for_module(module),
+        "owned": lambda index, *modules: index.owned_keys(modules),
+        "stats": lambda index: ["%d file(s), %d key(s), %d usage(s)"
+                                % index.counts()],
+    }
+    if len(argv) < 2 or argv[1] not in commands:
+        print "usage: key_index DB {%s} [ARGS...]" % ",".join(
+            sorted(commands))
+        return 2
+    if not os.path.exists(argv[0]):
+        print "%s not found." % argv[0]
+        return 1
+    index = KeyUsageIndex(argv[0])
+    try:
+        for line in commands[argv[1]](index, *argv[2:]):
+            print line
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
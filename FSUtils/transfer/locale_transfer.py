@@ -14,12 +14,71 @@
 
 __author__ = 'kyle'
 
+import bisect
 import os
 import re
 
+from key_index import KeyUsageIndex
+from plan import LocalePlan
+from properties import LocaleTable, PropertiesStore
+from scan_engine import Extractor
 from transfer_base import TransferBase
 
 
+class LocaleKeyExtractor(Extractor):
+    u"""
+    国际化查询键扫描器
+
+    所有调用形式合并为一个预编译的多选正则表达式。扫描时先用字符串查找定位各调用名称，文件中
+    不包含任何调用名称时直接跳过，否则仅在调用名称出现的位置上执行正则匹配。正则表达式中不使用
+    嵌套或非贪婪的任意字符匹配，在压缩为单行的 JS 文件上同样为线性时间。
+
+    :ivar list call_patterns: 国际化调用形式列表，每项为 ``(调用名称, 正则表达式)`` 构成
+        的元组。调用名称为正则表达式匹配开头的字面字符串，正则表达式中最后一个参与匹配的分组
+        为查询键。
+    """
+    name = "locale_keys"
+
+    def __init__(self, patterns, call_patterns):
+        u"""
+        :param patterns: 扫描的代码文件类型通配符列表
+        :type patterns: list
+        :param call_patterns: 国际化调用形式列表
+        :type call_patterns: list
+        """
+        super(LocaleKeyExtractor, self).__init__(patterns)
+        self.call_patterns = [tuple(p) for p in call_patterns]
+        self._literals = tuple(set(name for name, regex in self.call_patterns))
+        self._regex = re.compile("|".join(
+            ["(?:%s)" % regex for name, regex in self.call_patterns]))
+
+    def get_config(self):
+        return self.call_patterns
+
+    def extract(self, codes):
+        positions = []
+        for literal in self._literals:
+            pos = codes.find(literal)
+            while pos >= 0:
+                positions.append(pos)
+                pos = codes.find(literal, pos + 1)
+        # 不包含任何调用名称的文件无需匹配
+        if not positions:
+            return []
+        positions.sort()
+        locale_keys = []
+        end = 0
+        match = self._regex.match
+        for pos in positions:
+            if pos < end:
+                continue
+            m = match(codes, pos)
+            if m is not None:
+                locale_keys.append(m.group(m.lastindex))
+                end = m.end()
+        return locale_keys
+
+
 class LocaleTransfer(TransferBase):
     u"""
     国际化文本迁移工具
@@ -31,6 +90,8 @@ class LocaleTransfer(TransferBase):
     :ivar list locales: 支持的国际化标识符
     :ivar str locale_suffix: 国际化资源文件扩展名
     :ivar list source_pattern: 代码文件类型的通配符列表
+    :ivar list call_patterns: 国际化调用形式列表，每项为 ``(调用名称, 正则表达式)`` 构成
+        的元组，详见 :class:`LocaleKeyExtractor`
     :ivar str original_locale_rel_path: 源国际化资源文件到根目录的相对路径
     :ivar str original_locale_name: 源国际化资源文件名，如 ``fr``
 
@@ -38,17 +99,31 @@ class LocaleTransfer(TransferBase):
     :ivar str target_locale_name: 目标模块国际化资源文件名，如 ``fr``
     :ivar str log_path: 输出信息的位置
 
-    :ivar dict all_locales: 缓存的国际化
-    :ivar list move_keys: 需要移动的国际化列表
-    :ivar list duplicate_keys: 模块共用的国际化列表
-    :ivar list fragmented_keys: 不完整的国际化列表
+    :ivar str key_index_path: 查询键使用索引文件路径，为 ``None`` 时索引只保存在内存中
+    :ivar key_index: 查询键使用索引
+    :vartype key_index: :class:`~FSUtils.transfer.key_index.KeyUsageIndex`
     :ivar tuple locale_files: 缓存的国际化文件路径
+    :ivar dict bundle_files: 目标资源文件与其国际化文件路径的映射
     """
     __main_locale_tag = "main"
 
     locales = ["en_US", "zh_CN", "zh_TW", "ja_JP"]
     locale_suffix = ".properties"
-    source_pattern = ["*.java", "*.js"]
+    source_pattern = ["*.java", "*.js", "*.cpt"]
+    call_patterns = [
+        # Inter.getLocText("key") 及带参数的重载
+        ("Inter.getLocText",
+         r'Inter\.getLocText\(\s*"([^"\\\r\n]+)"\s*[,)]'),
+        # FR.i18nText("key")
+        ("FR.i18nText",
+         r'FR\.i18nText\(\s*(?:"([^"\\\r\n]+)"|\'([^\'\\\r\n]+)\')\s*[,)]'),
+        # $.i18n("key")、$.i18nText("key")、$.i18n.prop("key")
+        ("$.i18n",
+         r'\$\.i18n(?:Text|\.prop)?\(\s*'
+         r'(?:"([^"\\\r\n]+)"|\'([^\'\\\r\n]+)\')\s*[,)]'),
+        # 模板文件中的 i18n="key" 属性
+        ("i18n=", r'(?<=\s)i18n="([^"<>\r\n]+)"'),
+    ]
     original_locale_rel_path = "base-file/src/com/fr/general/locale"
     original_locale_name = "fr"
 
@@ -56,14 +131,25 @@ class LocaleTransfer(TransferBase):
     target_locale_name = ""
     log_path = "./"
 
-    all_locales = {}
-    move_keys = []
-    duplicate_keys = []
-    fragmented_keys = []
+    _analysis_steps = [("_load_all_locale", "load"),
+                       ("_collect_key_usage", "filter"),
+                       ("_filter_locale_keys", "filter")]
+
+    _locale_table = None
+    _move_keys = []
+    _duplicate_keys = []
+    _fragmented_keys = []
+    _key_modules = {}
+    _target_keys = {}
+    key_index_path = None
+    key_index = None
     locale_files = ()
+    bundle_files = {}
 
     def __init__(self, root, modules, target_rel_path, target_locale,
-                 work_dir="./", exclude_dirs=None):
+                 work_dir="./", exclude_dirs=None, cache_dir=None, jobs=1,
+                 scan_engine=None, call_patterns=None, profile=False,
+                 journal=False, key_index=False):
         u"""
         对国际化文本迁移工具初始化
 
@@ -79,16 +165,101 @@ class LocaleTransfer(TransferBase):
         :type work_dir: str
         :param exclude_dirs: ``project`` 下需要排除的子目录
         :type exclude_dirs: list
+        :param cache_dir: 扫描结果缓存目录，通常设置为 ``work_dir`` 下的子目录，不设置则
+            不使用缓存
+        :type cache_dir: str
+        :param jobs: 扫描代码文件使用的进程数，小于 ``1`` 时使用全部 CPU
+        :type jobs: int
+        :param scan_engine: 共用的代码扫描引擎
+        :type scan_engine: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+        :param call_patterns: 国际化调用形式列表，不设置保留默认配置
+        :type call_patterns: list
+        :param profile: 是否使用 cProfile 采样各阶段，结果写入 ``work_dir``
+        :type profile: bool or list
+        :param journal: 是否使用预写日志，可通过 :meth:`rollback` 撤销迁移
+        :type journal: bool
+        :param key_index: 查询键使用索引文件路径，为 ``True`` 时保存为 ``work_dir`` 下的
+            ``locale_keys.db`` ，默认不保存。保存时索引代替 ``cache_dir`` 中的扫描结果缓存，
+            再次运行时只重新扫描发生变化的文件。
+        :type key_index: bool or str
         """
         super(LocaleTransfer, self).__init__(
-            root, modules, exclude_dirs=exclude_dirs, log_dir=work_dir)
+            root, modules, exclude_dirs=exclude_dirs, log_dir=work_dir,
+            cache_dir=cache_dir, jobs=jobs, scan_engine=scan_engine,
+            profile=profile, journal=journal)
+        if call_patterns is not None:
+            self.call_patterns = call_patterns
         self.target_locale_rel_path = target_rel_path
         self.target_locale_name = target_locale
         self.log_path = work_dir
-        # 从国际化资源文件初始化数据
-        self._load_all_locale()
+        if key_index is True:
+            key_index = os.path.join(work_dir, "locale_keys.db")
+        self.key_index_path = key_index or None
+        self.key_index = None
+        self._locale_table = None
+        # 国际化资源文件路径，内容表与查询键在首次读取时才加载与分析
         self._load_locale_files()
-        self._filter_locale_keys()
+
+    @property
+    def locale_table(self):
+        u"""
+        原国际化资源文件内容表，主资源文件列的标识为 ``main``
+
+        :rtype: :class:`~FSUtils.transfer.properties.LocaleTable`
+        """
+        self._require("_load_all_locale")
+        return self._locale_table
+
+    @property
+    def key_modules(self):
+        u"""
+        查询键与使用该查询键的模块集合的映射，由查询键使用索引得出
+
+        :rtype: dict
+        """
+        self._require("_collect_key_usage")
+        return self._key_modules
+
+    @property
+    def target_keys(self):
+        u"""
+        目标资源文件与需要移动到该文件的查询键列表的映射，目标资源文件以
+        ``(相对路径, 文件名)`` 表示
+
+        :rtype: dict
+        """
+        self._require("_filter_locale_keys")
+        return self._target_keys
+
+    @property
+    def move_keys(self):
+        u"""
+        需要移动的国际化列表
+
+        :rtype: list
+        """
+        self._require("_filter_locale_keys")
+        return self._move_keys
+
+    @property
+    def duplicate_keys(self):
+        u"""
+        模块共用的国际化列表
+
+        :rtype: list
+        """
+        self._require("_filter_locale_keys")
+        return self._duplicate_keys
+
+    @property
+    def fragmented_keys(self):
+        u"""
+        不完整的国际化列表
+
+        :rtype: list
+        """
+        self._require("_filter_locale_keys")
+        return self._fragmented_keys
 
     @staticmethod
     def get_source_locale_keys(src_file):
@@ -100,15 +271,17 @@ class LocaleTransfer(TransferBase):
         :return: 当前代码中的所有国际化查询键
         :rtype: list
         """
-        locale_keys = []
-        with open(src_file) as src:
-            codes = src.readlines()
-            for line in codes:
-                locale_keys.extend(re.findall(
-                    'Inter\.getLocText\("(.+?)"\)', line))
-                locale_keys.extend(re.findall(
-                    'FR\.i18nText\("(.+?)"\)', line))
-        return locale_keys
+        return LocaleKeyExtractor(
+            LocaleTransfer.source_pattern, LocaleTransfer.call_patterns
+        ).extract_file(src_file)
+
+    def create_extractor(self):
+        u"""
+        按当前配置创建国际化查询键扫描器
+
+        :rtype: :class:`LocaleKeyExtractor`
+        """
+        return LocaleKeyExtractor(self.source_pattern, self.call_patterns)
 
     def _get_locale_filename(self, base, locale=None):
         u"""
@@ -127,80 +300,195 @@ class LocaleTransfer(TransferBase):
             filename = base + self.locale_suffix
         return filename
 
-    def _load_locale_map(self, path, base, locale=None):
-        u"""
-        读取指定国际化文件中的键值映射
-
-        :param path: 国际化资源文件在工程文件中的相对路径
-        :type path: str
-        :param base: 国际化主资源文件名
-        :type base: str
-        :param locale: 本地化标识
-        :type locale: str
-        :return: 国际化键值映射
-        :rtype: dict
-        """
-        locale_map = {}
-        filename = self._get_locale_filename(base, locale)
-        with open(os.path.join(path, filename)) as loc:
-            lines = loc.readlines()
-            for line in lines:
-                l = line.split("=", 1)
-                if len(l) < 2:
-                    continue
-                (k, v) = tuple(l)
-                locale_map[k] = v.strip('\n')
-        return locale_map
-
     def _load_all_locale(self):
         u"""
-        读取并缓存所有原国际化文件中的国际化内容
+        建立所有原国际化文件的内容表，仅索引查询键并计算完整性，值在读取时解码
         """
-        all_locales = {}
         old_locale_path = os.path.join(
             self.project_root, self.original_locale_rel_path)
-        # 默认国际化文件中的内容
-        for k, v in self._load_locale_map(
-                old_locale_path, self.original_locale_name
-        ).iteritems():
-            all_locales[k] = {self.__main_locale_tag: v}
-        # 本地化的文件内容
-        for locale in self.locales:
-            for k, v in self._load_locale_map(
-                    old_locale_path, self.original_locale_name, locale
-            ).iteritems():
-                all_locales[k][locale] = v
-        self.all_locales = all_locales
+        tags = [(self.__main_locale_tag, None)]
+        tags.extend((locale, locale) for locale in self.locales)
+        stores = {}
+        for tag, locale in tags:
+            filename = self._get_locale_filename(
+                self.original_locale_name, locale)
+            stores[tag] = PropertiesStore(
+                os.path.join(old_locale_path, filename))
+        self._locale_table = LocaleTable(stores, [tag for tag, l in tags])
+
+    def _close_locale_table(self):
+        u"""
+        关闭已加载的内容表，释放资源文件
+        """
+        if self._locale_table is not None:
+            self._locale_table.close()
 
     def _filter_locale_keys(self):
         u"""
         取出需要处理的国际化信息
         """
-        module_keys = []
-        exclude_keys = []
         # 收集代码文件路径
         self.collect_source_files()
-        # 搜索国际化查询键
-        for src in self._module_files:
-            module_keys.extend(
-                self.get_source_locale_keys(os.path.abspath(src)))
-        for src in self._exclude_files:
-            exclude_keys.extend(
-                self.get_source_locale_keys(os.path.abspath(src)))
-        # 去重
-        module_keys = set(module_keys)
-        exclude_keys = set(exclude_keys)
-        # 取出需要移动、模块共用的国际化查询键
-        move_keys = module_keys - exclude_keys
-        move_keys = list(set(self.all_locales.keys()) & move_keys)
-        shared_keys = list(module_keys & exclude_keys)
-        move_keys.sort()
+        # 按使用模块将查询键分配到目标资源文件
+        owners = self._get_owners()
+        target_keys = dict((bundle, []) for bundle, m in self._get_bundles())
+        shared_keys = []
+        for key, modules in self.key_modules.iteritems():
+            bundle, shared = self._classify_key(modules, owners)
+            if shared:
+                shared_keys.append(key)
+            elif bundle is not None and key in self.locale_table:
+                target_keys[bundle].append(key)
+        for keys in target_keys.itervalues():
+            keys.sort()
+        move_keys = sorted(
+            k for keys in target_keys.itervalues() for k in keys)
         shared_keys.sort()
         # 不完整的国际化内容
-        for k in move_keys:
-            if not self._check_locale_complete(k):
-                self.fragmented_keys.append(k)
-        self.move_keys, self.duplicate_keys = move_keys, shared_keys
+        self._fragmented_keys = self.locale_table.incomplete(move_keys)
+        self._move_keys, self._duplicate_keys = move_keys, shared_keys
+        self._target_keys = target_keys
+
+    def _get_owners(self):
+        u"""
+        目标模块与其目标资源文件的映射
+        """
+        owners = {}
+        for bundle, modules in self._get_bundles():
+            for module in modules:
+                owners[module] = bundle
+        return owners
+
+    @staticmethod
+    def _classify_key(modules, owners):
+        u"""
+        按使用查询键的模块确定其目标资源文件
+
+        :param modules: 使用查询键的模块集合
+        :type modules: set
+        :param owners: 目标模块与其目标资源文件的映射
+        :type owners: dict
+        :return: ``(目标资源文件, 是否共用)`` ，只在其余模块中使用或共用时目标资源文件为
+            ``None``
+        :rtype: tuple
+        """
+        bundles = set(owners.get(module) for module in modules)
+        if bundles == set([None]):
+            # 只在其余模块中使用
+            return None, False
+        if len(bundles) > 1:
+            # 目标模块与其他模块(或其他目标)共用
+            return None, True
+        return bundles.pop(), False
+
+    def _update_key_usage(self, changes):
+        u"""
+        将受影响的代码文件增量更新到查询键使用索引，并重新分配使用情况发生变化的查询键
+
+        :param changes: 受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表
+        :type changes: list
+        """
+        extractor = self.create_extractor()
+        engine = self.get_scan_engine()
+        key_index = self.get_key_index()
+        keys = key_index.update(
+            [c for c in changes if extractor.match(c[1])],
+            lambda paths: engine.scan_files(extractor, paths, False))
+        for key in keys:
+            modules = key_index.modules_for_key(key)
+            if modules:
+                self._key_modules[key] = modules
+            else:
+                self._key_modules.pop(key, None)
+        if "_filter_locale_keys" not in self._analyzed:
+            return
+        owners = self._get_owners()
+        lists = [self._move_keys, self._duplicate_keys, self._fragmented_keys]
+        lists.extend(self._target_keys.itervalues())
+        for key in keys:
+            for sorted_keys in lists:
+                i = bisect.bisect_left(sorted_keys, key)
+                if i < len(sorted_keys) and sorted_keys[i] == key:
+                    del sorted_keys[i]
+            if key not in self._key_modules:
+                continue
+            bundle, shared = self._classify_key(self._key_modules[key], owners)
+            if shared:
+                bisect.insort(self._duplicate_keys, key)
+            elif bundle is not None and key in self.locale_table:
+                bisect.insort(self._target_keys[bundle], key)
+                bisect.insort(self._move_keys, key)
+                if not self.locale_table.is_complete(key):
+                    bisect.insort(self._fragmented_keys, key)
+
+    def _collect_key_usage(self):
+        u"""
+        同步查询键使用索引(只扫描发生变化的文件)，建立查询键与使用该查询键的模块集合的映射
+        """
+        index = self.get_file_index()
+        files = [(module, path) for module in index.modules
+                 for path in self.get_module_files(module)]
+        engine = self.get_scan_engine()
+        extractor = self.create_extractor()
+        key_index = self.get_key_index()
+        # 持久化的索引本身即为扫描结果缓存
+        cache = self.key_index_path is None
+        key_index.sync(
+            files, lambda paths: engine.scan_files(extractor, paths, cache),
+            extractor.signature)
+        self._key_modules = key_index.key_modules()
+
+    def get_key_index(self):
+        u"""
+        获取查询键使用索引，首次调用时打开 ``key_index_path`` 中的索引
+
+        :rtype: :class:`~FSUtils.transfer.key_index.KeyUsageIndex`
+        """
+        if self.key_index is None:
+            self.key_index = KeyUsageIndex(
+                self.key_index_path or ":memory:", self.project_root)
+        return self.key_index
+
+    def _get_bundles(self):
+        u"""
+        目标资源文件与所属模块的列表
+
+        :return: ``((目标资源文件相对路径, 目标资源文件名), 模块列表)`` 构成的元组列表
+        :rtype: list
+        """
+        return [((self.target_locale_rel_path, self.target_locale_name),
+                 self.target_modules)]
+
+    def refresh(self, paths=None, changes=None):
+        u"""
+        文件发生变化后重新计算需要移动、共用与不完整的国际化查询键，源国际化资源文件变化时
+        重新建立内容表。给出 ``changes`` 时只将受影响的代码文件更新到查询键使用索引，并只
+        重新分配使用情况发生变化的查询键
+
+        :param paths: 发生变化的路径列表，为 ``None`` 时视为全部变化
+        :type paths: list
+        :param changes: 受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表
+        :type changes: list
+        """
+        steps = []
+        original = [os.path.abspath(p) for p in self.locale_files[0].values()]
+        if paths is None or any(
+                f == path or f.startswith(path.rstrip("/\\") + os.sep)
+                for path in map(os.path.abspath, paths) for f in original):
+            self._close_locale_table()
+            steps.extend(["_load_all_locale", "_filter_locale_keys"])
+        if changes is None:
+            steps.extend(["_collect_key_usage", "_filter_locale_keys"])
+        self.invalidate(steps)
+        if "_collect_key_usage" in self._analyzed:
+            with self.stats.phase("filter"):
+                self._update_key_usage(changes)
+        self.analyze()
+
+    def summary(self):
+        return "Locale: %d key(s) to move, %d shared, %d fragmented." % (
+            len(self.move_keys), len(self.duplicate_keys),
+            len(self.fragmented_keys))
 
     def _check_locale_complete(self, key):
         u"""
@@ -211,85 +499,76 @@ class LocaleTransfer(TransferBase):
         :return: 国际化字符串是否完整
         :rtype: bool
         """
-        locale = self.all_locales[key]
-        if len(locale) < 5:
-            return False
-        for k, v in locale.iteritems():
-            if len(v) == 0:
-                return False
-        return True
-
-    def transfer(self):
+        return self.locale_table.is_complete(key)
+
+    def plan(self):
         u"""
-        移动国际化文本
+        生成国际化文本迁移计划，计划中包含需要移动的原始值，不修改任何文件
+
+        :rtype: :class:`~FSUtils.transfer.plan.LocalePlan`
         """
-        original, target = self.locale_files
-        # 移除模块独立的国际化内容
-        for path in original.values():
-            with open(path, "r") as f:
-                lines = f.readlines()
-            with open(path, "w") as f:
-                for line in lines:
-                    k = line.split("=", 1)
-                    # 跳过无关行
-                    if len(k) < 2:
-                        f.write(line)
-                        continue
-                    k = tuple(k)[0]
-                    # 删除行
-                    if k not in self.move_keys:
-                        f.write(line)
-        # 将移动的国际化内容增加到目标模块
-        for locale, path in target.iteritems():
-            with open(path, "r+") as f:
-                add_keys = self.move_keys
-                lines = f.readlines()
-                for line in lines:
-                    k = line.split("=", 1)
-                    # 跳过无关行
-                    if len(k) < 2:
-                        continue
-                    k = tuple(k)[0]
-                    # 去重
-                    if k in self.move_keys:
-                        add_keys.remove(k)
-                # 追加
-                for k in add_keys:
-                    line_buffer = [
-                        k, "=", self.all_locales[k][locale], self._eol]
-                    f.write("".join(line_buffer))
+        original = self.locale_files[0]
+        plan = LocalePlan(self.project_root)
+        plan.move_keys = list(self.move_keys)
+        plan.original_files = [plan.relative(original[tag])
+                               for tag in self.locale_table.tags]
+        for bundle, modules in self._get_bundles():
+            target = self.bundle_files[bundle]
+            for tag in self.locale_table.tags:
+                # 缺少本地化内容的键交由主资源文件回退
+                entries = []
+                for k in self.target_keys[bundle]:
+                    value = self.locale_table.get_raw(k, tag)
+                    if value is not None:
+                        entries.append((k, value))
+                plan.targets[plan.relative(target[tag])] = entries
+        return plan
 
-    def _load_locale_files(self):
+    def apply(self, plan):
         u"""
-        加载国际化资源文件路径
+        执行国际化文本迁移计划
+
+        :param plan: 国际化文本迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.LocalePlan`
         """
-        # 源国际化资源文件
-        original_path = os.path.join(
-            self.project_root, self.original_locale_rel_path)
+        # 关闭存储以便替换原文件
+        self._close_locale_table()
+        return super(LocaleTransfer, self).apply(plan)
+
+    def _get_locale_files(self, rel_path, name):
+        u"""
+        生成一组国际化资源文件的路径
+
+        :param rel_path: 国际化资源文件到根目录的相对路径
+        :type rel_path: str
+        :param name: 国际化资源文件名，如 ``fr``
+        :type name: str
+        :return: 本地化标识与文件路径的映射，主资源文件的标识为 ``main``
+        :rtype: dict
+        """
+        path = os.path.join(self.project_root, rel_path)
         # 默认的国际化文件
-        original_main = os.path.join(
-            original_path, self._get_locale_filename(self.original_locale_name)
-        )
-        original_files = {self.__main_locale_tag: original_main}
+        files = {self.__main_locale_tag: os.path.join(
+            path, self._get_locale_filename(name))}
         # 本地化的国际化文件
         for locale in self.locales:
-            original_locale_file = os.path.join(
-                original_path,
-                self._get_locale_filename(self.original_locale_name, locale))
-            original_files[locale] = original_locale_file
+            files[locale] = os.path.join(
+                path, self._get_locale_filename(name, locale))
+        return files
+
+    def _load_locale_files(self):
+        u"""
+        加载国际化资源文件路径
+        """
+        # 源国际化资源文件
+        original_files = self._get_locale_files(
+            self.original_locale_rel_path, self.original_locale_name)
         # 目标国际化资源文件
-        target_path = os.path.join(
-            self.project_root, self.target_locale_rel_path)
-        # 默认的国际化文件
-        target_main = os.path.join(
-            target_path, self._get_locale_filename(self.target_locale_name))
-        target_files = {self.__main_locale_tag: target_main}
-        # 本地化的国际化文件
-        for locale in self.locales:
-            target_locale_file = os.path.join(
-                target_path,
-                self._get_locale_filename(self.target_locale_name, locale))
-            target_files[locale] = target_locale_file
+        self.bundle_files = dict(
+            (bundle, self._get_locale_files(*bundle))
+            for bundle, modules in self._get_bundles())
+        target_files = self.bundle_files.get(
+            (self.target_locale_rel_path, self.target_locale_name))
         self.locale_files = (original_files, target_files)
 
     def dump_warning(self):
@@ -308,6 +587,71 @@ class LocaleTransfer(TransferBase):
                 f.write(k + self._eol)
 
 
+class MultiLocaleTransfer(LocaleTransfer):
+    u"""
+    多目标国际化文本迁移工具
+
+    将源国际化资源文件拆分到多个目标模块的资源文件中。工程只扫描一次，建立查询键与使用模块的
+    映射后，只被一个目标的模块使用的查询键移动到该目标的资源文件，被多个目标或其余模块使用的
+    查询键保留在源资源文件中，源资源文件只改写一次：
+
+    .. code:: python
+
+        trans = MultiLocaleTransfer(PROJECT_ROOT, {
+            ("fservice/src/com/fr/fs/resources", "fs"):
+                ["fservice", "fschedule"],
+            ("fmobile/src/com/fr/mobile/resources", "mobile"): ["fmobile"],
+        }, LOG_PATH, EXCLUDE_DIRS)
+        trans.transfer()
+
+    .. note:: `MultiLocaleTransfer` 是 :class:`LocaleTransfer` 的子类，
+        ``target_locale_rel_path`` 与 ``target_locale_name`` 不再使用。
+
+    :ivar dict targets: ``(目标资源文件相对路径, 目标资源文件名)`` 与模块列表的映射
+    """
+    targets = {}
+
+    def __init__(self, root, targets, work_dir="./", exclude_dirs=None,
+                 cache_dir=None, jobs=1, scan_engine=None, call_patterns=None,
+                 profile=False, journal=False, key_index=False):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        :param targets: ``(目标资源文件相对路径, 目标资源文件名)`` 与模块列表的映射，
+            每个模块只能属于一个目标
+        :type targets: dict
+        :param work_dir: 输出信息的位置
+
+        其余参数同 :class:`LocaleTransfer` 。
+        """
+        owners = {}
+        for bundle, modules in targets.iteritems():
+            for module in modules:
+                if owners.setdefault(module, bundle) != bundle:
+                    raise ValueError(
+                        "Module %s assigned to more than one target." % module)
+        self.targets = dict((tuple(bundle), list(modules))
+                            for bundle, modules in targets.iteritems())
+        super(MultiLocaleTransfer, self).__init__(
+            root, sorted(owners), None, None, work_dir, exclude_dirs,
+            cache_dir, jobs, scan_engine, call_patterns, profile, journal,
+            key_index)
+
+    def _get_bundles(self):
+        return [(bundle, self.targets[bundle])
+                for bundle in sorted(self.targets)]
+
+    def summary(self):
+        return "%s (%s)" % (
+            super(MultiLocaleTransfer, self).summary(),
+            ", ".join("%s: %d" % (name, len(self.target_keys[(path, name)]))
+                      for path, name in sorted(self.target_keys)))
+
+
+TransferBase.register_extractor(LocaleKeyExtractor(
+    LocaleTransfer.source_pattern, LocaleTransfer.call_patterns))
+
+
 if __name__ == "__main__":
     PROJECT_ROOT = "../../FineReport/SVN/code/project/"
     TARGET_REL_PATH = "fservice/src/com/fr/fs/resources"
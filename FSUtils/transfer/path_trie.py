@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+# 节点中标记路径结束的键，不会与单个字符冲突
+_TERMINAL = None
+
+
+class PathTrie(object):
+    u"""
+    路径前缀树
+
+    将一组路径编译为按字符分支的前缀树，判断前缀与查找子串的耗时只与被检查路径的长度有关，与
+    路径数量无关。匹配按字符进行，与 ``str.startswith`` 的结果一致，例如 ``com/fr/a`` 同样
+    是 ``com/fr/ab/img.png`` 的前缀。
+
+    .. code:: python
+
+        excludes = PathTrie(["com/fr/fs/web/images/mobile/cover/"])
+        excludes.match_prefix("com/fr/fs/web/images/mobile/cover/a.png")  # True
+    """
+
+    def __init__(self, paths=()):
+        u"""
+        :param paths: 路径列表
+        :type paths: list
+        """
+        self._root = {}
+        self._size = 0
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        u"""
+        增加路径
+
+        :param path: 路径
+        :type path: str
+        """
+        node = self._root
+        for c in path:
+            child = node.get(c)
+            if child is None:
+                child = node[c] = {}
+            node = child
+        if _TERMINAL not in node:
+            node[_TERMINAL] = path
+            self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, path):
+        node = self._root
+        for c in path:
+            node = node.get(c)
+            if node is None:
+                return False
+        return _TERMINAL in node
+
+    def match_prefix(self, path):
+        u"""
+        判断树中是否有路径为 ``path`` 的前缀
+
+        :param path: 被检查的路径
+        :type path: str
+        :rtype: bool
+        """
+        node = self._root
+        if _TERMINAL in node:
+            return True
+        for c in path:
+            node = node.get(c)
+            if node is None:
+                return False
+            if _TERMINAL in node:
+                return True
+        return False
+
+    def find_all(self, text):
+        u"""
+        查找树中路径在 ``text`` 中的所有出现位置
+
+        :param text: 被查找的字符串
+        :type text: str
+        :return: 按位置排序的 ``(位置, 路径)`` 元组列表
+        :rtype: list
+        """
+        root = self._root
+        found = []
+        for i in xrange(len(text)):
+            node = root.get(text[i])
+            j = i + 1
+            while node is not None:
+                path = node.get(_TERMINAL)
+                if path is not None:
+                    found.append((i, path))
+                if j >= len(text):
+                    break
+                node = node.get(text[j])
+                j += 1
+        return found
@@ -0,0 +1,600 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import json
+import logging
+import os
+import re
+
+from copy_engine import CopyEngine
+from file_ops import atomic_write, bytes_from_json, bytes_to_json, \
+    detect_encoding, remove_empty_dirs
+from properties import is_continued, parse_key
+from stats import TransferStats
+
+
+class TransferPlan(object):
+    u"""
+    迁移计划基类
+
+    迁移计划记录分析阶段得出的所有文件操作，不包含任何扫描结果之外的状态，可保存为 JSON 文件，
+    在审阅后于其他时间或其他检出目录上执行。执行计划只进行文件读写，不需要扫描工程：
+
+    .. code:: python
+
+        plan = trans.plan()
+        plan.save("./work/image.plan.json")
+        # 之后或在另一份检出上
+        TransferPlan.load("./work/image.plan.json").apply("./project")
+
+    计划中的路径均为相对 ``root`` 的路径并使用 ``/`` 分隔，位于工程外的路径保留为绝对路径；
+    字节串按 ``latin-1`` 存储，保证执行时写入的内容与分析时一致。
+
+    :ivar str kind: 计划类型
+    :ivar str root: 生成计划时的工程根目录，执行时未指定根目录则使用此目录
+    """
+    kind = None
+    _version = 1
+    _kinds = {}
+
+    def __init__(self, root=None):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        """
+        self.root = root
+
+    @staticmethod
+    def register(plan_class):
+        u"""
+        登记计划类型，读取计划文件时按 ``kind`` 创建对应的计划
+        """
+        TransferPlan._kinds[plan_class.kind] = plan_class
+        return plan_class
+
+    def to_dict(self):
+        u"""
+        转换为可序列化为 JSON 的字典
+
+        :rtype: dict
+        """
+        data = {"version": self._version, "kind": self.kind,
+                "root": bytes_to_json(self.root)}
+        data.update(self._dump())
+        return data
+
+    @staticmethod
+    def from_dict(data):
+        u"""
+        由 :meth:`to_dict` 的结果还原计划
+
+        :param data: 计划字典
+        :type data: dict
+        :rtype: :class:`TransferPlan`
+        """
+        if data.get("version") != TransferPlan._version:
+            raise ValueError(
+                "Unsupported plan version: %r" % data.get("version"))
+        plan_class = TransferPlan._kinds.get(data.get("kind"))
+        if plan_class is None:
+            raise ValueError("Unknown plan kind: %r" % data.get("kind"))
+        plan = plan_class(bytes_from_json(data.get("root")))
+        plan._load(data)
+        return plan
+
+    def dumps(self):
+        u"""
+        序列化为 JSON 字符串
+
+        :rtype: str
+        """
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    @staticmethod
+    def loads(text):
+        u"""
+        从 JSON 字符串还原计划
+
+        :rtype: :class:`TransferPlan`
+        """
+        return TransferPlan.from_dict(json.loads(text))
+
+    def save(self, path):
+        u"""
+        保存为 JSON 文件
+
+        :param path: 计划文件路径
+        :type path: str
+        """
+        with atomic_write(path) as f:
+            f.write(self.dumps())
+
+    @staticmethod
+    def load(path):
+        u"""
+        读取 JSON 计划文件
+
+        :param path: 计划文件路径
+        :type path: str
+        :rtype: :class:`TransferPlan`
+        """
+        with open(path, "r") as f:
+            return TransferPlan.loads(f.read())
+
+    def relative(self, path):
+        u"""
+        将路径转换为计划中存储的形式
+
+        :param path: 文件路径
+        :type path: str
+        :rtype: str
+        """
+        rel_path = os.path.relpath(path, self.root)
+        if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            rel_path = os.path.abspath(path)
+        return rel_path.replace("\\", "/")
+
+    def resolve(self, path, root=None):
+        u"""
+        将计划中的路径转换为执行时的文件路径
+
+        :param path: 计划中的路径
+        :type path: str
+        :param root: 执行时的工程根目录，不设置则使用 ``root``
+        :type root: str
+        :rtype: str
+        """
+        if os.path.isabs(path):
+            return path
+        return os.path.join(root or self.root, *path.split("/"))
+
+    def _dump(self):
+        u"""
+        计划内容，子类实现
+        """
+        raise NotImplementedError
+
+    def _load(self, data):
+        u"""
+        读取计划内容，子类实现
+        """
+        raise NotImplementedError
+
+    def apply(self, root=None, logger=None, stats=None, journal=None):
+        u"""
+        执行计划
+
+        :param root: 执行时的工程根目录，不设置则使用生成计划时的目录
+        :type root: str
+        :param logger: 日志记录器
+        :type logger: logging.Logger
+        :param stats: 记录各阶段耗时与计数的统计对象
+        :type stats: :class:`~FSUtils.transfer.stats.TransferStats`
+        :param journal: 预写日志，设置后修改文件前先备份，可通过日志回滚
+        :type journal: :class:`~FSUtils.transfer.journal.Journal`
+        """
+        raise NotImplementedError
+
+    def changed_paths(self, root=None):
+        u"""
+        执行计划时会修改、创建或删除的文件，子类实现
+
+        :param root: 执行时的工程根目录，不设置则使用生成计划时的目录
+        :type root: str
+        :rtype: list
+        """
+        raise NotImplementedError
+
+
+class LocalePlan(TransferPlan):
+    u"""
+    国际化文本迁移计划
+
+    :ivar list move_keys: 需要移动的国际化查询键
+    :ivar list original_files: 需要移除查询键的源国际化资源文件
+    :ivar dict targets: 目标国际化资源文件与追加内容的映射，追加内容为
+        ``[(查询键, 原始值)]`` 构成的列表，执行时跳过目标文件中已存在的键
+    """
+    kind = "locale"
+    _eol = "\n"
+
+    def __init__(self, root=None):
+        super(LocalePlan, self).__init__(root)
+        self.move_keys = []
+        self.original_files = []
+        self.targets = {}
+
+    def _dump(self):
+        return {
+            "move_keys": [bytes_to_json(k) for k in self.move_keys],
+            "original_files": [bytes_to_json(p) for p in self.original_files],
+            "targets": dict(
+                (bytes_to_json(path),
+                 [[bytes_to_json(k), bytes_to_json(v)] for k, v in entries])
+                for path, entries in self.targets.iteritems()),
+        }
+
+    def _load(self, data):
+        self.move_keys = [bytes_from_json(k) for k in data["move_keys"]]
+        self.original_files = [
+            bytes_from_json(p) for p in data["original_files"]]
+        self.targets = dict(
+            (bytes_from_json(path),
+             [(bytes_from_json(k), bytes_from_json(v)) for k, v in entries])
+            for path, entries in data["targets"].iteritems())
+
+    def apply(self, root=None, logger=None, stats=None, journal=None):
+        logger = logger or logging.getLogger("fr")
+        stats = stats or TransferStats()
+        with stats.phase("transfer"):
+            if journal is not None:
+                journal.begin()
+                journal.record_dirs(set(
+                    os.path.dirname(self.resolve(p, root))
+                    for p in self.targets))
+                journal.record(
+                    [self.resolve(p, root) for p in self.original_files] +
+                    [self.resolve(p, root) for p in sorted(self.targets)])
+            self._apply(root, stats)
+            if journal is not None:
+                journal.complete()
+        stats.count("keys_moved", len(self.move_keys))
+        logger.debug("%d locale key(s) moved to %d file(s)."
+                     % (len(self.move_keys), len(self.targets)))
+
+    def changed_paths(self, root=None):
+        return [self.resolve(p, root)
+                for p in self.original_files + sorted(self.targets)]
+
+    def _apply(self, root, stats):
+        move_keys = set(self.move_keys)
+        # 移除模块独立的国际化内容
+        for rel_path in self.original_files:
+            path = self.resolve(rel_path, root)
+            with open(path, "r") as src, atomic_write(path) as f:
+                skip = continued = False
+                for line in src:
+                    if not continued:
+                        key = parse_key(line)
+                        skip = key in move_keys
+                        continued = key is not None and is_continued(line)
+                    else:
+                        continued = is_continued(line)
+                    stats.count("bytes_read", len(line))
+                    # 删除行(连同续行)，保留无关行
+                    if not skip:
+                        f.write(line)
+            stats.count("files_rewritten")
+        # 将移动的国际化内容增加到目标模块
+        for rel_path in sorted(self.targets):
+            path = self.resolve(rel_path, root)
+            exist_keys = set()
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with atomic_write(path) as f:
+                last_line = self._eol
+                if os.path.exists(path):
+                    with open(path, "r") as src:
+                        continued = False
+                        for line in src:
+                            if not continued:
+                                exist_keys.add(parse_key(line))
+                            continued = is_continued(line)
+                            stats.count("bytes_read", len(line))
+                            f.write(line)
+                            last_line = line
+                # 保证追加内容另起一行
+                if not last_line.endswith(self._eol):
+                    f.write(self._eol)
+                # 去重后追加
+                for k, value in self.targets[rel_path]:
+                    if k not in exist_keys:
+                        f.write("".join([k, "=", value, self._eol]))
+            stats.count("files_rewritten")
+
+
+class ImagePlan(TransferPlan):
+    u"""
+    图片迁移计划
+
+    :ivar list operations: 按执行顺序排列的图片操作，每项为包含 ``action`` ( ``copy`` 、
+        ``move`` 或 ``delete`` )、 ``image`` (图片调用路径)、 ``sources`` (图片文件列表，
+        为空表示未找到图片)与 ``target`` (迁移目标文件，删除操作为 ``None`` )的字典
+    :ivar list transferred: ``(迁移前的调用相对路径， 迁移后的调用相对路径)`` 构成的元组列表
+    :ivar dict rewrites: 代码文件与 ``{先前的图片调用路径: 当前的图片调用路径}`` 的映射
+    :ivar dict encodings: 代码文件与扫描时检测到的编码的映射，未记录的文件在修改时检测
+    :ivar list cleanup_dirs: 执行后需要清理空目录的目录列表
+    :ivar dict duplicates: 内容重复的图片调用路径与保留的图片调用路径的映射
+    :ivar int bytes_saved: 合并重复图片节省的字节数
+    """
+    kind = "image"
+
+    def __init__(self, root=None):
+        super(ImagePlan, self).__init__(root)
+        self.operations = []
+        self.transferred = []
+        self.rewrites = {}
+        self.encodings = {}
+        self.cleanup_dirs = []
+        self.duplicates = {}
+        self.bytes_saved = 0
+
+    def add_operation(self, action, image, sources, target=None):
+        u"""
+        增加图片操作
+
+        :param action: ``copy`` 、 ``move`` 或 ``delete``
+        :type action: str
+        :param image: 图片调用路径
+        :type image: str
+        :param sources: 图片文件路径列表
+        :type sources: list
+        :param target: 迁移目标文件路径
+        :type target: str
+        """
+        self.operations.append({
+            "action": action, "image": image,
+            "sources": [self.relative(p) for p in sources],
+            "target": None if target is None else self.relative(target)})
+
+    def _dump(self):
+        return {
+            "operations": [
+                dict((k, [bytes_to_json(s) for s in v] if k == "sources"
+                      else bytes_to_json(v)) for k, v in op.iteritems())
+                for op in self.operations],
+            "transferred": [[bytes_to_json(old), bytes_to_json(new)]
+                            for old, new in self.transferred],
+            "rewrites": dict(
+                (bytes_to_json(src),
+                 dict((bytes_to_json(old), bytes_to_json(new))
+                      for old, new in calls.iteritems()))
+                for src, calls in self.rewrites.iteritems()),
+            "encodings": dict((bytes_to_json(src), encoding)
+                              for src, encoding in self.encodings.iteritems()),
+            "cleanup_dirs": [bytes_to_json(d) for d in self.cleanup_dirs],
+            "duplicates": dict((bytes_to_json(img), bytes_to_json(canonical))
+                               for img, canonical
+                               in self.duplicates.iteritems()),
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def _load(self, data):
+        self.operations = [
+            dict((str(k), [bytes_from_json(s) for s in v] if k == "sources"
+                  else bytes_from_json(v)) for k, v in op.iteritems())
+            for op in data["operations"]]
+        self.transferred = [(bytes_from_json(old), bytes_from_json(new))
+                            for old, new in data["transferred"]]
+        self.rewrites = dict(
+            (bytes_from_json(src),
+             dict((bytes_from_json(old), bytes_from_json(new))
+                  for old, new in calls.iteritems()))
+            for src, calls in data["rewrites"].iteritems())
+        self.encodings = dict(
+            (bytes_from_json(src), str(encoding))
+            for src, encoding in data.get("encodings", {}).iteritems())
+        self.cleanup_dirs = [bytes_from_json(d) for d in data["cleanup_dirs"]]
+        self.duplicates = dict(
+            (bytes_from_json(img), bytes_from_json(canonical))
+            for img, canonical in data.get("duplicates", {}).iteritems())
+        self.bytes_saved = data.get("bytes_saved", 0)
+
+    def apply(self, root=None, logger=None, workers=1, hardlink=False,
+              stats=None, journal=None):
+        u"""
+        执行计划，依次执行 :meth:`apply_operations` 、 :meth:`apply_rewrites` 与
+        :meth:`apply_cleanup`
+
+        :param workers: 复制图片使用的线程数
+        :type workers: int
+        :param hardlink: 同一文件系统下复制图片时是否使用硬链接
+        :type hardlink: bool
+        :return: 成功替换了代码引用的图片调用路径集合
+        :rtype: set
+        """
+        logger = logger or logging.getLogger("fr")
+        stats = stats or TransferStats()
+        if journal is not None:
+            journal.begin()
+        self.apply_operations(root, logger, workers, hardlink, stats, journal)
+        replaced = self.apply_rewrites(root, logger, stats, journal)
+        self.apply_cleanup(root, stats)
+        if journal is not None:
+            journal.complete()
+        return replaced
+
+    def changed_paths(self, root=None):
+        paths = []
+        for op in self.operations:
+            if op["action"] != "copy":
+                paths.extend(self.resolve(p, root) for p in op["sources"])
+            if op["target"] is not None:
+                paths.append(self.resolve(op["target"], root))
+        paths.extend(self.resolve(src, root) for src in sorted(self.rewrites))
+        return paths
+
+    def apply_operations(self, root=None, logger=None, workers=1,
+                         hardlink=False, stats=None, journal=None):
+        u"""
+        复制、移动与删除图片
+
+        :param root: 执行时的工程根目录
+        :type root: str
+        :param logger: 日志记录器
+        :type logger: logging.Logger
+        :param workers: 复制图片使用的线程数
+        :type workers: int
+        :param hardlink: 同一文件系统下复制图片时是否使用硬链接
+        :type hardlink: bool
+        :param stats: 统计对象，耗时计入 ``transfer`` 阶段
+        :type stats: :class:`~FSUtils.transfer.stats.TransferStats`
+        :param journal: 预写日志，执行前记录所有将被删除、移动或覆盖的图片
+        :type journal: :class:`~FSUtils.transfer.journal.Journal`
+        """
+        logger = logger or logging.getLogger("fr")
+        stats = stats or TransferStats()
+        project_root = root or self.root
+        tasks = [(op["action"], [self.resolve(p, root) for p in op["sources"]],
+                  None if op["target"] is None
+                  else self.resolve(op["target"], root))
+                 for op in self.operations]
+        with stats.phase("transfer"):
+            if journal is not None:
+                journal.record_dirs(set(
+                    os.path.dirname(target) for action, sources, target
+                    in tasks if target is not None))
+                journal.record(
+                    [p for action, sources, target in tasks
+                     if action != "copy" for p in sources] +
+                    [target for action, sources, target in tasks
+                     if target is not None])
+            results = CopyEngine(workers, hardlink).run(tasks)
+        # 按计划顺序输出日志
+        for op, task, (sources, error) in zip(self.operations, tasks, results):
+            if not sources:
+                logger.error('Image "%s" not found.' % op["image"])
+                continue
+            for path in sources:
+                t_path = path.replace(project_root, "(project)")
+                if op["action"] != "delete":
+                    logger.debug("Copy %s\n  -> %s"
+                                 % (t_path, os.path.dirname(task[2])))
+                if op["action"] != "copy":
+                    logger.debug("Delete " + t_path)
+            if error is not None:
+                stats.count("image_errors")
+                logger.error('Transfer "%s" error: %s' % (op["image"], error))
+                continue
+            stats.count({"copy": "images_copied", "move": "images_moved",
+                         "delete": "images_deleted"}[op["action"]])
+            if op["action"] == "delete":
+                logger.info('"%s" removed.' % op["image"])
+            else:
+                logger.info('"%s" transferred.' % op["image"])
+        if self.duplicates:
+            logger.info("%d duplicate image(s) merged, %d byte(s) saved."
+                        % (len(self.duplicates), self.bytes_saved))
+
+    def apply_rewrites(self, root=None, logger=None, stats=None,
+                       journal=None):
+        u"""
+        修改代码中的图片调用
+
+        :param root: 执行时的工程根目录
+        :type root: str
+        :param logger: 日志记录器
+        :type logger: logging.Logger
+        :param stats: 统计对象，耗时计入 ``rewrite`` 阶段
+        :type stats: :class:`~FSUtils.transfer.stats.TransferStats`
+        :param journal: 预写日志，修改前记录所有需要修改的代码文件
+        :type journal: :class:`~FSUtils.transfer.journal.Journal`
+        :return: 成功替换了代码引用的图片调用路径集合
+        :rtype: set
+        """
+        logger = logger or logging.getLogger("fr")
+        stats = stats or TransferStats()
+        replaced = set()
+        with stats.phase("rewrite"):
+            if journal is not None:
+                journal.record(
+                    [self.resolve(src, root) for src in sorted(self.rewrites)])
+            for src in sorted(self.rewrites):
+                size, count = rewrite_source(
+                    self.resolve(src, root), self.rewrites[src],
+                    self.encodings.get(src))
+                replaced.update(self.rewrites[src])
+                stats.count("files_rewritten")
+                stats.count("bytes_read", size)
+                stats.count("regex_matches", count)
+        for img, target in self.transferred:
+            if img not in replaced:
+                logger.error('Replace "%s" error.' % img)
+            else:
+                logger.info('"%s" replaced.' % img)
+        return replaced
+
+    def apply_cleanup(self, root=None, stats=None):
+        u"""
+        清理迁移后留下的空目录
+
+        :param root: 执行时的工程根目录
+        :type root: str
+        :param stats: 统计对象，耗时计入 ``cleanup`` 阶段
+        :type stats: :class:`~FSUtils.transfer.stats.TransferStats`
+        """
+        stats = stats or TransferStats()
+        with stats.phase("cleanup"):
+            for d in self.cleanup_dirs:
+                remove_empty_dirs(self.resolve(d, root))
+
+
+def _is_ascii(value):
+    try:
+        value.decode("ascii")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def rewrite_source(src_path, replacements, encoding=None):
+    u"""
+    一次替换代码文件中的多个图片调用
+
+    文件按字节读写，换行符与 BOM 保持不变。ASCII 与 UTF-8 文件中的 ASCII 路径直接按字节
+    替换；其余情况(如 GBK 文件，其双字节字符的第二个字节可能与 ASCII 字符相同)按文件编码
+    解码一次后替换。没有发生替换时不写入文件。
+
+    :param src_path: 代码文件路径
+    :type src_path: str
+    :param replacements: 先前的图片调用路径与当前的图片调用路径的映射
+    :type replacements: dict
+    :param encoding: 扫描时检测到的文件编码，不设置则读取后检测
+    :type encoding: str
+    :return: ``(读取的字节数, 替换次数)``
+    :rtype: tuple
+    """
+    with open(src_path, "rb") as f:
+        code = f.read()
+    size = len(code)
+    if encoding is None:
+        encoding = detect_encoding(code)
+    by_bytes = encoding in ("ascii", "utf-8") and all(
+        _is_ascii(old) and _is_ascii(new)
+        for old, new in replacements.iteritems())
+    if not by_bytes:
+        if encoding == "ascii":
+            encoding = "utf-8"
+        code = code.decode(encoding)
+        replacements = dict(
+            (old.decode(encoding), new.decode(encoding))
+            for old, new in replacements.iteritems())
+    # 较长的路径优先匹配，避免被其前缀路径截断
+    regex = re.compile("|".join(
+        [re.escape(old)
+         for old in sorted(replacements, key=len, reverse=True)]))
+    code, count = regex.subn(lambda m: replacements[m.group(0)], code)
+    if count:
+        if not by_bytes:
+            code = code.encode(encoding)
+        # 替换而非覆盖原文件，预写日志中的硬链接备份保持原内容
+        with atomic_write(src_path, "wb") as f:
+            f.write(code)
+    return size, count
+
+
+TransferPlan.register(LocalePlan)
+TransferPlan.register(ImagePlan)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import array
+import bisect
+import mmap
+import re
+
+# 一个逻辑行：查询键、分隔符与值，值中的反斜杠连同其后的字符(包括换行符)一并读取，
+# 因此续行会被包含在值中
+_entry_regex = re.compile(
+    r'^[ \t\f]*((?:[^\s=:\\#!]|\\[\s\S])(?:[^\s=:\\]|\\[\s\S])*)'
+    r'[ \t\f]*[=:]?[ \t\f]*'
+    r'((?:[^\\\r\n]|\\(?:\r\n|[\s\S]))*)', re.M)
+_key_regex = re.compile(
+    r'[ \t\f]*((?:[^\s=:\\#!]|\\[\s\S])(?:[^\s=:\\]|\\[\s\S])*)')
+_continuation_regex = re.compile(r'\\(?:\r\n|\r|\n)[ \t\f]*')
+_escape_regex = re.compile(r'\\(u[0-9a-fA-F]{4}|[\s\S])')
+# 完整性位图中包含未置位行的字节
+_incomplete_byte_regex = re.compile("[^\xff]")
+_escapes = {"t": u"\t", "n": u"\n", "r": u"\r", "f": u"\f"}
+
+
+def parse_key(line):
+    u"""
+    取出 ``.properties`` 文件中一行的查询键
+
+    :param line: 资源文件中的一行
+    :type line: str
+    :return: 查询键，注释行与空行返回 ``None``
+    :rtype: str
+    """
+    m = _key_regex.match(line)
+    if m is None:
+        return None
+    return m.group(1)
+
+
+def is_continued(line):
+    u"""
+    判断 ``.properties`` 文件中的一行是否由下一行续写(以奇数个反斜杠结尾)
+
+    :param line: 资源文件中的一行
+    :type line: str
+    :rtype: bool
+    """
+    line = line.rstrip("\r\n")
+    return (len(line) - len(line.rstrip("\\"))) % 2 == 1
+
+
+def unescape(raw, encoding="latin-1"):
+    u"""
+    按 Java ``Properties`` 规则解码值：合并续行并处理转义字符
+
+    :param raw: 资源文件中的原始值
+    :type raw: str
+    :param encoding: 资源文件编码，Java 默认为 ``latin-1``
+    :type encoding: str
+    :rtype: unicode
+    """
+    value = _continuation_regex.sub("", raw).decode(encoding)
+
+    def _replace(m):
+        escape = m.group(1)
+        if len(escape) == 5:
+            return unichr(int(escape[1:], 16))
+        return _escapes.get(escape, escape)
+    return _escape_regex.sub(_replace, value)
+
+
+class PropertiesStore(object):
+    u"""
+    基于内存映射的 ``.properties`` 文件存储
+
+    首次读取时对映射的文件内容扫描一次，建立 ``查询键 -> (偏移, 长度)`` 的索引，值仅在读取时
+    才从映射中切出并解码。查询键与值的语法遵循 Java ``Properties`` ：支持 ``=`` 、 ``:`` 或空白
+    分隔、 ``#`` 与 ``!`` 注释、转义字符与续行。重复的查询键以最后一次出现为准。
+
+    .. code:: python
+
+        with PropertiesStore("fr_zh_CN.properties") as store:
+            raw = store.get_raw("Key")
+            value = store.get("Key")
+
+    :ivar str path: 资源文件路径
+    :ivar str encoding: 解码值时使用的编码
+    """
+
+    def __init__(self, path, encoding="latin-1"):
+        u"""
+        :param path: 资源文件路径
+        :type path: str
+        :param encoding: 解码值时使用的编码，Java 默认为 ``latin-1``
+        :type encoding: str
+        """
+        self.path = path
+        self.encoding = encoding
+        self._file = None
+        self._map = None
+        self._slots = None
+        self._offsets = None
+        self._lengths = None
+
+    def open(self):
+        u"""
+        映射文件，重复调用时直接返回
+        """
+        if self._map is not None:
+            return self
+        self._file = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._map = ""
+        return self
+
+    def entries(self):
+        u"""
+        扫描映射的文件内容，依次返回 ``(查询键, 值偏移, 值长度)`` 构成的元组
+
+        :rtype: generator
+        """
+        for m in _entry_regex.finditer(self.open()._map):
+            start, end = m.span(2)
+            yield m.group(1), start, end - start
+
+    def _get_slots(self):
+        u"""
+        建立查询键索引，首次读取时执行一次
+        """
+        if self._slots is None:
+            slots = {}
+            offsets = array.array("l")
+            lengths = array.array("l")
+            for key, offset, length in self.entries():
+                slot = slots.get(key)
+                if slot is None:
+                    slots[key] = len(offsets)
+                    offsets.append(offset)
+                    lengths.append(length)
+                else:
+                    offsets[slot] = offset
+                    lengths[slot] = length
+            self._slots, self._offsets, self._lengths = \
+                slots, offsets, lengths
+        return self._slots
+
+    def read(self, offset, length):
+        u"""
+        从映射中读取指定位置的原始内容
+
+        :param offset: 偏移
+        :type offset: int
+        :param length: 长度
+        :type length: int
+        :rtype: str
+        """
+        return self.open()._map[offset:offset + length]
+
+    def close(self):
+        u"""
+        关闭映射，之后的读取会重新映射文件并建立索引
+        """
+        if self._map is not None and not isinstance(self._map, str):
+            self._map.close()
+        if self._file is not None:
+            self._file.close()
+        self._file = self._map = None
+        self._slots = self._offsets = self._lengths = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __contains__(self, key):
+        return key in self._get_slots()
+
+    def __len__(self):
+        return len(self._get_slots())
+
+    def __iter__(self):
+        return iter(self._get_slots())
+
+    def keys(self):
+        u"""
+        所有查询键
+
+        :rtype: list
+        """
+        return self._get_slots().keys()
+
+    def get_raw(self, key, default=None):
+        u"""
+        取出查询键在文件中的原始值(未解码，保留转义与续行)
+
+        :param key: 查询键
+        :type key: str
+        :rtype: str
+        """
+        slot = self._get_slots().get(key)
+        if slot is None:
+            return default
+        return self.read(self._offsets[slot], self._lengths[slot])
+
+    def get(self, key, default=None):
+        u"""
+        取出查询键解码后的值
+
+        :param key: 查询键
+        :type key: str
+        :rtype: unicode
+        """
+        raw = self.get_raw(key)
+        if raw is None:
+            return default
+        return unescape(raw, self.encoding)
+
+
+class LocaleTable(object):
+    u"""
+    列式存储的国际化内容表
+
+    查询键排序并驻留( ``intern`` )后存放于一个数组中，通过二分查找定位行号；每个本地化标识一列，
+    由偏移数组与长度数组组成，指向对应 :class:`PropertiesStore` 内存映射中的原始值，值仅在
+    读取时切出并解码。加载时一并计算完整性位图：某键在所有列中均存在且值不为空时置位。加载完成
+    后不保留任何按键的字典。
+
+    .. code:: python
+
+        table = LocaleTable(stores, ["main", "en_US", "zh_CN"])
+        table.is_complete("Key")
+        table.get_raw("Key", "zh_CN")
+
+    :ivar list tags: 列对应的本地化标识，第一列为主资源文件
+    :ivar list keys: 排序后的查询键数组，取自主资源文件
+    """
+
+    def __init__(self, stores, tags):
+        u"""
+        :param stores: 本地化标识与资源文件存储的映射
+        :type stores: dict
+        :param tags: 列顺序，第一项为主资源文件的标识
+        :type tags: list
+        """
+        self.tags = list(tags)
+        self._stores = [stores[tag] for tag in self.tags]
+        self.keys = sorted(set(
+            intern(key) for key, offset, length in self._stores[0].entries()))
+        # 仅在加载时使用的行号映射
+        rows = dict((key, row) for row, key in enumerate(self.keys))
+        self._offsets = []
+        self._lengths = []
+        for store in self._stores:
+            offsets = array.array("l", [-1]) * len(self.keys)
+            lengths = array.array("l", [0]) * len(self.keys)
+            for key, offset, length in store.entries():
+                row = rows.get(key)
+                if row is not None:
+                    offsets[row] = offset
+                    lengths[row] = length
+            self._offsets.append(offsets)
+            self._lengths.append(lengths)
+        del rows
+        self._bitmap = self._build_bitmap()
+
+    def _build_bitmap(self):
+        u"""
+        计算完整性位图
+        """
+        bitmap = bytearray((len(self.keys) + 7) // 8)
+        columns = zip(self._stores, self._offsets, self._lengths)
+        for row in xrange(len(self.keys)):
+            for store, offsets, lengths in columns:
+                start, length = offsets[row], lengths[row]
+                if start < 0 or not length:
+                    break
+                # 仅由续行构成的值解码后为空
+                if store.open()._map.find(
+                        "\\", start, start + length) >= 0 and \
+                        not unescape(store.read(start, length),
+                                     store.encoding):
+                    break
+            else:
+                bitmap[row >> 3] |= 1 << (row & 7)
+        return bitmap
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self.row(key) >= 0
+
+    def row(self, key):
+        u"""
+        查询键所在行号
+
+        :param key: 查询键
+        :type key: str
+        :return: 行号，不存在时返回 ``-1``
+        :rtype: int
+        """
+        row = bisect.bisect_left(self.keys, key)
+        if row < len(self.keys) and self.keys[row] == key:
+            return row
+        return -1
+
+    def get_raw(self, key, tag, default=None):
+        u"""
+        取出查询键在指定本地化资源文件中的原始值
+
+        :param key: 查询键
+        :type key: str
+        :param tag: 本地化标识
+        :type tag: str
+        :rtype: str
+        """
+        row = self.row(key)
+        if row < 0:
+            return default
+        col = self.tags.index(tag)
+        offset = self._offsets[col][row]
+        if offset < 0:
+            return default
+        return self._stores[col].read(offset, self._lengths[col][row])
+
+    def get(self, key, tag, default=None):
+        u"""
+        取出查询键在指定本地化资源文件中解码后的值
+
+        :rtype: unicode
+        """
+        raw = self.get_raw(key, tag)
+        if raw is None:
+            return default
+        return unescape(raw, self._stores[self.tags.index(tag)].encoding)
+
+    def is_complete(self, key):
+        u"""
+        查询键在所有本地化资源文件中是否都存在且不为空
+
+        :param key: 查询键
+        :type key: str
+        :rtype: bool
+        """
+        row = self.row(key)
+        return row >= 0 and bool(self._bitmap[row >> 3] & (1 << (row & 7)))
+
+    def incomplete(self, keys):
+        u"""
+        从查询键列表中取出不完整的键，保持原顺序
+
+        只遍历一次位图，由不全为 1 的字节取出不完整的行，再与查询键列表求交，不逐键查找行号。
+
+        :param keys: 查询键列表
+        :type keys: list
+        :rtype: list
+        """
+        table_keys = self.keys
+        missing = set()
+        for m in _incomplete_byte_regex.finditer(str(self._bitmap)):
+            byte = ord(m.group())
+            base = m.start() << 3
+            for bit in xrange(min(8, len(table_keys) - base)):
+                if not byte & (1 << bit):
+                    missing.add(table_keys[base + bit])
+        # 不在表中的查询键同样不完整
+        missing.update(set(keys).difference(table_keys))
+        return [k for k in keys if k in missing]
+
+    def close(self):
+        u"""
+        关闭所有资源文件存储，之后仍可查询完整性，但原文件改变后不能再读取值
+        """
+        for store in self._stores:
+            store.close()
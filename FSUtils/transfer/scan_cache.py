@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import hashlib
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from file_ops import atomic_write
+
+
+class ScanCache(object):
+    u"""
+    代码扫描结果缓存
+
+    以 ``(文件路径, 修改时间, 文件大小)`` 为键保存单个文件的扫描结果，并持久化到工作目录，
+    再次运行时只重新扫描发生变化的文件。扫描配置(通配符、正则表达式等)的签名一并保存，签名
+    不一致时整个缓存失效。
+
+    缓存使用方式：
+
+    .. code:: python
+
+        cache = ScanCache("./work", "locale_keys", signature).load()
+        result = cache.get(path)
+        if result is None:
+            result = extract(path)
+            cache.set(path, result)
+        cache.save()
+
+    :ivar str path: 缓存文件路径
+    :ivar str signature: 扫描配置签名
+    :ivar int hits: 命中次数
+    :ivar int misses: 未命中次数
+    """
+    _version = 1
+    _suffix = ".cache"
+
+    def __init__(self, cache_dir, name, signature):
+        u"""
+        :param cache_dir: 缓存文件所在目录
+        :type cache_dir: str
+        :param name: 缓存名称，用于区分不同类型的扫描结果
+        :type name: str
+        :param signature: 扫描配置签名，可使用 :meth:`make_signature` 生成
+        :type signature: str
+        """
+        self.path = os.path.join(cache_dir, name + self._suffix)
+        self.signature = signature
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._touched = {}
+        self._dirty = False
+
+    @staticmethod
+    def make_signature(*parts):
+        u"""
+        根据扫描配置生成签名
+
+        :return: 配置签名
+        :rtype: str
+        """
+        return hashlib.md5(repr(parts)).hexdigest()
+
+    def load(self):
+        u"""
+        读取缓存文件，文件不存在、损坏或签名不一致时使用空缓存
+        """
+        self._entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == self._version and \
+                        data.get("signature") == self.signature:
+                    self._entries = data["entries"]
+            except Exception:
+                self._entries = {}
+        return self
+
+    @staticmethod
+    def _stat_key(path):
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+
+    def get(self, path):
+        u"""
+        取出文件的缓存结果
+
+        :param path: 文件路径
+        :type path: str
+        :return: 缓存的扫描结果，文件发生变化或未缓存时返回 ``None``
+        """
+        path = os.path.abspath(path)
+        stat_key = self._stat_key(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == stat_key:
+            self.hits += 1
+            self._touched[path] = entry
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, path, result):
+        u"""
+        保存文件的扫描结果
+
+        :param path: 文件路径
+        :type path: str
+        :param result: 扫描结果
+        """
+        path = os.path.abspath(path)
+        self._touched[path] = (self._stat_key(path), result)
+        self._dirty = True
+
+    def save(self, prune=True):
+        u"""
+        写入缓存文件
+
+        :param prune: 是否仅保留本次扫描涉及的文件，只扫描部分文件时设为 ``False`` ，保留
+            其余文件的缓存
+        :type prune: bool
+        """
+        if not prune:
+            if not self._dirty:
+                return
+            self._entries.update(self._touched)
+            self._touched = self._entries
+        elif not self._dirty and len(self._touched) == len(self._entries):
+            return
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        data = {"version": self._version, "signature": self.signature,
+                "entries": self._touched}
+        with atomic_write(self.path, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        self._entries = self._touched
+        self._touched = {}
+        self._dirty = False
+
+    def summary(self):
+        u"""
+        缓存命中情况
+
+        :rtype: str
+        """
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return "Scan cache %s: %d hit(s), %d miss(es), %.1f%% hit rate." % (
+            os.path.basename(self.path), self.hits, self.misses, rate)
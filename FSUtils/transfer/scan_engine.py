@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import fnmatch
+import logging
+import multiprocessing
+import os
+import time
+
+from file_index import ProjectFileIndex, compile_patterns
+from file_ops import detect_encoding
+from scan_cache import ScanCache
+from stats import TransferStats
+
+
+class Extractor(object):
+    u"""
+    代码扫描器基类
+
+    扫描器从代码文件内容中取出需要的信息，子类需设置 ``name`` 并实现 :meth:`extract` 。
+    扫描器会被传递到扫描进程池中执行，其属性需可序列化。
+
+    :ivar str name: 扫描器名称
+    :ivar list patterns: 扫描的代码文件类型通配符列表
+    """
+    name = None
+
+    def __init__(self, patterns):
+        u"""
+        :param patterns: 扫描的代码文件类型通配符列表，形如 ``["*.java", "*.js"]``
+        :type patterns: list
+        """
+        self.patterns = list(patterns)
+        self._extensions, self._others = compile_patterns(self.patterns)
+
+    def get_config(self):
+        u"""
+        影响扫描结果的配置，用于生成扫描器签名，子类按需覆盖
+        """
+        return ()
+
+    @property
+    def signature(self):
+        u"""
+        扫描器签名，名称、文件类型或配置变化时改变
+        """
+        return ScanCache.make_signature(
+            self.name, self.patterns, self.get_config())
+
+    @property
+    def key(self):
+        u"""
+        扫描结果的存储键，同名但配置不同的扫描器结果分开存储
+        """
+        return "%s-%s" % (self.name, self.signature[:8])
+
+    def get_index_patterns(self):
+        u"""
+        文件索引需要收录的文件类型通配符列表，默认为扫描的代码文件类型
+        """
+        return self.patterns
+
+    def match(self, path):
+        u"""
+        判断文件是否需要由当前扫描器处理
+
+        :param path: 代码文件路径
+        :type path: str
+        :rtype: bool
+        """
+        name = os.path.basename(path)
+        ext = os.path.normcase(os.path.splitext(name)[1])
+        if ext in self._extensions:
+            return True
+        for pattern in self._others:
+            if fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    def extract(self, codes):
+        u"""
+        从代码内容中取出信息
+
+        :param codes: 代码文件内容
+        :type codes: str
+        :return: 扫描结果
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def extract_file(self, src_file):
+        u"""
+        读取并扫描单个代码文件
+
+        :param src_file: 代码文件路径
+        :type src_file: str
+        :rtype: list
+        """
+        with open(src_file) as src:
+            return self.extract(src.read())
+
+
+def _scan_chunk(task):
+    u"""
+    进程池中执行的扫描任务，每个文件只读取一次并执行所有需要的扫描器，同时检测文件编码
+
+    :param task: ``(扫描器列表, [(文件路径, 扫描器序号列表)])`` 构成的元组
+    :type task: tuple
+    :return: ``(与文件顺序一致的 {扫描器序号: 扫描结果} 列表, 读取的字节数,
+        与文件顺序一致的编码列表)``
+    :rtype: tuple
+    """
+    extractors, files = task
+    results = []
+    encodings = []
+    bytes_read = 0
+    for path, indexes in files:
+        with open(path, "rb") as src:
+            codes = src.read()
+        bytes_read += len(codes)
+        encodings.append(detect_encoding(codes))
+        results.append(
+            dict((i, extractors[i].extract(codes)) for i in indexes))
+    return results, bytes_read, encodings
+
+
+class ScanEngine(object):
+    u"""
+    代码扫描引擎
+
+    持有工程文件索引，并在一次遍历中读取每个代码文件一次，对同一份内容执行所有已登记的扫描器，
+    各迁移工具按扫描器取出属于自己的结果。多个迁移工具共用一个引擎时，整个工程只需扫描一次：
+
+    .. code:: python
+
+        engine = ScanEngine(
+            "./project", extractors=TransferBase.get_extractors())
+        locale = LocaleTransfer(..., scan_engine=engine)
+        image = ImageTransfer(..., scan_engine=engine)
+
+    :ivar str root: 工程文件的根目录( ``project`` 目录)
+    :ivar list exclude_dirs: ``project`` 下需要排除的子目录
+    :ivar str cache_dir: 扫描结果缓存目录，为 ``None`` 时不使用缓存
+    :ivar int jobs: 扫描使用的进程数，为 ``1`` 时在当前进程中扫描
+    :ivar stats: 建立索引( ``collect`` )与扫描( ``extract`` )阶段的统计
+    :vartype stats: :class:`~FSUtils.transfer.stats.TransferStats`
+    """
+    _min_parallel_files = 64
+    _chunks_per_job = 4
+
+    def __init__(self, root, exclude_dirs=None, extractors=None, patterns=None,
+                 cache_dir=None, jobs=1, logger=None, stats=None):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        :param exclude_dirs: ``project`` 下需要排除的子目录
+        :type exclude_dirs: list
+        :param extractors: 首次扫描时一并执行的扫描器列表
+        :type extractors: list
+        :param patterns: 文件索引额外收录的文件类型通配符列表
+        :type patterns: list
+        :param cache_dir: 扫描结果缓存目录，不设置则不使用缓存
+        :type cache_dir: str
+        :param jobs: 扫描使用的进程数，小于 ``1`` 时使用全部 CPU
+        :type jobs: int
+        :param logger: 日志记录器
+        :type logger: logging.Logger
+        :param stats: 统计对象，不设置则单独创建
+        :type stats: :class:`~FSUtils.transfer.stats.TransferStats`
+        """
+        self.root = root
+        self.exclude_dirs = list(exclude_dirs or [])
+        self.cache_dir = cache_dir
+        if jobs < 1:
+            jobs = multiprocessing.cpu_count()
+        self.jobs = jobs
+        self.logger = logger or logging.getLogger("fr")
+        self.stats = stats or TransferStats(prefix="scan")
+        self.file_index = None
+        self._patterns = []
+        self._extractors = {}
+        self._pending = []
+        self._results = {}
+        self._caches = {}
+        self.require_patterns(patterns or [])
+        for extractor in extractors or []:
+            self.add_extractor(extractor)
+
+    def require_patterns(self, patterns):
+        u"""
+        要求文件索引收录指定类型的文件，索引已建立且未收录时重新建立索引
+
+        :param patterns: 文件类型通配符列表
+        :type patterns: list
+        """
+        missing = [p for p in patterns if p not in self._patterns]
+        if missing:
+            self._patterns.extend(missing)
+            self.file_index = None
+
+    def get_file_index(self):
+        u"""
+        获取工程文件索引，首次调用时遍历工程目录建立索引
+
+        :rtype: :class:`~FSUtils.transfer.file_index.ProjectFileIndex`
+        """
+        if self.file_index is None:
+            with self.stats.phase("collect"):
+                self.file_index = ProjectFileIndex(
+                    self.root, self._patterns, self.exclude_dirs).build()
+            self.stats.count("files_walked", self.file_index.files_walked)
+        return self.file_index
+
+    def add_extractor(self, extractor):
+        u"""
+        登记扫描器，扫描器将在下一次扫描时执行
+
+        :type extractor: :class:`Extractor`
+        """
+        key = extractor.key
+        if key not in self._extractors:
+            self._extractors[key] = extractor
+            self._pending.append(key)
+            self.require_patterns(extractor.get_index_patterns())
+
+    def extract(self, extractor, files):
+        u"""
+        取出扫描器对指定文件的扫描结果，尚未扫描时先执行一次扫描
+
+        :param extractor: 扫描器
+        :type extractor: :class:`Extractor`
+        :param files: 代码文件路径列表，需为文件索引中的路径
+        :type files: list
+        :return: 与 ``files`` 顺序一致的扫描结果列表
+        :rtype: list
+        """
+        self.add_extractor(extractor)
+        if self._pending:
+            self.scan()
+        results = self._results[extractor.key]
+        missing = [f for f in files if f not in results]
+        # 未被索引的文件单独扫描
+        for f in missing:
+            results[f] = extractor.extract_file(f)
+            self.stats.count("regex_matches", len(results[f]))
+        return [results[f] for f in files]
+
+    def scan_files(self, extractor, files, cache=True):
+        u"""
+        扫描指定的文件。扫描器已在引擎中登记时与其他扫描器共用一次扫描并取出结果，否则只扫描
+        这些文件，结果不保存在引擎中，但设置了 ``cache_dir`` 时写入扫描结果缓存
+
+        :param extractor: 扫描器
+        :type extractor: :class:`Extractor`
+        :param files: 代码文件路径列表
+        :type files: list
+        :param cache: 是否使用扫描结果缓存，调用方自行持久化扫描结果时可设为 ``False``
+        :type cache: bool
+        :return: 与 ``files`` 顺序一致的扫描结果列表
+        :rtype: list
+        """
+        if extractor.key in self._extractors:
+            return self.extract(extractor, files)
+        scan_cache = self._get_cache(extractor) if cache else None
+        results = [None] * len(files)
+        pending = []
+        for i, path in enumerate(files):
+            if scan_cache is not None:
+                results[i] = scan_cache.get(path)
+            if results[i] is None:
+                pending.append(i)
+        with self.stats.phase("extract"):
+            extracted, bytes_read, encodings = self._run(
+                [extractor], [(files[i], [0]) for i in pending])
+        self._cache_encodings([files[i] for i in pending], encodings)
+        for i, result in zip(pending, extracted):
+            results[i] = result[0]
+            if scan_cache is not None:
+                scan_cache.set(files[i], result[0])
+        self.stats.count("files_scanned", len(pending))
+        self.stats.count("bytes_read", bytes_read)
+        self.stats.count("regex_matches", sum(len(r) for r in results))
+        if scan_cache is not None:
+            # 只扫描了部分文件，保留其余文件的缓存
+            scan_cache.save(prune=False)
+            self.logger.info(scan_cache.summary())
+        return results
+
+    def _get_cache(self, extractor):
+        u"""
+        获取扫描器的扫描结果缓存，首次调用时从 ``cache_dir`` 加载，未设置时返回 ``None``
+
+        :rtype: :class:`~FSUtils.transfer.scan_cache.ScanCache`
+        """
+        if self.cache_dir is None:
+            return None
+        scan_cache = self._caches.get(extractor.key)
+        if scan_cache is None:
+            scan_cache = self._caches[extractor.key] = ScanCache(
+                self.cache_dir, extractor.key, extractor.signature).load()
+        return scan_cache
+
+    def scan(self):
+        u"""
+        一次遍历所有已索引的代码文件，执行所有待执行的扫描器
+        """
+        # 建立索引单独计入 collect 阶段
+        self.get_file_index()
+        with self.stats.phase("extract"):
+            self._scan()
+
+    def _scan(self):
+        extractors = [self._extractors[key] for key in self._pending]
+        self._pending = []
+        caches = [self._get_cache(e) for e in extractors]
+        results = [{} for e in extractors]
+        # 取出每个文件需要执行的扫描器
+        tasks = []
+        index = self.get_file_index()
+        for module in index.modules:
+            for path in index.get_files(module):
+                indexes = []
+                for i, extractor in enumerate(extractors):
+                    if not extractor.match(path):
+                        continue
+                    cached = None
+                    if caches[i] is not None:
+                        cached = caches[i].get(path)
+                    if cached is None:
+                        indexes.append(i)
+                    else:
+                        results[i][path] = cached
+                if indexes:
+                    tasks.append((path, indexes))
+        start = time.time()
+        extracted_list, bytes_read, encodings = self._run(extractors, tasks)
+        self._cache_encodings([path for path, indexes in tasks], encodings)
+        self.stats.count("files_scanned", len(tasks))
+        self.stats.count("bytes_read", bytes_read)
+        for (path, indexes), extracted in zip(tasks, extracted_list):
+            for i, result in extracted.iteritems():
+                self.stats.count("regex_matches", len(result))
+                results[i][path] = result
+                if caches[i] is not None:
+                    caches[i].set(path, result)
+        self.logger.debug("Scanned %d file(s) for %s in %.3fs with %d job(s)."
+                          % (len(tasks), ", ".join(e.name for e in extractors),
+                             time.time() - start, self.jobs))
+        for i, extractor in enumerate(extractors):
+            self._results[extractor.key] = results[i]
+            if caches[i] is not None:
+                caches[i].save()
+                self.logger.info(caches[i].summary())
+
+    def _cache_encodings(self, files, encodings):
+        u"""
+        将扫描时检测到的编码缓存到文件索引中，只缓存已被索引的文件
+        """
+        index = self.get_file_index()
+        for path, encoding in zip(files, encodings):
+            if index.has_file(path):
+                index.set_encoding(path, encoding)
+
+    def reset(self):
+        u"""
+        丢弃文件索引与所有扫描结果，下一次取出结果时重新建立索引并扫描
+        """
+        self.file_index = None
+        self._results = {}
+        self._pending = sorted(self._extractors)
+
+    def update(self, paths):
+        u"""
+        同步文件变化：更新文件索引，并只对发生变化的文件重新执行已完成扫描的扫描器
+
+        :param paths: 发生变化的文件或目录路径列表
+        :type paths: list
+        :return: 按路径排序的受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表
+        :rtype: list
+        """
+        index = self.get_file_index()
+        changed = {}
+        for path in paths:
+            for module, file_path, exists in index.update_path(path):
+                changed[file_path] = (module, exists)
+        for file_path in sorted(changed):
+            exists = changed[file_path][1]
+            keys = []
+            for key, results in self._results.iteritems():
+                results.pop(file_path, None)
+                if exists and self._extractors[key].match(file_path):
+                    keys.append(key)
+            if not keys:
+                continue
+            # 与完整扫描一致，每个文件只读取一次，并缓存检测到的编码
+            try:
+                with open(file_path, "rb") as src:
+                    codes = src.read()
+            except (IOError, OSError):
+                # 文件在事件之后又被删除，等待下一次事件
+                continue
+            self._cache_encodings([file_path], [detect_encoding(codes)])
+            for key in keys:
+                self._results[key][file_path] = \
+                    self._extractors[key].extract(codes)
+        return [(module, file_path, exists) for file_path, (module, exists)
+                in sorted(changed.iteritems())]
+
+    def _run(self, extractors, tasks):
+        u"""
+        执行扫描，文件较多且 ``jobs`` 大于 ``1`` 时分块交由进程池处理
+
+        :return: ``(与 tasks 顺序一致的 {扫描器序号: 扫描结果} 列表, 读取的字节数,
+            与 tasks 顺序一致的编码列表)``
+        :rtype: tuple
+        """
+        if self.jobs <= 1 or len(tasks) < self._min_parallel_files:
+            return _scan_chunk((extractors, tasks))
+        chunk_size = max(1, len(tasks) // (self.jobs * self._chunks_per_job))
+        chunks = [(extractors, tasks[i:i + chunk_size])
+                  for i in xrange(0, len(tasks), chunk_size)]
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            # map 按任务顺序返回结果，保证与串行扫描一致
+            results = pool.map(_scan_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        return ([result for chunk, n, e in results for result in chunk],
+                sum(n for chunk, n, e in results),
+                [encoding for chunk, n, e in results for encoding in e])
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import cProfile
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def _cpu_time():
+    u"""
+    当前进程的 CPU 时间，不含扫描进程池中子进程的时间
+    """
+    if os.name == "nt":
+        # Windows 下 time.clock 返回的是经过的时间
+        times = os.times()
+        return times[0] + times[1]
+    return time.clock()
+
+
+class TransferStats(object):
+    u"""
+    迁移过程统计
+
+    按阶段记录耗时与 CPU 时间，并累计遍历文件数、读取字节数、正则匹配数等计数。阶段可以嵌套，
+    如迁移分析中触发的首次扫描，内层阶段的耗时只计入内层阶段，各阶段耗时之和即为总耗时。嵌套
+    按统计对象分别计算，迁移工具自行创建的扫描引擎与迁移工具共用同一统计对象。
+
+    .. code:: python
+
+        stats = TransferStats(profile=["extract"], profile_dir="./log")
+        with stats.phase("extract"):
+            ...
+        stats.count("bytes_read", 1024)
+        print stats.report()
+
+    :ivar phases: 阶段名称与 ``[耗时, CPU 时间, 次数]`` 的映射，按首次执行的顺序排列
+    :vartype phases: collections.OrderedDict
+    :ivar counters: 计数名称与计数的映射
+    :vartype counters: collections.OrderedDict
+    :ivar profile: 为 ``True`` 时对所有阶段使用 cProfile 采样，也可以是阶段名称列表。嵌套的
+        阶段分别采样，内层阶段执行期间外层阶段的采样暂停
+    :ivar str profile_dir: 采样结果( ``.prof`` 文件)的输出目录
+    :ivar str prefix: 采样结果文件名前缀
+    :ivar list profile_files: 已写入的采样结果文件
+    """
+    def __init__(self, profile=False, profile_dir=None, prefix="transfer"):
+        u"""
+        :param profile: 是否使用 cProfile 采样，为阶段名称列表时只采样指定阶段
+        :type profile: bool or list
+        :param profile_dir: 采样结果的输出目录，不设置则使用当前工作目录
+        :type profile_dir: str
+        :param prefix: 采样结果文件名前缀，文件名形如 ``<prefix>-<阶段>.prof``
+        :type prefix: str
+        """
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.profile = profile
+        self.profile_dir = profile_dir or "./"
+        self.prefix = prefix
+        self.profile_files = []
+        self._profilers = {}
+        # 正在计时的阶段，嵌套阶段的耗时从外层阶段中扣除
+        self._phase_stack = []
+
+    def _should_profile(self, name):
+        if not self.profile:
+            return False
+        if self.profile is True:
+            return True
+        return name in self.profile
+
+    @contextmanager
+    def phase(self, name):
+        u"""
+        记录一个阶段的耗时，同名阶段多次执行时累计
+
+        :param name: 阶段名称，如 ``collect`` 、 ``extract``
+        :type name: str
+        """
+        stack = self._phase_stack
+        # 同一时刻只能有一个 cProfile 采样器生效，暂停外层阶段的采样
+        outer = self._active_profiler()
+        profiler = None
+        if self._should_profile(name):
+            profiler = self._profilers.get(name)
+            if profiler is None:
+                profiler = self._profilers[name] = cProfile.Profile()
+            if outer is not None:
+                outer.disable()
+            profiler.enable()
+        # [开始时间, 开始 CPU 时间, 内层阶段耗时, 内层阶段 CPU 时间, 采样器]
+        frame = [time.time(), _cpu_time(), 0.0, 0.0, profiler]
+        stack.append(frame)
+        try:
+            yield self
+        finally:
+            stack.pop()
+            wall = time.time() - frame[0]
+            cpu = _cpu_time() - frame[1]
+            if stack:
+                stack[-1][2] += wall
+                stack[-1][3] += cpu
+            record = self.phases.setdefault(name, [0.0, 0.0, 0])
+            record[0] += wall - frame[2]
+            record[1] += cpu - frame[3]
+            record[2] += 1
+            if profiler is not None:
+                profiler.disable()
+                self._dump_profile(name, profiler)
+                if outer is not None:
+                    outer.enable()
+
+    def _active_profiler(self):
+        u"""
+        正在采样的最内层阶段的采样器，没有时返回 ``None``
+        """
+        for frame in reversed(self._phase_stack):
+            if frame[4] is not None:
+                return frame[4]
+        return None
+
+    def _dump_profile(self, name, profiler):
+        u"""
+        写入阶段的采样结果，同名阶段多次执行时结果累计
+        """
+        path = os.path.join(self.profile_dir,
+                            "%s-%s.prof" % (self.prefix.lower(), name))
+        profiler.dump_stats(path)
+        if path not in self.profile_files:
+            self.profile_files.append(path)
+
+    def count(self, name, value=1):
+        u"""
+        累加计数
+
+        :param name: 计数名称，如 ``files_walked`` 、 ``bytes_read``
+        :type name: str
+        :param value: 增加的数量
+        :type value: int
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name):
+        u"""
+        取出计数，未记录时为 ``0``
+
+        :rtype: int
+        """
+        return self.counters.get(name, 0)
+
+    @property
+    def total_time(self):
+        u"""
+        所有阶段的耗时之和
+        """
+        return sum(record[0] for record in self.phases.itervalues())
+
+    def merge(self, other):
+        u"""
+        合并另一个统计对象的阶段与计数
+
+        :type other: :class:`TransferStats`
+        :return: 当前统计对象
+        :rtype: :class:`TransferStats`
+        """
+        for name, (wall, cpu, calls) in other.phases.iteritems():
+            record = self.phases.setdefault(name, [0.0, 0.0, 0])
+            record[0] += wall
+            record[1] += cpu
+            record[2] += calls
+        for name, value in other.counters.iteritems():
+            self.count(name, value)
+        for path in other.profile_files:
+            if path not in self.profile_files:
+                self.profile_files.append(path)
+        return self
+
+    def to_dict(self):
+        u"""
+        转换为可保存为 JSON 的字典
+
+        :rtype: dict
+        """
+        return {
+            "phases": OrderedDict(
+                (name, {"wall": round(wall, 4), "cpu": round(cpu, 4),
+                        "calls": calls})
+                for name, (wall, cpu, calls) in self.phases.iteritems()),
+            "counters": OrderedDict(self.counters),
+            "total": round(self.total_time, 4),
+        }
+
+    def report(self, title=None):
+        u"""
+        生成统计报告
+
+        :param title: 报告标题
+        :type title: str
+        :rtype: str
+        """
+        lines = []
+        if title:
+            lines.append(title)
+        lines.append("%-10s %10s %10s %6s" % ("phase", "wall(s)", "cpu(s)",
+                                             "calls"))
+        for name, (wall, cpu, calls) in self.phases.iteritems():
+            lines.append("%-10s %10.3f %10.3f %6d" % (name, wall, cpu, calls))
+        lines.append("%-10s %10.3f" % ("total", self.total_time))
+        for name, value in self.counters.iteritems():
+            lines.append("%s: %d" % (name, value))
+        for path in self.profile_files:
+            lines.append("profile: %s" % path)
+        return "\n".join(lines)
@@ -14,20 +14,34 @@
 
 __author__ = 'kyle'
 
-import glob
 import logging
 import os
 
+from file_ops import remove_empty_dirs
+from journal import Journal
+from scan_engine import ScanEngine
+from stats import TransferStats
+
 
 class TransferBase(object):
     u"""
-    :ivar list _module_files:
-    :ivar list _exclude_files:
-    :ivar
+    :ivar list _module_files: 目标模块中的代码文件路径列表
+    :ivar list _exclude_files: 其余模块中的代码文件路径列表
+    :ivar scan_engine: 代码扫描引擎，可由多个迁移工具共用
+    :vartype scan_engine: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
     :ivar list source_pattern: 代码文件类型的通配符列表
     :ivar str project_root: 工程文件的根目录( ``project`` 目录)
     :ivar list target_modules: 迁移国际化内容的目标模块列表
     :ivar list exclude_dirs: "project"下需要排除的子目录
+    :ivar str cache_dir: 扫描结果缓存目录，为 ``None`` 时不使用缓存
+    :ivar int jobs: 扫描代码文件使用的进程数，为 ``1`` 时在当前进程中扫描
+    :ivar stats: 各阶段耗时与计数的统计，完整的统计见 :meth:`get_stats`
+    :vartype stats: :class:`~FSUtils.transfer.stats.TransferStats`
+    :ivar journal: 预写日志，未启用时为 ``None``
+    :vartype journal: :class:`~FSUtils.transfer.journal.Journal`
+
+    分析结果在首次读取时才计算，各结果只执行其依赖的分析步骤，构造迁移工具不会扫描工程。
+    需要提前完成全部分析时调用 :meth:`analyze` 。
     """
     _eol = "\n"
     _src_dir = "src"
@@ -35,16 +49,26 @@ class TransferBase(object):
 
     _module_files = []
     _exclude_files = []
+    _extractors = {}
+    # 按依赖顺序排列的 (分析步骤方法名称, 阶段名称) 列表，子类设置
+    _analysis_steps = []
+    _analyzed = set()
 
     logger = None
+    scan_engine = None
+    stats = None
+    journal = None
 
     source_pattern = []
     project_root = "./"
     target_modules = []
     exclude_dirs = ["out", ".svn", ".idea"]
+    cache_dir = None
+    jobs = 1
 
     def __init__(self, root, modules, exclude_dirs=None,
-                 log_dir=None, log_level=logging.INFO):
+                 log_dir=None, log_level=logging.INFO, cache_dir=None, jobs=1,
+                 scan_engine=None, profile=False, journal=False):
         u"""
 
         :param root: 工程文件的根目录( ``project`` 目录)
@@ -53,39 +77,133 @@ class TransferBase(object):
         :type modules: list
         :param exclude_dirs: ``project`` 下需要排除的子目录
         :type exclude_dirs: list
+        :param cache_dir: 扫描结果缓存目录，不设置则不使用缓存。子类持久化的索引(查询键
+            使用索引、图片引用关系图)本身记录各文件的扫描结果，启用时对应的扫描不再写入此缓存
+        :type cache_dir: str
+        :param jobs: 扫描代码文件使用的进程数，小于 ``1`` 时使用全部 CPU
+        :type jobs: int
+        :param scan_engine: 共用的代码扫描引擎，设置后忽略 ``cache_dir`` 与 ``jobs``
+        :type scan_engine: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+        :param profile: 是否使用 cProfile 采样各阶段并将 ``.prof`` 文件写入日志目录，
+            为阶段名称列表时只采样指定阶段
+        :type profile: bool or list
+        :param journal: 是否使用预写日志，日志位于日志目录下的 ``journal`` 目录中。启用时
+            如发现上一次中断的迁移，先将其回滚
+        :type journal: bool
         """
         self.project_root = root
+        self.cache_dir = cache_dir
+        self.jobs = jobs
         self.target_modules = modules
-        self.__init_logger(log_dir, log_level)
+        self.logger = self.init_logger(log_dir, log_level)
         if exclude_dirs is not None:
             self.exclude_dirs = exclude_dirs
+        self.scan_engine = scan_engine
+        self.stats = TransferStats(profile, log_dir, type(self).__name__)
+        self._journal_dir = os.path.join(
+            log_dir or "./", "journal", type(self).__name__.lower())
+        self._module_files = []
+        self._exclude_files = []
+        self._analyzed = set()
+        if journal:
+            self.journal = Journal(self._journal_dir, root)
+            restored = self.journal.recover(self.logger)
+            if restored:
+                self._sync_files(restored)
+
+    @staticmethod
+    def init_logger(log_dir=None, level=logging.INFO):
+        u"""
+        配置共用的 ``fr`` 日志记录器，将日志追加到 ``log_dir`` 下的 ``log.txt`` 。同一文件
+        只添加一次，多个迁移工具使用同一日志目录时每条日志只写入一次
 
-    def __init_logger(self, log_dir=None, level=logging.INFO):
+        :param log_dir: 日志文件输出路径
+        :type log_dir: str
+        :param level: 日志记录等级
+        :type level: int
+        :rtype: logging.Logger
+        """
         if not log_dir:
             log_dir = "./"
-        fmt = logging.Formatter(
-            fmt='%(asctime)s \n%(levelname)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S')
-        file_handler = logging.FileHandler(
-            filename=os.path.join(log_dir, 'log.txt'), mode='a')
-        file_handler.setFormatter(fmt)
         logging.basicConfig(
             level=level,
             format='%(asctime)s \n%(levelname)s: %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        self.logger = logging.getLogger("fr")
-        self.logger.addHandler(file_handler)
+        logger = logging.getLogger("fr")
+        filename = os.path.abspath(os.path.join(log_dir, 'log.txt'))
+        for handler in logger.handlers:
+            if getattr(handler, "baseFilename", None) == filename:
+                return logger
+        fmt = logging.Formatter(
+            fmt='%(asctime)s \n%(levelname)s: %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S')
+        file_handler = logging.FileHandler(filename=filename, mode='a')
+        file_handler.setFormatter(fmt)
+        logger.addHandler(file_handler)
+        return logger
+
+    @staticmethod
+    def register_extractor(extractor):
+        u"""
+        登记扫描器，使用 :meth:`get_extractors` 创建的扫描引擎会在一次扫描中执行所有已登记的
+        扫描器
+
+        :param extractor: 扫描器
+        :type extractor: :class:`~FSUtils.transfer.scan_engine.Extractor`
+        """
+        TransferBase._extractors[extractor.name] = extractor
+        return extractor
+
+    @staticmethod
+    def get_extractors():
+        u"""
+        取出所有已登记的扫描器
+
+        :rtype: list
+        """
+        return [TransferBase._extractors[name]
+                for name in sorted(TransferBase._extractors)]
+
+    def _get_index_patterns(self):
+        u"""
+        文件索引需要收录的文件类型通配符列表，子类可按需扩展
+        """
+        return self.source_pattern
+
+    def get_scan_engine(self):
+        u"""
+        获取代码扫描引擎，未设置共用引擎时按当前配置创建
+
+        :rtype: :class:`~FSUtils.transfer.scan_engine.ScanEngine`
+        """
+        if self.scan_engine is None:
+            self.scan_engine = ScanEngine(
+                self.project_root, self.exclude_dirs,
+                cache_dir=self.cache_dir, jobs=self.jobs, logger=self.logger,
+                stats=self.stats)
+        return self.scan_engine
+
+    def get_file_index(self):
+        u"""
+        获取工程文件索引，首次调用时遍历工程目录建立索引
+
+        :rtype: :class:`~FSUtils.transfer.file_index.ProjectFileIndex`
+        """
+        engine = self.get_scan_engine()
+        engine.require_patterns(self._get_index_patterns())
+        return engine.get_file_index()
 
     def collect_source_files(self):
         u"""
         收集代码文件路径
         """
+        index = self.get_file_index()
+        self._module_files = []
+        self._exclude_files = []
         for module in self.target_modules:
             self._module_files.extend(self.get_module_files(module))
-        for module in os.listdir(self.project_root):
-            if module in self.exclude_dirs:
-                continue
+        for module in index.modules:
             if module not in self.target_modules:
                 self._exclude_files.extend(self.get_module_files(module))
 
@@ -96,32 +214,149 @@ class TransferBase(object):
         :param module: 模块包目录名称，如 ``base``
         :type module: str
         """
-        src_files = []
-        module_path = os.path.join(self.project_root, module)
-        for root, dirs, files in os.walk(module_path):
-            if ".svn" in root:
-                continue
-            for d in dirs:
-                file_path = lambda p: os.path.join(root, d, p)
-                for pattern in self.source_pattern:
-                    # 检索代码文件
-                    files = glob.glob(file_path(pattern))
-                    src_files.extend(files)
-        return src_files
+        return self.get_file_index().get_files(module, self.source_pattern)
+
+    def _require(self, step):
+        u"""
+        确保分析步骤已执行，未执行时在其阶段中执行一次
+
+        :param step: 分析步骤方法名称，见 ``_analysis_steps``
+        :type step: str
+        """
+        if step in self._analyzed:
+            return
+        with self.stats.phase(dict(self._analysis_steps)[step]):
+            getattr(self, step)()
+        self._analyzed.add(step)
+
+    def analyze(self):
+        u"""
+        立即执行全部分析步骤，已执行的步骤不再重复
+
+        :return: 当前迁移工具
+        """
+        for step, phase in self._analysis_steps:
+            self._require(step)
+        return self
+
+    def invalidate(self, steps=None):
+        u"""
+        丢弃分析结果，下一次读取时重新计算
+
+        :param steps: 需要丢弃的分析步骤方法名称列表，不设置则丢弃全部
+        :type steps: list
+        """
+        if steps is None:
+            self._analyzed.clear()
+        else:
+            self._analyzed.difference_update(steps)
+
+    def plan(self):
+        u"""
+        分析工程并生成迁移计划，不修改任何文件
+
+        :rtype: :class:`~FSUtils.transfer.plan.TransferPlan`
+        """
+        raise NotImplementedError
+
+    def apply(self, plan):
+        u"""
+        执行迁移计划，只进行文件读写，之后同步已建立的文件索引与扫描结果
+
+        :param plan: 迁移计划
+        :type plan: :class:`~FSUtils.transfer.plan.TransferPlan`
+        """
+        result = plan.apply(self.project_root, self.logger, stats=self.stats,
+                            journal=self.journal)
+        self._sync_files(plan.changed_paths(self.project_root))
+        return result
+
+    def transfer(self):
+        u"""
+        生成并执行迁移计划，完成后输出统计报告
+        """
+        with self.stats.phase("plan"):
+            plan = self.plan()
+        result = self.apply(plan)
+        self.logger.info(self.stats_report())
+        return result
+
+    def rollback(self):
+        u"""
+        按预写日志撤销最近一次迁移，并重新计算迁移候选。未启用预写日志时使用磁盘上已有的日志。
+
+        :return: 恢复的文件路径列表，没有日志时为空列表
+        :rtype: list
+        """
+        journal = self.journal or Journal(self._journal_dir, self.project_root)
+        restored = journal.rollback(self.logger)
+        if not restored:
+            self.logger.warning("Nothing to roll back.")
+            return restored
+        self.refresh(restored, self._sync_files(restored))
+        return restored
+
+    def _sync_files(self, paths):
+        u"""
+        文件被写入或恢复后同步已建立的文件索引与扫描结果
+
+        :return: 受影响的 ``(模块, 文件路径, 是否存在)`` 元组列表，尚未建立文件索引时返回
+            ``None``
+        :rtype: list
+        """
+        engine = self.scan_engine
+        if engine is not None and engine.file_index is not None:
+            return engine.update(paths)
+        return None
+
+    def get_stats(self):
+        u"""
+        取出完整的统计，使用共用的扫描引擎时合并引擎中建立索引与扫描阶段的统计
+
+        :rtype: :class:`~FSUtils.transfer.stats.TransferStats`
+        """
+        engine_stats = self.get_scan_engine().stats
+        if engine_stats is self.stats:
+            return self.stats
+        return TransferStats().merge(engine_stats).merge(self.stats)
+
+    def stats_report(self):
+        u"""
+        各阶段耗时与计数的统计报告
+
+        :rtype: str
+        """
+        return self.get_stats().report(
+            "%s statistics:" % type(self).__name__)
+
+    def refresh(self, paths=None, changes=None):
+        u"""
+        文件发生变化后，按扫描引擎中已更新的扫描结果重新计算迁移候选，子类实现
+
+        :param paths: 发生变化的路径列表，为 ``None`` 时视为全部变化
+        :type paths: list
+        :param changes: 扫描引擎同步 ``paths`` 后返回的受影响文件，见
+            :meth:`~FSUtils.transfer.scan_engine.ScanEngine.update` 。设置时只增量更新这些
+            文件，为 ``None`` 时重新同步整个工程
+        :type changes: list
+        """
+        raise NotImplementedError
+
+    def summary(self):
+        u"""
+        当前迁移候选的摘要，子类实现
+
+        :rtype: str
+        """
+        raise NotImplementedError
 
     def clear_target_dirs(self):
         u"""
         清理目标模块中的空目录
         """
         for module in self.target_modules:
-            src_path = os.path.join(self.project_root, module, self._src_dir)
-            for root, dirs, files in os.walk(src_path, topdown=False):
-                if ".svn" in root:
-                    continue
-                for d in dirs:
-                    dir_path = os.path.join(root, d)
-                    if not os.listdir(dir_path):
-                        os.rmdir(dir_path)
+            remove_empty_dirs(
+                os.path.join(self.project_root, module, self._src_dir))
 
     @staticmethod
     def reformat_path(path):
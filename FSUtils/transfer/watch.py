@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+from file_index import ProjectFileIndex, _iter_dir
+
+# inotify 常量，见 <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE |
+               _IN_DELETE | _IN_DELETE_SELF)
+_EVENT_FORMAT = "iIII"
+_EVENT_SIZE = struct.calcsize(_EVENT_FORMAT)
+
+
+class Watcher(object):
+    u"""
+    工程目录监视器基类
+
+    :meth:`wait` 返回发生变化的文件或目录路径列表，路径为 ``root`` 拼接相对路径的形式，
+    与文件索引一致；返回 ``None`` 表示事件丢失，需要完整重新扫描。
+
+    :ivar str root: 工程文件的根目录( ``project`` 目录)
+    :ivar list exclude_dirs: ``project`` 下需要排除的子目录
+    """
+    skip_dirs = ProjectFileIndex.skip_dirs
+
+    def __init__(self, root, exclude_dirs=None):
+        u"""
+        :param root: 工程文件的根目录( ``project`` 目录)
+        :type root: str
+        :param exclude_dirs: ``project`` 下需要排除的子目录
+        :type exclude_dirs: list
+        """
+        self.root = root
+        self.exclude_dirs = list(exclude_dirs or [])
+
+    def _iter_dirs(self, path):
+        u"""
+        遍历需要监视的目录
+        """
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            yield dir_path
+            try:
+                entries = list(_iter_dir(dir_path))
+            except OSError:
+                continue
+            for name, entry_path, is_dir in entries:
+                if is_dir and self._is_watched(entry_path, name):
+                    stack.append(entry_path)
+
+    def _is_watched(self, path, name):
+        if name in self.skip_dirs:
+            return False
+        return not (os.path.dirname(path) == self.root.rstrip("/\\") and
+                    name in self.exclude_dirs)
+
+    def wait(self, timeout=None):
+        u"""
+        等待文件变化
+
+        :param timeout: 最长等待秒数，为 ``None`` 时一直等待
+        :type timeout: float
+        :return: 发生变化的路径列表，超时返回空列表
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def close(self):
+        u"""
+        停止监视
+        """
+        pass
+
+
+class InotifyWatcher(Watcher):
+    u"""
+    基于 Linux ``inotify`` 的监视器，通过 ``ctypes`` 调用 libc，每个目录一个监视项
+
+    :ivar float settle: 收到事件后继续收集后续事件的秒数，用于合并编辑器保存时的多次写入
+    """
+    settle = 0.05
+
+    def __init__(self, root, exclude_dirs=None):
+        super(InotifyWatcher, self).__init__(root, exclude_dirs)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+        try:
+            self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, path):
+        for dir_path in self._iter_dirs(path):
+            wd = self._libc.inotify_add_watch(
+                self._fd, dir_path.encode("utf-8")
+                if isinstance(dir_path, unicode) else dir_path, _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(err, "inotify_add_watch failed: " + dir_path)
+            self._paths[wd] = dir_path
+
+    def _read_events(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return None
+        try:
+            return os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return ""
+            raise
+
+    def wait(self, timeout=None):
+        changed = []
+        deadline = None
+        while True:
+            if deadline is None:
+                data = self._read_events(timeout)
+            else:
+                data = self._read_events(max(0, deadline - time.time()))
+            if data is None:
+                break
+            if deadline is None:
+                deadline = time.time() + self.settle
+            offset = 0
+            while offset + _EVENT_SIZE <= len(data):
+                wd, mask, cookie, length = struct.unpack_from(
+                    _EVENT_FORMAT, data, offset)
+                name = data[offset + _EVENT_SIZE:
+                            offset + _EVENT_SIZE + length].rstrip("\0")
+                offset += _EVENT_SIZE + length
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                dir_path = self._paths.get(wd)
+                if mask & _IN_IGNORED:
+                    self._paths.pop(wd, None)
+                    continue
+                if dir_path is None or not name:
+                    continue
+                path = os.path.join(dir_path, name)
+                if mask & _IN_ISDIR:
+                    if not self._is_watched(path, name):
+                        continue
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        self._add_tree(path)
+                elif mask & _IN_CREATE:
+                    # 文件内容在写入完成( IN_CLOSE_WRITE )时处理
+                    continue
+                changed.append(path)
+        # 保持顺序并去重
+        seen = set()
+        return [p for p in changed if not (p in seen or seen.add(p))]
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(Watcher):
+    u"""
+    轮询监视器，定期比较所有文件的修改时间与大小，在不支持 ``inotify`` 的系统上使用
+
+    :ivar float interval: 轮询间隔秒数
+    """
+
+    def __init__(self, root, exclude_dirs=None, interval=1.0):
+        super(PollingWatcher, self).__init__(root, exclude_dirs)
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for dir_path in self._iter_dirs(self.root):
+            try:
+                entries = list(_iter_dir(dir_path))
+            except OSError:
+                continue
+            for name, path, is_dir in entries:
+                if is_dir:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime, st.st_size)
+        return snapshot
+
+    def wait(self, timeout=None):
+        start = time.time()
+        while True:
+            snapshot = self._take_snapshot()
+            old = self._snapshot
+            changed = [p for p, stat in snapshot.iteritems()
+                       if old.get(p) != stat]
+            changed.extend(p for p in old if p not in snapshot)
+            self._snapshot = snapshot
+            if changed:
+                return sorted(changed)
+            if timeout is not None and time.time() - start >= timeout:
+                return []
+            time.sleep(self.interval)
+
+
+def create_watcher(root, exclude_dirs=None, interval=1.0, logger=None):
+    u"""
+    创建监视器，优先使用 ``inotify`` ，不可用(非 Linux 或超出监视数量限制)时使用轮询
+
+    :rtype: :class:`Watcher`
+    """
+    try:
+        return InotifyWatcher(root, exclude_dirs)
+    except (OSError, AttributeError) as e:
+        (logger or logging.getLogger("fr")).warning(
+            "inotify unavailable (%s), polling every %.1fs." % (e, interval))
+        return PollingWatcher(root, exclude_dirs, interval)
+
+
+class WatchSession(object):
+    u"""
+    监视模式
+
+    创建时各迁移工具立即完成一次完整分析，工程只加载与扫描一次，之后监视代码、图片与国际化资源
+    文件的变化：发生变化的文件被增量更新到文件索引与扫描结果中，再由各迁移工具只按受影响的文件
+    增量更新迁移候选，无需重新扫描工程。
+
+    .. code:: python
+
+        engine = ScanEngine("./project", extractors=TransferBase.get_extractors())
+        locale = LocaleTransfer(..., scan_engine=engine)
+        image = ImageTransfer(..., scan_engine=engine)
+        # 创建时调用 locale.analyze() 与 image.analyze()
+        session = WatchSession([locale, image])
+        session.run()
+
+    :ivar list transfers: 监视的迁移工具列表
+    :ivar watcher: 目录监视器
+    :vartype watcher: :class:`Watcher`
+    """
+
+    def __init__(self, transfers, watcher=None, interval=1.0):
+        u"""
+        :param transfers: 迁移工具列表，建议共用一个扫描引擎
+        :type transfers: list
+        :param watcher: 目录监视器，不设置则使用 :func:`create_watcher` 创建
+        :type watcher: :class:`Watcher`
+        :param interval: 轮询监视器的轮询间隔秒数
+        :type interval: float
+        """
+        self.transfers = list(transfers)
+        first = self.transfers[0]
+        self.logger = first.logger
+        self.watcher = watcher or create_watcher(
+            first.project_root, first.exclude_dirs, interval, self.logger)
+        self._engines = []
+        for transfer in self.transfers:
+            engine = transfer.get_scan_engine()
+            if engine not in self._engines:
+                self._engines.append(engine)
+        # 增量更新基于已有的分析结果，监视开始前先完成一次完整分析
+        for transfer in self.transfers:
+            transfer.analyze()
+
+    def step(self, timeout=None):
+        u"""
+        处理一批文件变化
+
+        :param timeout: 最长等待秒数
+        :type timeout: float
+        :return: 发生变化的路径列表
+        :rtype: list
+        """
+        paths = self.watcher.wait(timeout)
+        overflowed = paths is None
+        if overflowed:
+            # 事件丢失时重建文件索引并重新扫描
+            self.logger.warning("Watch events overflowed, rescanning.")
+            paths = [self.watcher.root]
+            for engine in self._engines:
+                engine.reset()
+        if not paths:
+            return []
+        start = time.time()
+        updates = []
+        for engine in self._engines:
+            # 重建索引后无法得知具体变化，由各迁移工具重新同步整个工程
+            updates.append(None if overflowed else engine.update(paths))
+        for transfer in self.transfers:
+            transfer.refresh(paths, updates[
+                self._engines.index(transfer.get_scan_engine())])
+        changed = set(c for changes in updates for c in changes or ())
+        self.logger.info("%d path(s) changed, %d indexed file(s) updated, "
+                         "refreshed in %.3fs." % (len(paths), len(changed),
+                                                 time.time() - start))
+        return paths
+
+    def run(self, callback=None):
+        u"""
+        持续监视，直到被中断
+
+        :param callback: 每批变化处理后调用，参数为迁移工具列表，不设置则输出各工具的摘要
+        :type callback: callable
+        """
+        try:
+            while True:
+                if not self.step():
+                    continue
+                if callback is not None:
+                    callback(self.transfers)
+                else:
+                    for transfer in self.transfers:
+                        self.logger.info(transfer.summary())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.watcher.close()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+u"""
+国际化内容表内存测试
+
+生成主资源文件与各本地化资源文件后，分别以按键嵌套字典( ``{查询键: {本地化标识: 值}}`` ，
+:class:`~FSUtils.transfer.properties.LocaleTable` 之前的加载方式)与列式内容表加载，比较
+加载前后的匿名内存( ``RssAnon`` )增量与取出不完整查询键的耗时::
+
+    python benchmark/locale_memory.py --keys 50000
+    python benchmark/locale_memory.py --keys 50000 --check
+
+每种加载方式在独立的子进程中运行，只支持提供 ``/proc/self/status`` 的系统。
+"""
+
+__author__ = 'kyle'
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from benchmark.project_generator import ProjectGenerator
+
+LAYOUTS = ["dicts", "table"]
+
+
+def _rss_anon_kb():
+    u"""
+    当前进程的匿名内存(KB)
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1])
+    raise OSError("RssAnon not available")
+
+
+def generate_locales(root, keys, seed=0):
+    u"""
+    生成只包含资源文件与少量代码文件的工程
+
+    :return: 源国际化资源文件所在目录
+    :rtype: str
+    """
+    ProjectGenerator(root, modules=5, files_per_module=1, keys=keys,
+                     images_per_module=1, seed=seed).generate()
+    return os.path.join(root, *ProjectGenerator.locale_rel_path.split("/"))
+
+
+def _tags():
+    return [("main", "fr.properties")] + [
+        (locale, "fr_%s.properties" % locale)
+        for locale in ProjectGenerator.locales]
+
+
+def measure(layout, locale_dir):
+    u"""
+    按指定方式加载资源文件，记录匿名内存增量与取出不完整查询键的耗时
+
+    :param layout: ``dicts`` 或 ``table``
+    :type layout: str
+    :param locale_dir: 资源文件所在目录
+    :type locale_dir: str
+    :rtype: dict
+    """
+    from FSUtils.transfer.properties import LocaleTable, PropertiesStore, \
+        unescape
+
+    tags = _tags()
+    stores = dict((tag, PropertiesStore(os.path.join(locale_dir, name)))
+                  for tag, name in tags)
+    before = _rss_anon_kb()
+    if layout == "dicts":
+        table = {}
+        for tag, name in tags:
+            store = stores[tag]
+            for key, offset, length in store.entries():
+                value = unescape(store.read(offset, length), store.encoding)
+                if tag == "main":
+                    table[key] = {tag: value}
+                elif key in table:
+                    table[key][tag] = value
+        keys = sorted(table)
+        start = time.time()
+        incomplete = [k for k in keys if len(table[k]) < len(tags) or
+                      not all(table[k].itervalues())]
+    else:
+        table = LocaleTable(stores, [tag for tag, name in tags])
+        keys = table.keys
+        start = time.time()
+        incomplete = table.incomplete(keys)
+    elapsed = time.time() - start
+    after = _rss_anon_kb()
+    return {"rss_anon_mb": round((after - before) / 1024.0, 1),
+            "incomplete_s": round(elapsed, 4), "keys": len(keys),
+            "incomplete": len(incomplete)}
+
+
+def compare(work_dir):
+    u"""
+    在独立的子进程中分别按每种方式加载 ``work_dir`` 中已生成的资源文件
+
+    :param work_dir: :func:`generate_locales` 使用的工作目录，工程位于其 ``project`` 子目录
+    :type work_dir: str
+    :return: 加载方式与 :func:`measure` 结果的映射
+    :rtype: dict
+    """
+    results = {}
+    for layout in LAYOUTS:
+        output = subprocess.check_output([
+            sys.executable, os.path.abspath(__file__), "--child", layout,
+            "--work-dir", work_dir])
+        results[layout] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare locale table memory against nested dicts.")
+    parser.add_argument("--keys", type=int, default=50000)
+    parser.add_argument("--work-dir", default="/tmp/fsutils-locale-memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 unless the table is smaller")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    locale_dir = os.path.join(
+        args.work_dir, "project",
+        *ProjectGenerator.locale_rel_path.split("/"))
+    if args.child:
+        sys.stdout.write(json.dumps(measure(args.child, locale_dir)) + "\n")
+        return 0
+    generate_locales(os.path.join(args.work_dir, "project"), args.keys,
+                     args.seed)
+    results = compare(args.work_dir)
+    print "%-6s %8s %12s %14s" % ("layout", "keys", "RssAnon(MB)",
+                                  "incomplete(s)")
+    for layout in LAYOUTS:
+        r = results[layout]
+        print "%-6s %8d %12.1f %14.4f" % (
+            layout, r["keys"], r["rss_anon_mb"], r["incomplete_s"])
+    if results["dicts"]["incomplete"] != results["table"]["incomplete"]:
+        print "Incomplete key counts differ."
+        return 1
+    if args.check and \
+            results["table"]["rss_anon_mb"] >= results["dicts"]["rss_anon_mb"]:
+        print "LocaleTable does not use less memory than nested dicts."
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
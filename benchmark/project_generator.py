@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import random
+import shutil
+import struct
+
+# 预设的工程规模
+PRESETS = {
+    "small": dict(modules=8, files_per_module=40, keys=2000,
+                  images_per_module=20),
+    "medium": dict(modules=14, files_per_module=250, keys=10000,
+                   images_per_module=80),
+    "large": dict(modules=24, files_per_module=1000, keys=40000,
+                  images_per_module=200),
+}
+
+
+class ProjectGenerator(object):
+    u"""
+    按 FineReport 工程结构生成用于性能测试的 ``project`` 目录
+
+    生成的工程包含：平台模块( ``fservice`` 等，图片位于 ``com/fr/fs`` 下)与其余模块；
+    ``.java`` 、 ``.js`` 、 ``.cpt`` 、 ``.css`` 与 ``.html`` 代码文件，其中包含各种形式的
+    国际化调用与图片引用；``base-file`` 模块中的 ``fr*.properties`` 资源文件(包含注释、转义
+    字符、续行与部分缺失的本地化内容)；各模块中的图片(部分内容相同)；以及 ``.svn`` 与
+    ``out`` 等需要跳过的目录。相同参数与随机种子生成的工程完全相同。
+
+    .. code:: python
+
+        ProjectGenerator("/tmp/bench/project", **PRESETS["medium"]).generate()
+
+    :ivar str root: 生成的 ``project`` 目录
+    """
+    target_modules = ["fservice", "fschedule", "fmobile"]
+    other_modules = ["base", "base-file", "chart", "report", "form",
+                     "designer", "data", "web"]
+    locales = ["en_US", "zh_CN", "zh_TW", "ja_JP"]
+    locale_rel_path = "base-file/src/com/fr/general/locale"
+    target_locale_rel_path = "fservice/src/com/fr/fs/resources"
+
+    def __init__(self, root, modules=8, files_per_module=100, calls_per_file=6,
+                 keys=5000, images_per_module=40, images_per_file=2,
+                 shared_ratio=0.1, duplicate_ratio=0.1, fragment_ratio=0.02,
+                 seed=0):
+        u"""
+        :param root: 生成的 ``project`` 目录，已存在时先删除
+        :type root: str
+        :param modules: 模块数量(包括平台模块)
+        :type modules: int
+        :param files_per_module: 每个模块的代码文件数量
+        :type files_per_module: int
+        :param calls_per_file: 每个代码文件中的国际化调用数量
+        :type calls_per_file: int
+        :param keys: 主资源文件中的查询键数量
+        :type keys: int
+        :param images_per_module: 每个模块的图片数量
+        :type images_per_module: int
+        :param images_per_file: 每个代码文件中的图片引用数量
+        :type images_per_file: int
+        :param shared_ratio: 引用其他模块的查询键与图片的比例
+        :type shared_ratio: float
+        :param duplicate_ratio: 与其他图片内容相同的图片比例
+        :type duplicate_ratio: float
+        :param fragment_ratio: 本地化内容不完整的查询键比例
+        :type fragment_ratio: float
+        :param seed: 随机种子
+        :type seed: int
+        """
+        self.root = root
+        self.modules = self._module_names(modules)
+        self.files_per_module = files_per_module
+        self.calls_per_file = calls_per_file
+        self.keys = ["Key-%06d" % i for i in xrange(keys)]
+        self.images_per_module = images_per_module
+        self.images_per_file = images_per_file
+        self.shared_ratio = shared_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.fragment_ratio = fragment_ratio
+        self._random = random.Random(seed)
+        self._images = {}
+        self._all_images = []
+
+    def _module_names(self, count):
+        names = self.target_modules + self.other_modules
+        names.extend("module%02d" % i
+                     for i in xrange(max(0, count - len(names))))
+        return names[:max(count, len(self.target_modules) + 2)]
+
+    def _package(self, module):
+        if module in self.target_modules:
+            return "com/fr/fs"
+        return "com/fr/" + module.replace("-", "")
+
+    def _write(self, path, data):
+        dir_path = os.path.dirname(path)
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def generate(self):
+        u"""
+        生成工程
+
+        :return: 生成的 ``project`` 目录
+        :rtype: str
+        """
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+        for module in self.modules:
+            self._generate_images(module)
+        for i, module in enumerate(self.modules):
+            self._generate_sources(i, module)
+        self._generate_locales()
+        self._generate_noise()
+        return self.root
+
+    def _generate_images(self, module):
+        u"""
+        生成模块图片，部分图片复制其他图片的内容
+        """
+        rnd = self._random
+        images = []
+        package = self._package(module)
+        for i in xrange(self.images_per_module):
+            folder = rnd.choice(["", "toolbar/", "icons/", "%s/" % module])
+            ext = rnd.choice(["png", "png", "png", "gif", "jpg"])
+            rel = "%s/web/images/%simg%04d.%s" % (package, folder, i, ext)
+            if self._all_images and rnd.random() < self.duplicate_ratio:
+                data = rnd.choice(self._all_images)[1]
+            else:
+                size = rnd.randint(200, 6000)
+                data = "\x89PNG\r\n\x1a\n" + struct.pack(">I", size) + \
+                    ("%0*x" % (size * 2, rnd.getrandbits(size * 8))).decode(
+                        "hex")
+            self._write(os.path.join(self.root, module, "src", rel), data)
+            images.append((rel, data))
+        self._images[module] = images
+        self._all_images.extend(images)
+
+    def _pick_key(self, index):
+        u"""
+        选取查询键，大多数调用使用本模块的查询键，部分调用使用任意查询键
+        """
+        rnd = self._random
+        if rnd.random() < self.shared_ratio:
+            return rnd.choice(self.keys)
+        count = len(self.modules)
+        slot = rnd.randint(0, len(self.keys) // count - 1)
+        return self.keys[slot * count + index]
+
+    def _pick_image(self, module):
+        rnd = self._random
+        if rnd.random() < self.shared_ratio:
+            module = rnd.choice(self.modules)
+        images = self._images[module]
+        return rnd.choice(images)[0] if images else None
+
+    def _generate_sources(self, index, module):
+        u"""
+        生成模块代码文件
+        """
+        rnd = self._random
+        package = self._package(module)
+        for i in xrange(self.files_per_module):
+            kind = rnd.choice(
+                ["java"] * 6 + ["js"] * 3 + ["cpt", "css", "html"])
+            sub = rnd.choice(["", "core/", "web/", "ui/", "data/"])
+            rel = "%s/%s%s%04d.%s" % (package, sub, module.title().replace(
+                "-", ""), i, kind)
+            keys = [self._pick_key(index) for _ in xrange(self.calls_per_file)]
+            images = [self._pick_image(module)
+                      for _ in xrange(self.images_per_file)]
+            images = [img for img in images if img is not None]
+            body = getattr(self, "_render_" + kind)(
+                package, os.path.basename(rel).split(".")[0], keys, images)
+            self._write(os.path.join(self.root, module, "src", rel), body)
+
+    @staticmethod
+    def _render_java(package, name, keys, images):
+        lines = ["package %s;" % package.replace("/", "."), "",
+                 "import com.fr.general.Inter;", "",
+                 "public class %s {" % name]
+        for i, key in enumerate(keys):
+            lines.append("    public String text%d() {" % i)
+            if i % 3 == 2:
+                lines.append('        return Inter.getLocText("%s", '
+                             'new String[]{"a"});' % key)
+            else:
+                lines.append('        return Inter.getLocText("%s");' % key)
+            lines.append("    }")
+        for i, img in enumerate(images):
+            lines.append('    private static final String ICON_%d = "%s";'
+                         % (i, img))
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_js(package, name, keys, images):
+        lines = ["(function ($) {", "    FR.%s = {" % name]
+        for i, key in enumerate(keys):
+            call = ['FR.i18nText("%s")', "FR.i18nText('%s')", '$.i18n("%s")',
+                    '$.i18n.prop("%s")'][i % 4]
+            lines.append("        text%d: %s," % (i, call % key))
+        for i, img in enumerate(images):
+            lines.append('        icon%d: "%s",' % (i, img))
+        lines.extend(["    };", "})(jQuery);"])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_cpt(package, name, keys, images):
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<WorkBook name="%s">' % name]
+        for key in keys:
+            lines.append('  <Widget class="Label" i18n="%s"/>' % key)
+        for img in images:
+            lines.append('  <Background image="%s"/>' % img)
+        lines.append("</WorkBook>")
+        return "\r\n".join(lines) + "\r\n"
+
+    @staticmethod
+    def _render_css(package, name, keys, images):
+        return "".join(".%s-%d { background: url(/%s) no-repeat; }\n"
+                       % (name.lower(), i, img)
+                       for i, img in enumerate(images))
+
+    @staticmethod
+    def _render_html(package, name, keys, images):
+        lines = ["<html>", "<body>"]
+        lines.extend('<img src="/%s"/>' % img for img in images)
+        lines.extend(["</body>", "</html>"])
+        return "\n".join(lines) + "\n"
+
+    def _generate_locales(self):
+        u"""
+        生成源国际化资源文件与目标模块国际化资源文件
+        """
+        rnd = self._random
+        base = os.path.join(self.root, *self.locale_rel_path.split("/"))
+        fragmented = set(k for k in self.keys
+                         if rnd.random() < self.fragment_ratio)
+        for locale in [None] + self.locales:
+            lines = ["# FineReport locale resources", ""]
+            for i, key in enumerate(self.keys):
+                if locale is not None and key in fragmented and \
+                        rnd.random() < 0.5:
+                    continue
+                if i % 50 == 0:
+                    lines.append("# section %d" % (i // 50))
+                value = "Value %d" % i
+                if locale in ("zh_CN", "zh_TW", "ja_JP"):
+                    value = "\\u6587\\u672c %d" % i
+                if i % 97 == 0:
+                    value += " \\\n    continued"
+                lines.append("%s=%s" % (key, value))
+            suffix = "_" + locale if locale else ""
+            self._write(os.path.join(base, "fr%s.properties" % suffix),
+                        "\n".join(lines) + "\n")
+        target = os.path.join(
+            self.root, *self.target_locale_rel_path.split("/"))
+        for locale in [None] + self.locales:
+            suffix = "_" + locale if locale else ""
+            self._write(os.path.join(target, "fs%s.properties" % suffix),
+                        "FS-Title=Platform\n")
+
+    def _generate_noise(self):
+        u"""
+        生成需要被跳过的目录与文件
+        """
+        for module in self.modules[:3]:
+            svn = os.path.join(self.root, module, "src", ".svn")
+            self._write(os.path.join(svn, "entries"), "12\n")
+            self._write(os.path.join(svn, "text-base", "A.java.svn-base"),
+                        'Inter.getLocText("Key-000000");\n')
+            # 模块根目录下的文件不会被收录
+            self._write(os.path.join(self.root, module, "build.xml"),
+                        "<project/>\n")
+        self._write(os.path.join(self.root, "out", "production", "A.java"),
+                    'Inter.getLocText("Key-000001");\n')
+
+
+def generate_project(root, size="small", **options):
+    u"""
+    按预设规模生成工程
+
+    :param root: 生成的 ``project`` 目录
+    :type root: str
+    :param size: 预设规模， ``small`` 、 ``medium`` 或 ``large``
+    :type size: str
+    :return: 生成的 ``project`` 目录
+    :rtype: str
+    """
+    config = dict(PRESETS[size])
+    config.update(options)
+    return ProjectGenerator(root, **config).generate()
+
+
+if __name__ == "__main__":
+    import sys
+    generate_project(sys.argv[1], *sys.argv[2:3])
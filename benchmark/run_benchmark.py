@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+u"""
+迁移工具性能测试
+
+在生成的工程上分阶段执行国际化文本与图片迁移，记录各阶段耗时与进程内存峰值，并与保存的基准
+结果比较::
+
+    python benchmark/run_benchmark.py --sizes small,medium --repeat 3
+    python benchmark/run_benchmark.py --sizes small,medium --save-baseline
+
+每次运行都在独立的子进程中进行，内存峰值互不影响；重复运行时各阶段取最短耗时。
+"""
+
+__author__ = 'kyle'
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _repo_root not in sys.path:
+    sys.path.insert(0, _repo_root)
+
+from benchmark.project_generator import PRESETS, ProjectGenerator, \
+    generate_project
+
+PHASES = ["collect", "extract", "filter", "transfer", "rewrite", "cleanup"]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "baseline.json")
+
+
+def _peak_rss_mb():
+    u"""
+    当前进程的内存峰值(MB)，不支持时返回 ``None``
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    if sys.platform == "darwin":
+        rss /= 1024.0
+    return round(rss / 1024.0, 1)
+
+
+def run_phases(root, work_dir, jobs=1, workers=1):
+    u"""
+    在已生成的工程上依次执行各阶段并计时
+
+    :param root: 生成的 ``project`` 目录
+    :type root: str
+    :param work_dir: 日志等输出目录
+    :type work_dir: str
+    :param jobs: 扫描代码文件使用的进程数
+    :type jobs: int
+    :param workers: 复制图片使用的线程数
+    :type workers: int
+    :return: ``{"phases": 耗时, "peak_rss_mb": 内存峰值, "counts": 统计}``
+    :rtype: dict
+    """
+    from FSUtils.transfer import ImageTransfer, LocaleTransfer
+    from FSUtils.transfer.scan_engine import ScanEngine
+    from FSUtils.transfer.transfer_base import TransferBase
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger("fr").setLevel(logging.ERROR)
+    exclude_dirs = ["out", ".svn"]
+    targets = ProjectGenerator.target_modules
+    phases = {}
+    peaks = {}
+    state = {"start": time.time()}
+
+    def mark(phase):
+        now = time.time()
+        phases[phase] = round(now - state["start"], 4)
+        peaks[phase] = _peak_rss_mb()
+        state["start"] = now
+
+    # 建立文件索引
+    engine = ScanEngine(root, exclude_dirs, jobs=jobs,
+                        extractors=TransferBase.get_extractors())
+    index = engine.get_file_index()
+    mark("collect")
+    # 扫描代码文件
+    engine.scan()
+    mark("extract")
+    # 分析迁移内容并生成计划
+    locale = LocaleTransfer(
+        root, targets, ProjectGenerator.target_locale_rel_path, "fs", work_dir,
+        exclude_dirs, scan_engine=engine)
+    image = ImageTransfer(
+        root, targets, "com/fr/fs", [],
+        os.path.join(root, "fservice", "src", "com", "fr", "fs", "resources",
+                     "images"),
+        exclude_dirs, work_dir, logging.ERROR, scan_engine=engine,
+        workers=workers)
+    locale_plan = locale.plan()
+    image_plan = image.plan()
+    mark("filter")
+    # 写入国际化资源文件并迁移图片
+    locale.apply(locale_plan)
+    image_plan.apply_operations(root, image.logger, workers)
+    mark("transfer")
+    # 修改代码中的图片调用
+    image_plan.apply_rewrites(root, image.logger)
+    mark("rewrite")
+    # 清理空目录
+    image_plan.apply_cleanup(root)
+    mark("cleanup")
+    counts = {
+        "indexed_files": sum(len(index.get_files(m)) for m in index.modules),
+        "move_keys": len(locale.move_keys),
+        "duplicate_keys": len(locale.duplicate_keys),
+        "fragmented_keys": len(locale.fragmented_keys),
+        "image_operations": len(image_plan.operations),
+        "rewritten_files": len(image_plan.rewrites),
+    }
+    return {"phases": phases, "peak_rss_mb": peaks, "counts": counts}
+
+
+def run_size(size, work_dir, jobs=1, workers=1, seed=0):
+    u"""
+    生成指定规模的工程并执行一次测试，工程生成不计入耗时
+
+    :rtype: dict
+    """
+    size_dir = os.path.join(work_dir, size)
+    log_dir = os.path.join(size_dir, "log")
+    root = generate_project(os.path.join(size_dir, "project"), size,
+                            seed=seed)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    return run_phases(root, log_dir, jobs, workers)
+
+
+def run_benchmark(sizes, work_dir, repeat=1, jobs=1, workers=1, seed=0):
+    u"""
+    在子进程中按规模依次执行测试
+
+    :param sizes: 规模列表，取值见 :data:`PRESETS`
+    :type sizes: list
+    :param work_dir: 生成工程与日志的目录
+    :type work_dir: str
+    :param repeat: 每个规模的重复次数，各阶段取最短耗时与最大内存峰值
+    :type repeat: int
+    :return: 可保存为 JSON 的测试结果
+    :rtype: dict
+    """
+    results = {}
+    for size in sizes:
+        runs = []
+        for i in xrange(repeat):
+            output = subprocess.check_output([
+                sys.executable, os.path.abspath(__file__), "--child", size,
+                "--work-dir", work_dir, "--jobs", str(jobs),
+                "--workers", str(workers), "--seed", str(seed)])
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        results[size] = {
+            "phases": dict((p, min(r["phases"][p] for r in runs))
+                           for p in PHASES),
+            "peak_rss_mb": dict((p, max(r["peak_rss_mb"][p] for r in runs))
+                                for p in PHASES),
+            "counts": runs[0]["counts"],
+            "config": PRESETS[size],
+        }
+        results[size]["total"] = round(
+            sum(results[size]["phases"].values()), 4)
+    return {
+        "meta": {
+            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat, "jobs": jobs, "workers": workers, "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_delta=0.05):
+    u"""
+    与基准结果比较
+
+    :param threshold: 判定为变慢的相对增幅
+    :type threshold: float
+    :param min_delta: 判定为变慢的最小绝对增幅(秒)，避免短耗时阶段的抖动
+    :type min_delta: float
+    :return: ``(报告行列表, 变慢的阶段列表)``
+    :rtype: tuple
+    """
+    lines = ["%-8s %-9s %10s %10s %8s %10s" % (
+        "size", "phase", "base(s)", "now(s)", "change", "rss(MB)")]
+    regressions = []
+    for size in sorted(current["results"]):
+        now = current["results"][size]
+        base = baseline.get("results", {}).get(size)
+        for phase in PHASES + ["total"]:
+            if phase == "total":
+                value, rss = now["total"], None
+                base_value = base and base.get("total")
+            else:
+                value = now["phases"][phase]
+                rss = now["peak_rss_mb"][phase]
+                base_value = base and base["phases"].get(phase)
+            if base_value:
+                change = (value - base_value) / base_value
+                flag = ""
+                if change > threshold and value - base_value > min_delta:
+                    flag = " !"
+                    regressions.append((size, phase))
+                lines.append("%-8s %-9s %10.3f %10.3f %+7.1f%% %10s%s" % (
+                    size, phase, base_value, value, change * 100,
+                    "" if rss is None else rss, flag))
+            else:
+                lines.append("%-8s %-9s %10s %10.3f %8s %10s" % (
+                    size, phase, "-", value, "-", "" if rss is None else rss))
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark FSUtils transfers on generated projects.")
+    parser.add_argument("--sizes", default="small,medium",
+                        help="comma separated sizes: %s"
+                             % ", ".join(sorted(PRESETS)))
+    parser.add_argument("--work-dir", default="/tmp/fsutils-benchmark")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 when a phase regresses")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        result = run_size(args.child, args.work_dir, args.jobs, args.workers,
+                          args.seed)
+        sys.stdout.write(json.dumps(result) + "\n")
+        return 0
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    for size in sizes:
+        if size not in PRESETS:
+            parser.error("unknown size: %s" % size)
+    results = run_benchmark(sizes, args.work_dir, args.repeat, args.jobs,
+                            args.workers, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    lines, regressions = compare(results, baseline, args.threshold)
+    print "\n".join(lines)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print "Baseline saved to %s." % args.baseline
+    if regressions:
+        print "%d phase(s) slower than baseline by more than %d%%." % (
+            len(regressions), args.threshold * 100)
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,11 @@ setup(
     packages=["FSUtils",
               "FSUtils.transfer"],
     long_description=read('README.rst'),
+    entry_points={
+        "console_scripts": [
+            "fs-transfer = FSUtils.transfer.batch:main",
+        ],
+    },
     classifiers=[
         "Development Status :: 1 - Planning",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+u"""
+测试共用的工程生成与迁移工具创建
+"""
+
+__author__ = 'kyle'
+
+import logging
+import os
+
+from benchmark.project_generator import ProjectGenerator, generate_project
+from FSUtils.transfer import ImageTransfer, LocaleTransfer
+
+EXCLUDE_DIRS = ["out", ".svn"]
+
+# 测试只关心结果，不输出迁移日志
+logging.getLogger("fr").setLevel(logging.ERROR)
+
+
+def make_project(work_dir, name="project"):
+    u"""
+    在 ``work_dir`` 下生成较小的工程
+
+    :return: 生成的 ``project`` 目录
+    :rtype: str
+    """
+    return generate_project(os.path.join(work_dir, name), "small",
+                            files_per_module=20, keys=600,
+                            images_per_module=12)
+
+
+def _ensure_dir(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+
+def create_locale(root, work_dir, **options):
+    u"""
+    创建将目标模块国际化内容迁移到 ``fs`` 资源文件的迁移工具，日志写入 ``work_dir``
+
+    :rtype: :class:`~FSUtils.transfer.LocaleTransfer`
+    """
+    _ensure_dir(work_dir)
+    return LocaleTransfer(
+        root, ProjectGenerator.target_modules,
+        ProjectGenerator.target_locale_rel_path, "fs", work_dir, EXCLUDE_DIRS,
+        **options)
+
+
+def create_image(root, work_dir, **options):
+    u"""
+    创建将目标模块图片迁移到 ``fservice`` 资源目录的迁移工具，日志写入 ``work_dir``
+
+    :rtype: :class:`~FSUtils.transfer.ImageTransfer`
+    """
+    _ensure_dir(work_dir)
+    return ImageTransfer(
+        root, ProjectGenerator.target_modules, "com/fr/fs", [],
+        os.path.join(root, "fservice", "src", "com", "fr", "fs", "resources",
+                     "images"),
+        EXCLUDE_DIRS, work_dir, logging.ERROR, **options)
+
+
+def read_tree(root):
+    u"""
+    读取目录下的所有文件
+
+    :return: 相对路径与文件内容的映射
+    :rtype: dict
+    """
+    tree = {}
+    for dir_path, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dir_path, name)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
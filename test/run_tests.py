@@ -12,9 +12,18 @@
 # SOFTWARE.
 # =============================================================================
 
+import os
+import sys
+import unittest
+
+_test_dir = os.path.dirname(os.path.abspath(__file__))
+
 
 def run_tests():
-    pass
+    suite = unittest.defaultTestLoader.discover(
+        _test_dir, pattern="test_*.py",
+        top_level_dir=os.path.dirname(_test_dir))
+    return unittest.TextTestRunner(verbosity=2).run(suite).wasSuccessful()
 
 if __name__ == "__main__":
-    run_tests()
+    sys.exit(0 if run_tests() else 1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from FSUtils.transfer.journal import Journal
+
+from .fixtures import create_image, create_locale, make_project, read_tree
+
+
+class JournalTest(unittest.TestCase):
+    u"""
+    按预写日志回滚后工程与迁移前逐字节一致
+    """
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="fsutils-journal-")
+        self.root = make_project(self.work_dir)
+        self.log_dir = os.path.join(self.work_dir, "log")
+        self.original = read_tree(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _check_rollback(self, create):
+        transfer = create(self.root, self.log_dir, journal=True)
+        transfer.transfer()
+        self.assertNotEqual(read_tree(self.root), self.original)
+        self.assertTrue(transfer.rollback())
+        self.assertEqual(read_tree(self.root), self.original)
+        self.assertFalse(transfer.journal.exists())
+
+    def test_locale_rollback(self):
+        self._check_rollback(create_locale)
+
+    def test_image_rollback(self):
+        self._check_rollback(create_image)
+
+    def test_recover_interrupted(self):
+        transfer = create_image(self.root, self.log_dir)
+        plan = transfer.plan()
+        journal = Journal(os.path.join(self.log_dir, "journal"), self.root)
+        # 只执行图片操作，不写入完成标记，模拟中断
+        journal.begin()
+        plan.apply_operations(self.root, journal=journal)
+        self.assertNotEqual(read_tree(self.root), self.original)
+        self.assertFalse(journal.is_complete())
+        journal = Journal(journal.path, self.root)
+        self.assertTrue(journal.recover())
+        self.assertEqual(read_tree(self.root), self.original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import random
+import unittest
+
+from FSUtils.transfer.path_trie import PathTrie
+
+
+class PathTrieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = ["com/fr/fs/web/images/mobile/cover/",
+                      "com/fr/a", "com/fr/ab/img.png", "img.png"]
+        self.trie = PathTrie(self.paths)
+
+    def test_contains(self):
+        self.assertEqual(len(self.trie), 4)
+        self.trie.add("com/fr/a")
+        self.assertEqual(len(self.trie), 4)
+        self.assertIn("com/fr/a", self.trie)
+        self.assertNotIn("com/fr", self.trie)
+        self.assertNotIn("com/fr/abc", self.trie)
+
+    def test_match_prefix(self):
+        self.assertTrue(self.trie.match_prefix(
+            "com/fr/fs/web/images/mobile/cover/a.png"))
+        # 按字符匹配，与 str.startswith 一致
+        self.assertTrue(self.trie.match_prefix("com/fr/ab/img.png"))
+        self.assertTrue(self.trie.match_prefix("com/fr/a"))
+        self.assertFalse(self.trie.match_prefix("com/fr/"))
+        self.assertFalse(self.trie.match_prefix(
+            "com/fr/fs/web/images/mobile/a.png"))
+        self.assertFalse(PathTrie().match_prefix("com/fr/a"))
+        self.assertTrue(PathTrie([""]).match_prefix("com/fr/a"))
+
+    def test_find_all(self):
+        text = 'url("/com/fr/ab/img.png") "com/fr/fs/web/images/mobile/' \
+               'cover/x.png"'
+        self.assertEqual(self.trie.find_all(text), [
+            (6, "com/fr/a"), (6, "com/fr/ab/img.png"), (16, "img.png"),
+            (27, "com/fr/fs/web/images/mobile/cover/")])
+        self.assertEqual(self.trie.find_all(""), [])
+        self.assertEqual(self.trie.find_all("com/fr"), [])
+
+    def test_matches_brute_force(self):
+        rnd = random.Random(0)
+        paths = ["".join(rnd.choice("ab/") for _ in xrange(rnd.randint(1, 6)))
+                 for _ in xrange(50)]
+        trie = PathTrie(paths)
+        for _ in xrange(200):
+            text = "".join(rnd.choice("ab/c")
+                           for _ in xrange(rnd.randint(0, 20)))
+            self.assertEqual(trie.match_prefix(text),
+                             any(text.startswith(p) for p in paths))
+            expected = sorted(set((i, p) for p in paths
+                                  for i in xrange(len(text))
+                                  if text.startswith(p, i)))
+            self.assertEqual(sorted(trie.find_all(text)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from FSUtils.transfer import TransferPlan
+
+from .fixtures import create_image, create_locale, make_project, read_tree
+
+
+class TransferPlanTest(unittest.TestCase):
+    u"""
+    保存、读取后执行的计划与直接迁移的结果一致
+    """
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="fsutils-plan-")
+        self.direct_root = make_project(self.work_dir, "direct")
+        self.planned_root = os.path.join(self.work_dir, "planned")
+        shutil.copytree(self.direct_root, self.planned_root)
+        self.log_dir = os.path.join(self.work_dir, "log")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _check(self, create, name):
+        original = read_tree(self.direct_root)
+        create(self.direct_root, self.log_dir).transfer()
+        expected = read_tree(self.direct_root)
+        self.assertNotEqual(expected, original)
+
+        path = os.path.join(self.work_dir, name + ".json")
+        create(self.planned_root, self.log_dir).plan().save(path)
+        self.assertEqual(read_tree(self.planned_root), original)
+        plan = TransferPlan.load(path)
+        plan.apply(self.planned_root)
+        self.assertEqual(read_tree(self.planned_root), expected)
+
+    def test_locale(self):
+        self._check(create_locale, "locale")
+
+    def test_image(self):
+        self._check(create_image, "image")
+
+
+if __name__ == "__main__":
+    unittest.main()
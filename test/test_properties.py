@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark import locale_memory
+from FSUtils.transfer.properties import LocaleTable, PropertiesStore
+
+
+class LocaleTableTest(unittest.TestCase):
+    u"""
+    在生成的资源文件上检查 :class:`~FSUtils.transfer.properties.LocaleTable`
+    """
+    keys = 20000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp(prefix="fsutils-locale-")
+        cls.locale_dir = locale_memory.generate_locales(
+            os.path.join(cls.work_dir, "project"), cls.keys)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.work_dir)
+
+    def test_matches_properties(self):
+        tags = locale_memory._tags()
+        stores = dict(
+            (tag, PropertiesStore(os.path.join(self.locale_dir, name)))
+            for tag, name in tags)
+        table = LocaleTable(stores, [tag for tag, name in tags])
+        try:
+            self.assertEqual(len(table), self.keys)
+            expected = set()
+            for key in table.keys:
+                values = [stores[tag].get(key) for tag, name in tags]
+                self.assertEqual(table.get(key, "main"), values[0])
+                if not all(values):
+                    expected.add(key)
+                self.assertEqual(table.is_complete(key), key not in expected)
+            self.assertEqual(set(table.incomplete(table.keys)), expected)
+            self.assertTrue(expected)
+        finally:
+            table.close()
+            for store in stores.itervalues():
+                store.close()
+
+    @unittest.skipUnless(os.path.exists("/proc/self/status"),
+                         "RssAnon is only available on Linux")
+    def test_footprint(self):
+        results = locale_memory.compare(self.work_dir)
+        dicts, table = results["dicts"], results["table"]
+        self.assertEqual(table["keys"], self.keys)
+        self.assertEqual(table["incomplete"], dicts["incomplete"])
+        # 嵌套字典约为内容表的三倍，留出余量
+        self.assertLess(table["rss_anon_mb"], dicts["rss_anon_mb"] / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from FSUtils.transfer.scan_cache import ScanCache
+from FSUtils.transfer.scan_engine import ScanEngine
+from FSUtils.transfer.transfer_base import TransferBase
+
+from .fixtures import EXCLUDE_DIRS, create_image, create_locale, \
+    make_project
+
+
+class ScanEngineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.mkdtemp(prefix="fsutils-scan-")
+        cls.root = make_project(cls.work_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.work_dir)
+
+    def _create_engine(self, **options):
+        return ScanEngine(self.root, EXCLUDE_DIRS,
+                          extractors=TransferBase.get_extractors(), **options)
+
+    def _extract_all(self, engine):
+        index = engine.get_file_index()
+        results = {}
+        for extractor in TransferBase.get_extractors():
+            files = [path for module in index.modules
+                     for path in index.get_files(module)
+                     if extractor.match(path)]
+            results[extractor.key] = dict(
+                zip(files, engine.extract(extractor, files)))
+        return results
+
+    def test_parallel_matches_serial(self):
+        serial = self._create_engine(jobs=1)
+        parallel = self._create_engine(jobs=4)
+        serial.scan()
+        parallel.scan()
+        self.assertEqual(self._extract_all(parallel),
+                         self._extract_all(serial))
+        self.assertEqual(parallel.stats.get("files_scanned"),
+                         serial.stats.get("files_scanned"))
+
+    def test_parallel_plans_match_serial(self):
+        log_dir = os.path.join(self.work_dir, "log")
+        for create in (create_locale, create_image):
+            serial = create(self.root, log_dir, jobs=1).plan()
+            parallel = create(self.root, log_dir, jobs=4).plan()
+            self.assertEqual(parallel.to_dict(), serial.to_dict())
+
+    def test_cache_rerun(self):
+        cache_dir = os.path.join(self.work_dir, "cache")
+        first = self._create_engine(cache_dir=cache_dir)
+        first.scan()
+        scanned = first.stats.get("files_scanned")
+        self.assertTrue(scanned)
+        expected = self._extract_all(first)
+
+        second = self._create_engine(cache_dir=cache_dir)
+        second.scan()
+        self.assertEqual(second.stats.get("files_scanned"), 0)
+        self.assertEqual(self._extract_all(second), expected)
+
+        # 只重新扫描发生变化的文件
+        path = second.get_file_index().get_files("fservice", ["*.java"])[0]
+        with open(path, "ab") as f:
+            f.write('Inter.getLocText("Key-Cache-Test");\n')
+        third = self._create_engine(cache_dir=cache_dir)
+        third.scan()
+        self.assertEqual(third.stats.get("files_scanned"), 1)
+        results = self._extract_all(third)
+        for key, files in results.iteritems():
+            if "Key-Cache-Test" in files.get(path, ()):
+                break
+        else:
+            self.fail("changed file was not rescanned")
+
+
+class ScanCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="fsutils-cache-")
+        self.path = os.path.join(self.work_dir, "A.java")
+        with open(self.path, "wb") as f:
+            f.write("0123456789")
+        # 使用整数修改时间，还原时不损失精度
+        os.utime(self.path, (1000000000, 1000000000))
+        self.signature = ScanCache.make_signature("test", ["*.java"])
+        cache = ScanCache(self.work_dir, "test", self.signature).load()
+        self.assertIsNone(cache.get(self.path))
+        cache.set(self.path, ["Key"])
+        cache.save()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _load(self, signature=None):
+        return ScanCache(self.work_dir, "test",
+                         signature or self.signature).load()
+
+    def test_hit(self):
+        cache = self._load()
+        self.assertEqual(cache.get(self.path), ["Key"])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_mtime_change(self):
+        os.utime(self.path, (1000000010, 1000000010))
+        cache = self._load()
+        self.assertIsNone(cache.get(self.path))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_size_change(self):
+        with open(self.path, "wb") as f:
+            f.write("01234")
+        os.utime(self.path, (1000000000, 1000000000))
+        cache = self._load()
+        self.assertIsNone(cache.get(self.path))
+
+    def test_signature_change(self):
+        cache = self._load(ScanCache.make_signature("test", ["*.js"]))
+        self.assertIsNone(cache.get(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
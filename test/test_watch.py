@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyleft (C) 2014 - kyle <kyle@finereport.com>
+# =============================================================================
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# =============================================================================
+
+__author__ = 'kyle'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from FSUtils.transfer.scan_engine import ScanEngine
+from FSUtils.transfer.transfer_base import TransferBase
+from FSUtils.transfer.watch import Watcher, WatchSession
+
+from .fixtures import EXCLUDE_DIRS, create_image, create_locale, \
+    make_project
+
+
+class ListWatcher(Watcher):
+    u"""
+    按顺序返回预先设置的变化路径的监视器
+    """
+
+    def __init__(self, root):
+        super(ListWatcher, self).__init__(root)
+        self.batches = []
+
+    def wait(self, timeout=None):
+        return self.batches.pop(0) if self.batches else []
+
+
+class WatchSessionTest(unittest.TestCase):
+    u"""
+    监视模式增量更新后的迁移计划与重新分析的结果一致
+    """
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="fsutils-watch-")
+        self.root = make_project(self.work_dir)
+        self.log_dir = os.path.join(self.work_dir, "log")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _create_transfers(self):
+        engine = ScanEngine(self.root, EXCLUDE_DIRS,
+                            extractors=TransferBase.get_extractors())
+        return [create(self.root, self.log_dir, scan_engine=engine)
+                for create in (create_locale, create_image)]
+
+    def _plans(self, transfers):
+        return [transfer.plan().to_dict() for transfer in transfers]
+
+    def _src(self, module, *parts):
+        return os.path.join(self.root, module, "src", *parts)
+
+    def _change_files(self):
+        u"""
+        修改、新增与删除代码文件，返回发生变化的路径
+        """
+        index = self.session.transfers[0].get_file_index()
+        modified = index.get_files("fmobile", ["*.java"])[0]
+        with open(modified, "ab") as f:
+            f.write('// Inter.getLocText("Key-000001");\n'
+                    '// "com/fr/base/web/images/img0000.png"\n')
+        removed = index.get_files("fservice", ["*.java"])[0]
+        os.remove(removed)
+        # 其他模块使用目标模块的查询键与图片，使其变为共用
+        added = self._src("report", "com", "fr", "report", "Added.java")
+        keys = sorted(self.session.transfers[0].move_keys)[:5]
+        images = sorted(self.session.transfers[1].module_in_use_images)[:3]
+        with open(added, "wb") as f:
+            f.write("".join('Inter.getLocText("%s");\n' % k for k in keys))
+            f.write("".join('String s = "%s";\n' % i for i in images))
+        return [modified, removed, added]
+
+    def test_incremental_matches_fresh(self):
+        transfers = self._create_transfers()
+        watcher = ListWatcher(self.root)
+        self.session = WatchSession(transfers, watcher)
+        # 创建时即已完成分析
+        for transfer in transfers:
+            self.assertTrue(transfer._analyzed)
+        before = self._plans(transfers)
+        watcher.batches.append(self._change_files())
+        self.assertEqual(len(self.session.step()), 3)
+        after = self._plans(transfers)
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, self._plans(self._create_transfers()))
+
+    def test_overflow_rescans(self):
+        transfers = self._create_transfers()
+        watcher = ListWatcher(self.root)
+        self.session = WatchSession(transfers, watcher)
+        self._change_files()
+        # 事件丢失时重新扫描整个工程
+        watcher.batches.append(None)
+        self.session.step()
+        self.assertEqual(self._plans(transfers),
+                         self._plans(self._create_transfers()))
+
+
+if __name__ == "__main__":
+    unittest.main()